@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
 from django.conf import settings
-from .models import User
+from config.response_cache import ResponseCache
+from .models import User, SurveyQuestion, SurveyOption, LanguageTest, TestQuestion
 
 @receiver(post_save, sender=User)
 def send_welcome_email(sender, instance, created, **kwargs):
@@ -30,3 +31,25 @@ def send_welcome_email(sender, instance, created, **kwargs):
             )
         except Exception as e:
             print(f"Ошибка отправки email: {e}")
+
+
+# === ВЕРСИИ КЕША ОТВЕТОВ (опрос и языковой тест) ===
+
+@receiver(post_save, sender=SurveyQuestion)
+@receiver(post_delete, sender=SurveyQuestion)
+@receiver(post_save, sender=SurveyOption)
+@receiver(post_delete, sender=SurveyOption)
+@receiver(post_save, sender=LanguageTest)
+@receiver(post_delete, sender=LanguageTest)
+@receiver(post_save, sender=TestQuestion)
+@receiver(post_delete, sender=TestQuestion)
+def bump_response_cache_version(sender, **kwargs):
+    ResponseCache.bump(sender)
+
+
+@receiver(post_save, sender=User)
+def bump_user_response_cache_version(sender, instance, update_fields=None, **kwargs):
+    """Профиль входит в ответы опроса и теста; вход в систему (last_login) их не меняет"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    ResponseCache.bump_user(instance.pk)
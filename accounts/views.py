@@ -9,6 +9,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
+from config.response_cache import cache_response
 from .models import User, RegistrationProfile, SurveyQuestion, SurveyOption, SurveyResponse, LanguageTest, TestQuestion, TestOption, TestResult, ConsultationRequest
 from .serializers import (
     UserSerializer, 
@@ -165,6 +166,7 @@ def get_registration_steps(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_response(SurveyQuestion, SurveyOption, per_user=True)
 def get_survey_questions(request):
     """Получить вопросы опроса для пользователя"""
     user = request.user
@@ -243,6 +245,7 @@ def submit_survey_answers(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_response(LanguageTest, TestQuestion, per_user=True)
 def get_language_test(request):
     """Получить языковой тест для пользователя"""
     user = request.user
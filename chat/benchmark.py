@@ -0,0 +1,257 @@
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from channels.testing import WebsocketCommunicator
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from accounts.models import User
+from .consumers import ChatConsumer
+from .models import ChatRoom
+
+# Каждое какое полученное сообщение читатель отмечает прочитанным
+READ_EVERY = 5
+# Емкость очереди канала по умолчанию, как в channels/channels_redis:
+# при переполнении group_send молча теряет события
+CHANNEL_CAPACITY = 100
+# Сколько ждать доставки всех сообщений после окончания отправки
+DRAIN_TIMEOUT = 30
+# Сколько ждать без новых событий, прежде чем считать остальные потерянными
+DRAIN_IDLE = 2
+
+
+class QueryCounter:
+    """Счетчик SQL запросов всех соединений, включая потоки database_sync_to_async"""
+
+    def __init__(self):
+        self.count = 0
+        self.connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self.connections.append(connection)
+
+    def __enter__(self):
+        from django.db import connections
+        for connection in connections.all():
+            self.install(connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for connection in self.connections:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class ChatBenchmark:
+    """Нагрузочный прогон ChatConsumer: N пользователей в M чатах шлют message/typing/read
+
+    Работает целиком локально через WebsocketCommunicator. Ожидает пустую
+    (тестовую) БД: создает пользователей и чаты с префиксом bench_.
+    """
+
+    def __init__(self, users=50, rooms=5, messages=10, redis_url=None, capacity=CHANNEL_CAPACITY):
+        self.users_count = users
+        self.rooms_count = max(min(rooms, users), 1)
+        self.messages_per_user = messages
+        self.redis_url = redis_url
+        self.capacity = capacity
+
+        self.send_times = {}
+        self.latencies = []
+        self.acks = 0
+        self.errors = 0
+        self.reads_sent = 0
+
+    def channel_layers(self):
+        if self.redis_url:
+            return {
+                'default': {
+                    'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                    'CONFIG': {'hosts': [self.redis_url], 'capacity': self.capacity},
+                },
+            }
+        return {
+            'default': {
+                'BACKEND': 'channels.layers.InMemoryChannelLayer',
+                'CONFIG': {'capacity': self.capacity},
+            },
+        }
+
+    def create_fixtures(self):
+        """Пользователи и чаты; пользователь i состоит в чате i % M"""
+        run_id = uuid.uuid4().hex[:8]
+        User.objects.bulk_create([
+            User(username=f'bench_{run_id}_{i}', email=f'bench_{run_id}_{i}@example.com', role='student')
+            for i in range(self.users_count)
+        ])
+        users = list(User.objects.filter(username__startswith=f'bench_{run_id}_').order_by('id'))
+
+        ChatRoom.objects.bulk_create([
+            ChatRoom(name=f'bench_{run_id}_{i}', chat_type='group', created_by=users[i])
+            for i in range(self.rooms_count)
+        ])
+        rooms = list(ChatRoom.objects.filter(name__startswith=f'bench_{run_id}_').order_by('id'))
+
+        Membership = ChatRoom.participants.through
+        Membership.objects.bulk_create([
+            Membership(chatroom_id=rooms[i % self.rooms_count].id, user_id=user.id)
+            for i, user in enumerate(users)
+        ])
+        return [(user, rooms[i % self.rooms_count].id) for i, user in enumerate(users)]
+
+    def expected_deliveries(self, members):
+        """Каждое сообщение должно дойти до всех остальных участников чата"""
+        room_sizes = Counter(room_id for _, room_id in members)
+        return sum((room_sizes[room_id] - 1) * self.messages_per_user for _, room_id in members)
+
+    async def reader(self, communicator, user_id, room_id, stop):
+        """Чтение входящих событий соединения и учет задержки доставки"""
+        received = 0
+        while True:
+            # Очередь читаем напрямую: таймаут receive_from отменяет само приложение
+            try:
+                output = await asyncio.wait_for(communicator.output_queue.get(), timeout=0.05)
+            except asyncio.TimeoutError:
+                if stop.is_set():
+                    break
+                continue
+            if output['type'] != 'websocket.send':
+                continue
+            event = json.loads(output['text'])
+
+            if event['type'] == 'ack':
+                self.acks += 1
+            elif event['type'] == 'error':
+                self.errors += 1
+            elif event['type'] == 'message':
+                message = event['data']
+                if message['sender']['id'] == user_id:
+                    continue
+                sent_at = self.send_times.get(message['content'])
+                if sent_at is not None:
+                    self.latencies.append((time.perf_counter() - sent_at) * 1000)
+                received += 1
+                if received % READ_EVERY == 0:
+                    self.reads_sent += 1
+                    await communicator.send_json_to({
+                        'type': 'read',
+                        'room_id': room_id,
+                        'message_id': message['id'],
+                    })
+
+    async def sender(self, communicator, user_id, room_id):
+        for i in range(self.messages_per_user):
+            content = f'bench:{user_id}:{i}'
+            await communicator.send_json_to({'type': 'typing', 'room_id': room_id, 'is_typing': True})
+            self.send_times[content] = time.perf_counter()
+            await communicator.send_json_to({
+                'type': 'message',
+                'room_id': room_id,
+                'content': content,
+                'client_id': content,
+            })
+            await communicator.send_json_to({'type': 'typing', 'room_id': room_id, 'is_typing': False})
+            await asyncio.sleep(0)
+
+    async def run_async(self, members):
+        with QueryCounter() as queries:
+            tracemalloc.start()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+            connect_started = time.perf_counter()
+            communicators = []
+            for user, room_id in members:
+                communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), 'ws/chat/')
+                communicator.scope['user'] = user
+                connected, _ = await communicator.connect()
+                if not connected:
+                    raise RuntimeError(f'Соединение пользователя {user.id} отклонено')
+                communicators.append((communicator, user.id, room_id))
+            connect_seconds = time.perf_counter() - connect_started
+
+            memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / len(communicators)
+            tracemalloc.stop()
+
+            stop = asyncio.Event()
+            readers = [
+                asyncio.ensure_future(self.reader(communicator, user_id, room_id, stop))
+                for communicator, user_id, room_id in communicators
+            ]
+
+            queries_before = queries.count
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                self.sender(communicator, user_id, room_id)
+                for communicator, user_id, room_id in communicators
+            ])
+            # Ждем подтверждений и доставки; потерянные события не ждем дольше DRAIN_IDLE
+            expected_acks = len(communicators) * self.messages_per_user
+            expected_deliveries = self.expected_deliveries(members)
+            deadline = time.perf_counter() + DRAIN_TIMEOUT
+            progress = (-1, -1)
+            idle_since = time.perf_counter()
+            while time.perf_counter() < deadline:
+                current = (self.acks + self.errors, len(self.latencies))
+                if current[0] >= expected_acks and current[1] >= expected_deliveries:
+                    break
+                if current != progress:
+                    progress, idle_since = current, time.perf_counter()
+                elif time.perf_counter() - idle_since > DRAIN_IDLE:
+                    break
+                await asyncio.sleep(0.05)
+            duration = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*readers)
+            query_count = queries.count - queries_before
+
+            for communicator, _, _ in communicators:
+                await communicator.disconnect()
+
+        sent = len(self.send_times)
+        latencies = sorted(self.latencies)
+        return {
+            'connections': len(communicators),
+            'rooms': self.rooms_count,
+            'messages': sent,
+            'acks': self.acks,
+            'errors': self.errors,
+            'deliveries': len(latencies),
+            'expected_deliveries': expected_deliveries,
+            'lost_deliveries': expected_deliveries - len(latencies),
+            'reads': self.reads_sent,
+            'duration': round(duration, 3),
+            'messages_per_second': round(sent / duration, 1) if duration else 0.0,
+            'connect_seconds': round(connect_seconds, 3),
+            'latency_p50_ms': round(percentile(latencies, 50), 2),
+            'latency_p95_ms': round(percentile(latencies, 95), 2),
+            'latency_p99_ms': round(percentile(latencies, 99), 2),
+            'queries': query_count,
+            'queries_per_message': round(query_count / sent, 2) if sent else 0.0,
+            'memory_per_connection_kb': round(memory_per_connection / 1024, 1),
+        }
+
+    def run(self):
+        members = self.create_fixtures()
+        with override_settings(CHANNEL_LAYERS=self.channel_layers()):
+            return asyncio.run(self.run_async(members))
@@ -1,25 +1,40 @@
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from .models import ChatRoom, Message, MessageReadStatus
+from .models import ChatRoom, Message
+from .services import MessageWriteBuffer, ReadReceiptService
 from accounts.models import User
 
 User = get_user_model()
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    # Системные сообщения создает только сервер
+    CLIENT_MESSAGE_TYPES = frozenset(
+        value for value, _ in Message.MESSAGE_TYPE_CHOICES if value != 'system'
+    )
+    
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_anonymous:
             await self.close()
         else:
+            # Набор чатов пользователя живет в памяти соединения и
+            # обновляется управляющими событиями chat_membership
+            self.room_ids = await self.get_user_room_ids()
+            self.pending_messages = set()
+            self.sender_data = {
+                'id': self.user.id,
+                'username': self.user.username,
+                'full_name': self.user.get_full_name(),
+            }
+            
             # Присоединяемся к группам всех чатов пользователя
-            user_rooms = await self.get_user_rooms()
-            for room in user_rooms:
-                await self.channel_layer.group_add(
-                    f"chat_{room.id}",
-                    self.channel_name
-                )
+            await asyncio.gather(*[
+                self.channel_layer.group_add(f"chat_{room_id}", self.channel_name)
+                for room_id in self.room_ids
+            ])
             
             # Присоединяемся к группе пользователя для личных уведомлений
             await self.channel_layer.group_add(
@@ -34,13 +49,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         if not self.user.is_anonymous:
+            # Дожидаемся записи уже принятых сообщений
+            if getattr(self, 'pending_messages', None):
+                await asyncio.gather(*self.pending_messages, return_exceptions=True)
+            
             # Покидаем все группы
-            user_rooms = await self.get_user_rooms()
-            for room in user_rooms:
-                await self.channel_layer.group_discard(
-                    f"chat_{room.id}",
-                    self.channel_name
-                )
+            await asyncio.gather(*[
+                self.channel_layer.group_discard(f"chat_{room_id}", self.channel_name)
+                for room_id in getattr(self, 'room_ids', ())
+            ])
             
             await self.channel_layer.group_discard(
                 f"user_{self.user.id}",
@@ -50,6 +67,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
             # Отправляем статус "оффлайн"
             await self.set_user_online(False)
 
+    def get_member_room_id(self, data):
+        """id чата из сообщения клиента, если пользователь его участник"""
+        try:
+            room_id = int(data.get('room_id'))
+        except (TypeError, ValueError):
+            return None
+        return room_id if room_id in self.room_ids else None
+
     async def receive(self, text_data):
         data = json.loads(text_data)
         message_type = data.get('type')
@@ -63,17 +88,58 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def handle_new_message(self, data):
         """Обработка нового сообщения"""
-        room_id = data.get('room_id')
         content = data.get('content')
-        message_type = data.get('message_type', 'text')
+        message_type = data.get('message_type') or 'text'
         
         # Проверяем, что пользователь участник чата
-        room = await self.get_room(room_id)
-        if not room or not await self.is_user_in_room(room):
+        room_id = self.get_member_room_id(data)
+        if room_id is None:
             return
         
-        # Создаем сообщение
-        message = await self.create_message(room, content, message_type)
+        # Проверяем до буфера: иначе одно неверное сообщение роняет всю пачку
+        if not isinstance(content, str) or not content.strip():
+            await self.send_error(data.get('client_id'), 'Сообщение не может быть пустым')
+            return
+        if message_type not in self.CLIENT_MESSAGE_TYPES:
+            await self.send_error(data.get('client_id'), 'Недопустимый тип сообщения')
+            return
+        
+        # Сообщение сохраняется пачкой вместе с сообщениями других соединений.
+        # Сохранения ждем в отдельной задаче: пока пачка пишется, консьюмер
+        # продолжает разбирать входящие события и свою очередь в channel layer
+        pending = MessageWriteBuffer.get().add(Message(
+            room_id=room_id,
+            sender=self.user,
+            content=content,
+            message_type=message_type
+        ))
+        task = asyncio.ensure_future(self.broadcast_saved_message(pending, room_id, data.get('client_id')))
+        self.pending_messages.add(task)
+        task.add_done_callback(self.pending_messages.discard)
+
+    async def send_error(self, client_id, error):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'client_id': client_id,
+            'error': error
+        }))
+
+    async def broadcast_saved_message(self, pending, room_id, client_id):
+        """Подтверждение отправителю и рассылка участникам после записи в БД"""
+        try:
+            message = await pending
+        except Exception:
+            await self.send_error(client_id, 'Не удалось сохранить сообщение')
+            return
+        
+        # Подтверждение отправителю: сообщение сохранено в БД
+        await self.send(text_data=json.dumps({
+            'type': 'ack',
+            'client_id': client_id,
+            'id': message.id,
+            'room_id': room_id,
+            'created_at': message.created_at.isoformat(),
+        }))
         
         # Отправляем сообщение всем участникам чата
         await self.channel_layer.group_send(
@@ -83,11 +149,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'message': {
                     'id': message.id,
                     'content': message.content,
-                    'sender': {
-                        'id': message.sender.id,
-                        'username': message.sender.username,
-                        'full_name': message.sender.get_full_name(),
-                    },
+                    'sender': self.sender_data,
                     'room_id': room_id,
                     'created_at': message.created_at.isoformat(),
                     'message_type': message.message_type,
@@ -97,19 +159,17 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def handle_typing(self, data):
         """Обработка индикатора набора текста"""
-        room_id = data.get('room_id')
         is_typing = data.get('is_typing', False)
+        room_id = self.get_member_room_id(data)
+        if room_id is None:
+            return
         
         # Отправляем статус набора текста другим участникам
         await self.channel_layer.group_send(
             f"chat_{room_id}",
             {
                 'type': 'typing_indicator',
-                'user': {
-                    'id': self.user.id,
-                    'username': self.user.username,
-                    'full_name': self.user.get_full_name(),
-                },
+                'user': self.sender_data,
                 'is_typing': is_typing,
                 'room_id': room_id,
             }
@@ -118,10 +178,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def handle_message_read(self, data):
         """Обработка прочтения сообщения"""
         message_id = data.get('message_id')
-        room_id = data.get('room_id')
+        room_id = self.get_member_room_id(data)
+        if room_id is None:
+            return
         
         # Отмечаем сообщение как прочитанное
-        await self.mark_message_as_read(message_id)
+        await self.mark_message_as_read(room_id, message_id)
         
         # Уведомляем других участников
         await self.channel_layer.group_send(
@@ -134,6 +196,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }
         )
 
+    async def chat_membership(self, event):
+        """Управляющее событие: пользователя добавили в чаты или удалили из них"""
+        room_ids = set(event['room_ids'])
+        if event['action'] == 'add':
+            new_room_ids = room_ids - self.room_ids
+            self.room_ids |= new_room_ids
+            await asyncio.gather(*[
+                self.channel_layer.group_add(f"chat_{room_id}", self.channel_name)
+                for room_id in new_room_ids
+            ])
+        else:
+            removed_room_ids = room_ids & self.room_ids
+            self.room_ids -= removed_room_ids
+            await asyncio.gather(*[
+                self.channel_layer.group_discard(f"chat_{room_id}", self.channel_name)
+                for room_id in removed_room_ids
+            ])
+        
+        await self.send(text_data=json.dumps({
+            'type': 'membership',
+            'data': {
+                'action': event['action'],
+                'room_ids': sorted(room_ids),
+            }
+        }))
+
     async def chat_message(self, event):
         """Отправка сообщения клиенту"""
         await self.send(text_data=json.dumps({
@@ -158,40 +246,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def get_user_rooms(self):
-        return list(ChatRoom.objects.filter(participants=self.user, is_active=True))
-
-    @database_sync_to_async
-    def get_room(self, room_id):
-        try:
-            return ChatRoom.objects.get(id=room_id, is_active=True)
-        except ChatRoom.DoesNotExist:
-            return None
-
-    @database_sync_to_async
-    def is_user_in_room(self, room):
-        return room.participants.filter(id=self.user.id).exists()
-
-    @database_sync_to_async
-    def create_message(self, room, content, message_type):
-        return Message.objects.create(
-            room=room,
-            sender=self.user,
-            content=content,
-            message_type=message_type
+    def get_user_room_ids(self):
+        return set(
+            ChatRoom.objects.filter(participants=self.user, is_active=True).values_list('id', flat=True)
         )
 
     @database_sync_to_async
-    def mark_message_as_read(self, message_id):
-        try:
-            message = Message.objects.get(id=message_id)
-            if message.sender != self.user:
-                MessageReadStatus.objects.get_or_create(
-                    message=message,
-                    user=self.user
-                )
-        except Message.DoesNotExist:
-            pass
+    def mark_message_as_read(self, room_id, message_id):
+        room = ChatRoom(id=room_id)
+        ReadReceiptService.mark_read(self.user, room, message_ids=[message_id])
 
     @database_sync_to_async
     def set_user_online(self, is_online):
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chat.benchmark import CHANNEL_CAPACITY, ChatBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест WebSocket чата (ChatConsumer) на отдельной тестовой БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Число одновременных соединений')
+        parser.add_argument('--rooms', type=int, default=5, help='Число чатов')
+        parser.add_argument('--messages', type=int, default=10, help='Сообщений от каждого пользователя')
+        parser.add_argument(
+            '--redis-url',
+            default=None,
+            help='Локальный Redis для RedisChannelLayer (по умолчанию InMemoryChannelLayer)'
+        )
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=CHANNEL_CAPACITY,
+            help='Емкость очереди канала в channel layer'
+        )
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            stats = ChatBenchmark(
+                users=options['users'],
+                rooms=options['rooms'],
+                messages=options['messages'],
+                redis_url=options['redis_url'],
+                capacity=options['capacity'],
+            ).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"Соединений: {stats['connections']}, чатов: {stats['rooms']}, "
+            f"подключение: {stats['connect_seconds']} с"
+        )
+        self.stdout.write(
+            f"Сообщений: {stats['messages']} (подтверждено {stats['acks']}, ошибок {stats['errors']}), "
+            f"доставок: {stats['deliveries']} из {stats['expected_deliveries']} "
+            f"(потеряно {stats['lost_deliveries']}), прочтений: {stats['reads']}"
+        )
+        self.stdout.write(f"Пропускная способность: {stats['messages_per_second']} сообщений/с")
+        self.stdout.write(
+            f"Задержка доставки p50/p95/p99: {stats['latency_p50_ms']} / "
+            f"{stats['latency_p95_ms']} / {stats['latency_p99_ms']} мс"
+        )
+        self.stdout.write(f"Запросов к БД на сообщение: {stats['queries_per_message']}")
+        self.stdout.write(f"Память на соединение: {stats['memory_per_connection_kb']} КБ")
+        self.stdout.write(self.style.SUCCESS('✅ Нагрузочный тест завершен'))
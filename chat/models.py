@@ -132,7 +132,7 @@ class Message(models.Model):
         verbose_name_plural = _('Сообщения')
         ordering = ['created_at']
         indexes = [
-            models.Index(fields=['room', 'created_at']),
+            models.Index(fields=['room', 'created_at', 'id']),
             models.Index(fields=['sender', 'is_read']),
         ]
     
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import ChatRoom, Message, MessageReadStatus, ChatSettings
 from accounts.models import User
+from notifications.counters import UnreadCounterService
+from config.protected_media import ProtectedFileField
 
 class ChatRoomSerializer(serializers.ModelSerializer):
     participants_data = serializers.SerializerMethodField(read_only=True)
@@ -26,9 +28,10 @@ class ChatRoomSerializer(serializers.ModelSerializer):
     def get_unread_messages_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(
-                is_read=False
-            ).exclude(sender=request.user).count()
+            # Счетчики пользователя читаются один раз на весь список чатов
+            if 'unread_counts' not in self.context:
+                self.context['unread_counts'] = UnreadCounterService.get_room_counts(request.user.id)
+            return self.context['unread_counts'].get(obj.id, 0)
         return 0
     
     def get_last_message(self, obj):
@@ -46,6 +49,7 @@ class MessageSerializer(serializers.ModelSerializer):
     sender_data = serializers.SerializerMethodField(read_only=True)
     reply_to_data = serializers.SerializerMethodField(read_only=True)
     is_read_by_me = serializers.SerializerMethodField(read_only=True)
+    file = ProtectedFileField('chat_file', required=False, allow_null=True)
     
     class Meta:
         model = Message
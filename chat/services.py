@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from accounts.models import User
+from .models import Message, MessageReadStatus
+from notifications.counters import UnreadCounterService
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки при вставке статусов прочтения
+READ_STATUS_BATCH_SIZE = 1000
+
+
+class ReadReceiptService:
+    """Отметка сообщений прочитанными набором запросов, не зависящим от числа сообщений"""
+
+    @staticmethod
+    def mark_read(user, room, message_ids=None):
+        """Отметить сообщения чата прочитанными пользователем
+
+        Без message_ids отмечаются все непрочитанные пользователем сообщения.
+        Возвращает (число новых статусов прочтения, id сообщений, прочитанных всеми).
+        Статусы, которые параллельный запрос (другое устройство) вставил до подсчета,
+        в счетчике не учитываются. Подсчет до и после вставки не атомарен: вставку
+        между ними счетчик может учесть дважды, такие расхождения исправляет сверка
+        reconcile_unread_counters.
+        """
+        messages = Message.objects.filter(room=room).exclude(sender=user)
+        if message_ids is not None:
+            messages = messages.filter(id__in=message_ids)
+        unread_ids = list(
+            messages.exclude(read_statuses__user=user).values_list('id', flat=True)
+        )
+
+        now = timezone.now()
+        inserted = 0
+        if unread_ids:
+            # ignore_conflicts не сообщает, какие строки вставлены: пересчет до и после вставки
+            statuses = MessageReadStatus.objects.filter(user=user, message_id__in=unread_ids)
+            with transaction.atomic():
+                existing = statuses.count()
+                MessageReadStatus.objects.bulk_create(
+                    [MessageReadStatus(message_id=message_id, user=user, read_at=now) for message_id in unread_ids],
+                    batch_size=READ_STATUS_BATCH_SIZE,
+                    ignore_conflicts=True
+                )
+                inserted = statuses.count() - existing
+
+        if message_ids is None:
+            UnreadCounterService.room_read(user.id, room.id)
+        else:
+            UnreadCounterService.messages_read(user.id, room.id, inserted)
+
+        # Сообщение прочитано, когда его отметили все участники, кроме отправителя
+        fully_read_ids = []
+        if unread_ids:
+            readers_needed = room.participants.count() - 1
+            fully_read_ids = list(
+                Message.objects.filter(
+                    room=room,
+                    is_read=False,
+                    id__in=unread_ids
+                ).annotate(
+                    readers=Count('read_statuses', filter=~Q(read_statuses__user=F('sender')))
+                ).filter(
+                    readers__gte=readers_needed
+                ).values_list('id', flat=True)
+            )
+        if fully_read_ids:
+            Message.objects.filter(id__in=fully_read_ids).update(is_read=True, updated_at=now)
+
+        return inserted, fully_read_ids
+
+
+class MembershipEventService:
+    """Управляющие события в группу user_{id}: подключенный ChatConsumer обновляет свой набор чатов"""
+
+    @staticmethod
+    def publish(user_ids, room_ids, action):
+        """Сообщить пользователям о добавлении ('add') или удалении ('remove') из чатов"""
+        user_ids = list(user_ids)
+        room_ids = list(room_ids)
+        if not user_ids or not room_ids:
+            return
+
+        def send():
+            channel_layer = get_channel_layer()
+            if channel_layer is None:
+                return
+            for user_id in user_ids:
+                try:
+                    async_to_sync(channel_layer.group_send)(
+                        f"user_{user_id}",
+                        {
+                            'type': 'chat_membership',
+                            'action': action,
+                            'room_ids': room_ids,
+                        }
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка отправки события членства в чате пользователю {user_id}: {str(e)}")
+
+        transaction.on_commit(send, robust=True)
+
+
+class MessageWriteBuffer:
+    """Write-behind буфер сообщений чата: один на event loop процесса
+
+    Сообщения из всех соединений копятся в памяти и сохраняются одним
+    bulk_create раз в CHAT_MESSAGE_FLUSH_INTERVAL_MS или по
+    CHAT_MESSAGE_FLUSH_SIZE сообщений. add() возвращает сохраненное
+    сообщение только после фиксации пачки в БД.
+    """
+
+    _buffers = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self.pending = []
+        self.timer = None
+        self.interval = getattr(settings, 'CHAT_MESSAGE_FLUSH_INTERVAL_MS', 50) / 1000
+        self.max_size = max(getattr(settings, 'CHAT_MESSAGE_FLUSH_SIZE', 100), 1)
+
+    @classmethod
+    def get(cls):
+        loop = asyncio.get_running_loop()
+        if loop not in cls._buffers:
+            cls._buffers[loop] = cls()
+        return cls._buffers[loop]
+
+    async def add(self, message):
+        """Поставить сообщение в буфер и дождаться его сохранения"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((message, future))
+
+        if len(self.pending) >= self.max_size:
+            loop.create_task(self.flush())
+        elif self.timer is None:
+            self.timer = loop.call_later(self.interval, lambda: loop.create_task(self.flush()))
+
+        return await future
+
+    async def flush(self):
+        """Сохранить накопленные сообщения одной пачкой"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        try:
+            messages = await database_sync_to_async(self.persist)([message for message, _ in batch])
+        except Exception as e:
+            logger.error(f"Ошибка сохранения пачки сообщений чата ({len(batch)} шт.): {str(e)}")
+            # Пачка откатилась целиком: сохраняем по одному, ошибку получит только виновное сообщение
+            for message, future in batch:
+                try:
+                    saved, = await database_sync_to_async(self.persist)([message])
+                except Exception as e:
+                    logger.error(f"Ошибка сохранения сообщения в чате {message.room_id}: {str(e)}")
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(saved)
+            return
+
+        for message, (_, future) in zip(messages, batch):
+            if not future.done():
+                future.set_result(message)
+
+    @staticmethod
+    def persist(messages):
+        """Сохранить сообщения и разослать сигнал messages_created
+
+        bulk_create не отправляет post_save: уведомления и счетчики непрочитанного
+        обрабатываются пачкой, участники всех чатов пачки читаются одним запросом.
+        """
+        from .signals import messages_created
+
+        with transaction.atomic():
+            messages = Message.objects.bulk_create(messages)
+            participants = defaultdict(list)
+            for user in User.objects.filter(
+                chat_rooms__in={message.room_id for message in messages}
+            ).annotate(chat_room_id=F('chat_rooms')):
+                participants[user.chat_room_id].append(user)
+
+            responses = messages_created.send_robust(
+                sender=Message,
+                messages=messages,
+                participants=dict(participants)
+            )
+            for receiver, response in responses:
+                if isinstance(response, Exception):
+                    logger.error(f"Ошибка обработчика {receiver.__name__} для пачки сообщений: {str(response)}")
+        return messages
@@ -1,9 +1,32 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
+from collections import Counter, defaultdict
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver, Signal
 from .models import Message, ChatRoom, ChatSettings
 from accounts.models import User
+from notifications.counters import UnreadCounterService
+from .services import MembershipEventService
+from notifications.tasks import queue_mass_email
+from config.protected_media import ProtectedMediaService
+
+# Пачка сообщений сохранена bulk_create (MessageWriteBuffer.persist).
+# Аргументы: messages, participants ({room_id: [участники чата]})
+messages_created = Signal()
+
+def new_message_email(participant, sender_user, message):
+    """Письмо участнику о новом сообщении (subject, message, [email])"""
+    subject = f'Новое сообщение в чате'
+    message_content = f'''
+                        Здравствуйте, {participant.get_full_name() or participant.username}!
+                        
+                        {sender_user.get_full_name() or sender_user.username} отправил новое сообщение в чат:
+                        "{message.content[:100]}{'...' if len(message.content) > 100 else ''}"
+                        
+                        Перейдите в чат, чтобы ответить.
+                        
+                        С уважением,
+                        Онлайн-школа
+                        '''
+    return subject, message_content, [participant.email]
 
 @receiver(post_save, sender=Message)
 def notify_new_message(sender, instance, created, **kwargs):
@@ -13,6 +36,7 @@ def notify_new_message(sender, instance, created, **kwargs):
         sender_user = instance.sender
         
         # Получаем настройки чата для каждого участника
+        emails = []
         for participant in room.participants.exclude(id=sender_user.id):
             # Проверяем настройки уведомлений
             chat_settings, created = ChatSettings.objects.get_or_create(user=participant)
@@ -21,28 +45,80 @@ def notify_new_message(sender, instance, created, **kwargs):
                 # Отправляем email уведомление
                 if participant.email:
                     try:
-                        subject = f'Новое сообщение в чате'
-                        message_content = f'''
-                        Здравствуйте, {participant.get_full_name() or participant.username}!
-                        
-                        {sender_user.get_full_name() or sender_user.username} отправил новое сообщение в чат:
-                        "{instance.content[:100]}{'...' if len(instance.content) > 100 else ''}"
-                        
-                        Перейдите в чат, чтобы ответить.
-                        
-                        С уважением,
-                        Онлайн-школа
-                        '''
-                        
-                        send_mail(
-                            subject,
-                            message_content,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [participant.email],
-                            fail_silently=True,
-                        )
+                        emails.append(new_message_email(participant, sender_user, instance))
                     except Exception as e:
                         print(f"Ошибка отправки email: {e}")
+        queue_mass_email(emails)
+
+@receiver(post_save, sender=Message)
+def count_unread_message(sender, instance, created, **kwargs):
+    """Учет нового сообщения в счетчиках непрочитанного участников"""
+    if created:
+        UnreadCounterService.message_created(instance)
+
+@receiver(messages_created)
+def notify_new_messages_bulk(sender, messages, participants, **kwargs):
+    """Письма о пачке новых сообщений: настройки чата всех участников одним запросом"""
+    users = {user.id: user for room_users in participants.values() for user in room_users}
+    chat_settings = {
+        settings.user_id: settings
+        for settings in ChatSettings.objects.filter(user_id__in=users)
+    }
+    missing = [ChatSettings(user_id=user_id) for user_id in users if user_id not in chat_settings]
+    if missing:
+        ChatSettings.objects.bulk_create(missing, ignore_conflicts=True)
+        chat_settings.update({settings.user_id: settings for settings in missing})
+    
+    emails = []
+    for message in messages:
+        sender_user = users.get(message.sender_id) or message.sender
+        for participant in participants.get(message.room_id, ()):
+            settings = chat_settings[participant.id]
+            if (
+                participant.id != message.sender_id
+                and participant.email
+                and settings.notifications_enabled
+                and settings.message_notifications
+            ):
+                emails.append(new_message_email(participant, sender_user, message))
+    queue_mass_email(emails)
+
+@receiver(messages_created)
+def count_unread_messages_bulk(sender, messages, participants, **kwargs):
+    """Учет пачки сообщений в счетчиках непрочитанного одним обновлением"""
+    deltas = defaultdict(Counter)
+    for message in messages:
+        field = UnreadCounterService.room_field(message.room_id)
+        for participant in participants.get(message.room_id, ()):
+            if participant.id != message.sender_id:
+                deltas[participant.id][field] += 1
+    UnreadCounterService.apply(deltas)
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def publish_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновление набора чатов в открытых WebSocket соединениях участников"""
+    if action == 'pre_clear':
+        # Для clear состав известен только до удаления
+        if reverse:
+            instance._cleared_pks = list(instance.chat_rooms.values_list('id', flat=True))
+        else:
+            instance._cleared_pks = list(instance.participants.values_list('id', flat=True))
+        return
+    
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_pks', [])
+        membership_action = 'remove'
+    elif action == 'post_add':
+        membership_action = 'add'
+    elif action == 'post_remove':
+        membership_action = 'remove'
+    else:
+        return
+    
+    if reverse:
+        MembershipEventService.publish([instance.id], pk_set, membership_action)
+    else:
+        MembershipEventService.publish(pk_set, [instance.id], membership_action)
 
 @receiver(post_save, sender=ChatRoom)
 def create_default_chat_settings(sender, instance, created, **kwargs):
@@ -65,4 +141,28 @@ def cleanup_message_files(sender, instance, **kwargs):
         try:
             instance.image.delete(save=False)
         except Exception as e:
-            print(f"Ошибка удаления изображения: {e}")
\ No newline at end of file
+            print(f"Ошибка удаления изображения: {e}")
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_chat_file_access(sender, instance, **kwargs):
+    """Права на файл сообщения в кеше ProtectedMediaService"""
+    ProtectedMediaService.invalidate('chat_file', instance.pk)
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def invalidate_room_files_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав чата: права на файлы его сообщений"""
+    if reverse and action == 'pre_clear':
+        instance._protected_media_room_ids = list(instance.chat_rooms.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        room_ids = [instance.pk]
+    elif action == 'post_clear':
+        room_ids = getattr(instance, '_protected_media_room_ids', [])
+    else:
+        room_ids = pk_set
+    ProtectedMediaService.invalidate_many('chat_file', Message.objects.filter(
+        room_id__in=list(room_ids)
+    ).exclude(file='').exclude(file__isnull=True).values_list('pk', flat=True))
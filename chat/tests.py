@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -66,4 +66,289 @@ class ChatTestCase(APITestCase):
         response = self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 1)
+    
+    def test_unread_counters(self):
+        """Счетчики непрочитанного по чатам"""
+        from django.core.cache import cache
+        cache.clear()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            messages = [
+                Message.objects.create(room=self.chat_room, sender=self.user1, content=f'Сообщение {i}')
+                for i in range(3)
+            ]
+        
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get('/api/chat/unread/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'room_id': self.chat_room.id, 'unread_count': 3}])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/chat/messages/mark-read/', {
+                'room_id': self.chat_room.id,
+                'message_ids': [messages[0].id]
+            }, format='json')
+        response = self.client.get('/api/chat/rooms/')
+        self.assertEqual(response.data['results'][0]['unread_messages_count'], 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/chat/messages/mark-read/', {'room_id': self.chat_room.id}, format='json')
+        response = self.client.get('/api/chat/unread/')
+        self.assertEqual(response.data, [])
+        
+        # Отправитель свои сообщения непрочитанными не видит
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get('/api/chat/unread/')
+        self.assertEqual(response.data, [])
+
+class ReadReceiptTestCase(APITestCase):
+    """Тесты массовой отметки сообщений прочитанными"""
+    
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@test.com',
+                password='testpass123',
+                role='student'
+            )
+            for i in range(3)
+        ]
+        self.sender = self.users[0]
+        self.room = ChatRoom.objects.create(chat_type='group', created_by=self.sender)
+        self.room.participants.add(*self.users)
+    
+    def create_messages(self, count):
+        return Message.objects.bulk_create([
+            Message(room=self.room, sender=self.sender, content=f'Сообщение {i}')
+            for i in range(count)
+        ])
+    
+    def mark_read_queries(self, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/chat/messages/mark-read/', {'room_id': self.room.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def test_query_count_does_not_grow(self):
+        """Число запросов не зависит от числа сообщений"""
+        self.create_messages(3)
+        small = self.mark_read_queries(self.users[1])
+        
+        self.create_messages(60)
+        large = self.mark_read_queries(self.users[1])
+        self.assertEqual(small, large)
+    
+    def test_is_read_after_all_participants(self):
+        """Флаг is_read ставится, когда прочитали все участники, кроме отправителя"""
+        from .models import MessageReadStatus
+        
+        messages = self.create_messages(4)
+        
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.post('/api/chat/messages/mark-read/', {'room_id': self.room.id}, format='json')
+        self.assertEqual(response.data['updated_messages'], 0)
+        self.assertFalse(Message.objects.filter(is_read=True).exists())
+        
+        self.client.force_authenticate(user=self.users[2])
+        response = self.client.post('/api/chat/messages/mark-read/', {
+            'room_id': self.room.id,
+            'message_ids': [messages[0].id, messages[1].id]
+        }, format='json')
+        self.assertEqual(response.data['updated_messages'], 2)
+        self.assertEqual(
+            set(Message.objects.filter(is_read=True).values_list('id', flat=True)),
+            {messages[0].id, messages[1].id}
+        )
+        
+        # Повторная отметка не создает дублей
+        response = self.client.post('/api/chat/messages/mark-read/', {'room_id': self.room.id}, format='json')
+        self.assertEqual(response.data['updated_messages'], 2)
+        self.assertEqual(MessageReadStatus.objects.count(), 8)
+        self.assertEqual(Message.objects.filter(is_read=True).count(), 4)
+
+    def test_concurrent_receipts_not_counted(self):
+        """Статусы, вставленные параллельным запросом, не уменьшают счетчик второй раз"""
+        from unittest import mock
+        from django.utils import timezone
+        from .models import MessageReadStatus
+        from .services import ReadReceiptService
+
+        messages = self.create_messages(3)
+        reader = self.users[1]
+        now = timezone.now()
+        calls = []
+
+        def now_after_other_device():
+            # Другое устройство отметило первое сообщение уже после выборки непрочитанных
+            calls.append(now)
+            if len(calls) == 1:
+                MessageReadStatus.objects.create(message=messages[0], user=reader)
+            return now
+
+        with mock.patch('chat.services.timezone.now', side_effect=now_after_other_device), \
+                mock.patch('chat.services.UnreadCounterService.messages_read') as messages_read:
+            inserted, _ = ReadReceiptService.mark_read(reader, self.room, [message.id for message in messages])
+
+        self.assertEqual(inserted, 2)
+        messages_read.assert_called_once_with(reader.id, self.room.id, 2)
+        self.assertEqual(MessageReadStatus.objects.filter(user=reader).count(), 3)
+
+class MembershipEventTestCase(APITestCase):
+    """Тесты управляющих событий об изменении состава чата"""
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner',
+            email='owner@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.room = ChatRoom.objects.create(chat_type='group', created_by=self.owner)
+        self.room.participants.add(self.owner)
+        
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        self.channel_layer = get_channel_layer()
+        self.channel_name = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(f'user_{self.member.id}', self.channel_name)
+        self.client.force_authenticate(user=self.owner)
+    
+    def tearDown(self):
+        from asgiref.sync import async_to_sync
+        async_to_sync(self.channel_layer.flush)()
+    
+    def receive(self):
+        from asgiref.sync import async_to_sync
+        return async_to_sync(self.channel_layer.receive)(self.channel_name)
+    
+    def test_add_and_remove_participant(self):
+        """Добавление и удаление участника отправляет событие в группу пользователя"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/chat/rooms/{self.room.id}/participants/add/',
+                {'user_id': self.member.id}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.receive(), {
+            'type': 'chat_membership',
+            'action': 'add',
+            'room_ids': [self.room.id],
+        })
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/chat/rooms/{self.room.id}/participants/remove/',
+                {'user_id': self.member.id}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.receive()['action'], 'remove')
+
+class MessageWriteBufferTestCase(TransactionTestCase):
+    """Тесты пакетной записи сообщений из WebSocket"""
+    
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='sender',
+            email='sender@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.reader = User.objects.create_user(
+            username='reader',
+            email='reader@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.room = ChatRoom.objects.create(chat_type='private', created_by=self.sender)
+        self.room.participants.add(self.sender, self.reader)
+    
+    def test_messages_flushed_in_one_insert(self):
+        """Сообщения нескольких соединений сохраняются одним INSERT"""
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from notifications.counters import UnreadCounterService
+        from .services import MessageWriteBuffer
+        
+        async def send_all():
+            buffer = MessageWriteBuffer.get()
+            return await asyncio.gather(*[
+                buffer.add(Message(room_id=self.room.id, sender=self.sender, content=f'Сообщение {i}'))
+                for i in range(5)
+            ])
+        
+        with CaptureQueriesContext(connection) as context:
+            messages = async_to_sync(send_all)()
+        
+        inserts = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('INSERT INTO "chat_message"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        # Настройки чата участников читаются один раз на пачку, а не на сообщение
+        settings_queries = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "chat_chatsettings"' in query['sql']
+        ]
+        self.assertEqual(len(settings_queries), 1)
+        self.assertTrue(all(message.id for message in messages))
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('content', flat=True)),
+            [f'Сообщение {i}' for i in range(5)]
+        )
+        # Счетчики непрочитанного учитывают каждое сообщение пачки
+        self.assertEqual(UnreadCounterService.get_room_counts(self.reader.id), {self.room.id: 5})
+    
+    def test_failed_message_does_not_fail_batch(self):
+        """При ошибке пачки сообщения сохраняются по одному, ошибку получает только виновное"""
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from .services import MessageWriteBuffer
+        
+        async def send_all():
+            buffer = MessageWriteBuffer.get()
+            return await asyncio.gather(
+                buffer.add(Message(room_id=self.room.id, sender=self.sender, content='Первое')),
+                buffer.add(Message(room_id=self.room.id + 1000, sender=self.sender, content='В несуществующий чат')),
+                buffer.add(Message(room_id=self.room.id, sender=self.sender, content='Второе')),
+                return_exceptions=True
+            )
+        
+        first, failed, second = async_to_sync(send_all)()
+        
+        self.assertIsInstance(failed, Exception)
+        self.assertTrue(first.id and second.id)
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('content', flat=True)),
+            ['Первое', 'Второе']
+        )
+
+class ChatBenchmarkTestCase(TransactionTestCase):
+    """Прогон нагрузочного теста ChatConsumer в минимальной конфигурации"""
+    
+    def test_benchmark_reports_stats(self):
+        from .benchmark import ChatBenchmark
+        
+        stats = ChatBenchmark(users=4, rooms=2, messages=2).run()
+        
+        self.assertEqual(stats['connections'], 4)
+        self.assertEqual(stats['messages'], 8)
+        self.assertEqual(stats['acks'], 8)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['deliveries'], stats['expected_deliveries'])
+        self.assertEqual(Message.objects.count(), 8)
+        self.assertGreater(stats['queries_per_message'], 0)
+        self.assertGreater(stats['latency_p99_ms'], 0)
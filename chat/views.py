@@ -4,9 +4,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from config.pagination import KeysetPagination
 from django.db.models import Q, Count, Max
 from django.shortcuts import get_object_or_404
-from django.utils import timezone  # Добавили этот импорт
 from .models import ChatRoom, Message, MessageReadStatus, ChatSettings
 from accounts.models import User
 from .serializers import (
@@ -17,6 +17,8 @@ from .serializers import (
     UnreadMessagesSerializer
 )
 from .permissions import IsChatParticipant
+from .services import MembershipEventService, ReadReceiptService
+from notifications.counters import UnreadCounterService
 
 
 class ChatRoomListCreateView(generics.ListCreateAPIView):
@@ -49,11 +51,17 @@ class ChatRoomDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Мягкое удаление - деактивируем чат
         instance.is_active = False
         instance.save()
+        MembershipEventService.publish(
+            instance.participants.values_list('id', flat=True),
+            [instance.id],
+            'remove'
+        )
 
 class MessageListCreateView(generics.ListCreateAPIView):
     """Список сообщений и создание нового сообщения"""
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['room', 'message_type', 'is_read']
     ordering_fields = ['created_at']
@@ -69,17 +77,7 @@ class MessageListCreateView(generics.ListCreateAPIView):
             queryset = Message.objects.filter(room=room)
             
             # Отмечаем сообщения как прочитанные
-            unread_messages = queryset.filter(is_read=False).exclude(sender=user)
-            for message in unread_messages:
-                MessageReadStatus.objects.get_or_create(
-                    message=message,
-                    user=user,
-                    defaults={'read_at': timezone.now()}
-                )
-                # Обновляем флаг is_read если все участники прочитали
-                if message.read_statuses.count() >= room.participants.count() - 1:
-                    message.is_read = True
-                    message.save()
+            ReadReceiptService.mark_read(user, room)
             
             return queryset
         return Message.objects.none()
@@ -148,22 +146,26 @@ def get_unread_messages(request):
     """Получить количество непрочитанных сообщений по чатам"""
     user = request.user
     
-    # Получаем все чаты пользователя
-    user_rooms = ChatRoom.objects.filter(participants=user, is_active=True)
+    # Счетчики по чатам берем из кеша, из БД - только чаты с непрочитанным
+    unread_counts = {
+        room_id: count
+        for room_id, count in UnreadCounterService.get_room_counts(user.id).items()
+        if count > 0
+    }
+    user_rooms = ChatRoom.objects.filter(
+        id__in=unread_counts,
+        participants=user,
+        is_active=True
+    ).order_by('id')
     
-    unread_data = []
-    for room in user_rooms:
-        unread_count = Message.objects.filter(
-            room=room,
-            is_read=False
-        ).exclude(sender=user).count()
-        
-        if unread_count > 0:
-            unread_data.append({
-                'room_id': room.id,
-                'room_name': room.name or f"Чат {room.id}",
-                'unread_count': unread_count
-            })
+    unread_data = [
+        {
+            'room_id': room.id,
+            'room_name': room.name or f"Чат {room.id}",
+            'unread_count': unread_counts[room.id]
+        }
+        for room in user_rooms
+    ]
     
     serializer = UnreadMessagesSerializer(unread_data, many=True)
     return Response(serializer.data)
@@ -178,37 +180,15 @@ def mark_messages_as_read(request):
     try:
         room = ChatRoom.objects.get(id=room_id, participants=request.user)
         
-        if message_ids:
-            messages = Message.objects.filter(
-                id__in=message_ids,
-                room=room
-            ).exclude(sender=request.user)
-        else:
-            # Отмечаем все непрочитанные сообщения в чате
-            messages = Message.objects.filter(
-                room=room,
-                is_read=False
-            ).exclude(sender=request.user)
-        
-        # Создаем статусы прочтения
-        for message in messages:
-            MessageReadStatus.objects.get_or_create(
-                message=message,
-                user=request.user,
-                defaults={'read_at': timezone.now()}
-            )
-        
-        # Обновляем флаги is_read
-        updated_count = 0
-        for message in messages:
-            if message.read_statuses.count() >= room.participants.count() - 1:
-                message.is_read = True
-                message.save()
-                updated_count += 1
+        read_count, fully_read_ids = ReadReceiptService.mark_read(
+            request.user,
+            room,
+            message_ids=message_ids or None
+        )
         
         return Response({
-            'message': f'Отмечено {len(messages)} сообщений как прочитанные',
-            'updated_messages': updated_count
+            'message': f'Отмечено {read_count} сообщений как прочитанные',
+            'updated_messages': len(fully_read_ids)
         })
         
     except ChatRoom.DoesNotExist:
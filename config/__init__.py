@@ -0,0 +1,4 @@
+# Загружаем Celery вместе с Django, чтобы @shared_task использовали это приложение
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
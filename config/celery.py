@@ -0,0 +1,15 @@
+"""
+Celery config for Online School project.
+"""
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+
+# Все настройки Celery берутся из Django settings с префиксом CELERY_
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Поиск tasks.py во всех приложениях
+app.autodiscover_tasks()
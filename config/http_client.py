@@ -0,0 +1,217 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Запрос не отправлен: сервис недавно не отвечал, предохранитель разомкнут"""
+
+
+class IntegrationClient:
+    """HTTP-клиент внешнего сервиса (Zoom, LiveSmart)
+
+    Одна сессия с пулом keep-alive соединений на процесс и сервис, таймауты на
+    соединение и чтение, ограниченные повторы с полным джиттером. Повторяются
+    ошибки соединения (запрос не ушел), а для идемпотентных методов еще таймаут
+    чтения и 502/503/504. Предохранитель и метрики хранятся в кеше и общие для
+    всех воркеров: после failure_threshold ошибок подряд запросы recovery_timeout
+    секунд не отправляются (CircuitOpenError). Затем один пробный запрос (его
+    право атомарно захватывает один воркер, остальные получают CircuitOpenError)
+    либо замыкает предохранитель, либо снова размыкает его.
+    """
+
+    DEFAULTS = {
+        'connect_timeout': 3.05,
+        'read_timeout': 10,
+        'retries': 2,
+        'backoff': 0.3,
+        'backoff_max': 3,
+        'failure_threshold': 5,
+        'recovery_timeout': 30,
+        'pool_maxsize': 10,
+    }
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([502, 503, 504])
+    # Верхние границы корзин гистограммы задержек, мс
+    LATENCY_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000)
+    KEY_PREFIX = 'integration'
+
+    def __init__(self, vendor, **options):
+        self.vendor = vendor
+        self.options = {**self.DEFAULTS, **options}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.options['pool_maxsize'],
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def key(self, name):
+        return f'{self.KEY_PREFIX}:{self.vendor}:{name}'
+
+    # === Предохранитель ===
+
+    def is_open(self):
+        return bool(cache.get(self.key('open')))
+
+    def allow_request(self):
+        """Разомкнут - нет; после размыкания - только пробный запрос, захвативший право первым"""
+        state = cache.get_many([self.key('open'), self.key('half_open')])
+        if state.get(self.key('open')):
+            return False
+        if state.get(self.key('half_open')):
+            return cache.add(self.key('trial'), 1, self.options['recovery_timeout'])
+        return True
+
+    def record_success(self):
+        keys = [self.key('failures'), self.key('half_open'), self.key('trial')]
+        if cache.get_many(keys):
+            cache.delete_many(keys)
+
+    def record_failure(self):
+        failures_key = self.key('failures')
+        cache.add(failures_key, 0, self.options['recovery_timeout'] * 10)
+        failures = cache.incr(failures_key)
+        # После размыкания достаточно одной ошибки пробного запроса
+        if failures >= self.options['failure_threshold'] or cache.get(self.key('half_open')):
+            cache.set(self.key('open'), True, self.options['recovery_timeout'])
+            cache.set(self.key('half_open'), True, self.options['recovery_timeout'] * 10)
+            cache.delete_many([failures_key, self.key('trial')])
+            logger.warning(f"{self.vendor}: предохранитель разомкнут на {self.options['recovery_timeout']} с")
+
+    # === Метрики ===
+
+    def _incr(self, name, delta=1):
+        key = self.key(f'metrics:{name}')
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            if not cache.add(key, delta, None):
+                cache.incr(key, delta)
+
+    def record_latency(self, elapsed_ms, failed):
+        self._incr('calls')
+        self._incr('latency_ms', int(elapsed_ms))
+        if failed:
+            self._incr('errors')
+        bucket = next((str(bound) for bound in self.LATENCY_BUCKETS if elapsed_ms <= bound), 'inf')
+        self._incr(f'bucket:{bucket}')
+
+    def metrics(self):
+        """{'calls', 'errors', 'avg_latency_ms', 'latency_buckets', 'circuit_open'} для мониторинга"""
+        buckets = [str(bound) for bound in self.LATENCY_BUCKETS] + ['inf']
+        names = ['calls', 'errors', 'latency_ms'] + [f'bucket:{bucket}' for bucket in buckets]
+        stored = cache.get_many([self.key(f'metrics:{name}') for name in names])
+        values = {name: stored.get(self.key(f'metrics:{name}'), 0) for name in names}
+        calls = values['calls']
+        return {
+            'calls': calls,
+            'errors': values['errors'],
+            'avg_latency_ms': round(values['latency_ms'] / calls, 1) if calls else None,
+            'latency_buckets': {bucket: values[f'bucket:{bucket}'] for bucket in buckets},
+            'circuit_open': self.is_open(),
+        }
+
+    # === Запросы ===
+
+    def backoff(self, attempt):
+        cap = min(self.options['backoff_max'], self.options['backoff'] * 2 ** attempt)
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def is_connect_error(error):
+        """Соединение не установлено - запрос точно не дошел до сервиса"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def should_retry(self, method, error=None, response=None):
+        if method not in self.IDEMPOTENT_METHODS:
+            return error is not None and self.is_connect_error(error)
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return response.status_code in self.RETRY_STATUSES
+
+    def request(self, method, url, **kwargs):
+        """requests.Session.request с таймаутами, повторами и предохранителем
+
+        Ответы 4xx возвращаются как есть, 5xx и сетевые ошибки считаются сбоем сервиса.
+        """
+        method = method.upper()
+        if not self.allow_request():
+            raise CircuitOpenError(f'{self.vendor}: сервис временно недоступен')
+
+        kwargs.setdefault('timeout', (self.options['connect_timeout'], self.options['read_timeout']))
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            error = response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            elapsed_ms = (time.monotonic() - started) * 1000
+            failed = error is not None or response.status_code >= 500
+            self.record_latency(elapsed_ms, failed)
+
+            if attempt < self.options['retries'] and failed and self.should_retry(method, error, response):
+                attempt += 1
+                logger.info(f'{self.vendor}: повтор {attempt} {method} {url} ({error or response.status_code})')
+                time.sleep(self.backoff(attempt))
+                continue
+
+            if failed:
+                self.record_failure()
+            else:
+                self.record_success()
+            if error is not None:
+                raise error
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(vendor):
+    """Общий клиент сервиса в этом процессе; настройки - INTEGRATION_HTTP[vendor]"""
+    client = _clients.get(vendor)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(vendor)
+            if client is None:
+                options = getattr(settings, 'INTEGRATION_HTTP', {}).get(vendor, {})
+                client = _clients[vendor] = IntegrationClient(vendor, **options)
+    return client
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def integration_metrics(request):
+    """Вызовы, ошибки, задержки и состояние предохранителя по внешним сервисам (для администратора)"""
+    if not request.user.is_admin:
+        return Response({'error': 'Нет доступа'}, status=status.HTTP_403_FORBIDDEN)
+    vendors = getattr(settings, 'INTEGRATION_HTTP', {})
+    return Response({vendor: get_client(vendor).metrics() for vendor in vendors})
@@ -0,0 +1,47 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная (keyset) пагинация для больших списков: без COUNT(*) и OFFSET
+
+    Сортировка берется из OrderingFilter или view.ordering и дополняется id в том же
+    направлении, чтобы курсор был уникальным (под это заведены индексы (..., created_at, id)).
+    Старые клиенты могут передать ?page=N и получить прежний ответ PageNumberPagination с count.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at',)
+    tiebreak_field = 'id'
+    page_number_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number_pagination = PageNumberPagination()
+            page = self.page_number_pagination.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.page_number_pagination.display_page_controls
+            return page
+        self.page_number_pagination = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.to_html()
+        return super().to_html()
+
+    def get_ordering(self, request, queryset, view):
+        if not any(hasattr(backend, 'get_ordering') for backend in getattr(view, 'filter_backends', [])) \
+                and getattr(view, 'ordering', None):
+            ordering = view.ordering
+            ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        else:
+            ordering = tuple(super().get_ordering(request, queryset, view))
+
+        if not any(field.lstrip('-') in (self.tiebreak_field, 'pk') for field in ordering):
+            direction = '-' if ordering and ordering[0].startswith('-') else ''
+            ordering += (f'{direction}{self.tiebreak_field}',)
+        return ordering
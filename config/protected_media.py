@@ -0,0 +1,266 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+
+class ProtectedMediaService:
+    """Выдача защищенных файлов: проверка доступа в Django, отдача байтов - nginx
+
+    Права на файл (имя файла, преподаватель/автор, участники, публичность) кешируются
+    на PROTECTED_MEDIA_ACCESS_CACHE_TIMEOUT секунд. После проверки ответ содержит только
+    X-Accel-Redirect на internal location /protected-media/ (config/nginx), nginx сам
+    отдает файл с поддержкой Range. Подписанная HMAC ссылка (django.core.signing)
+    содержит имя файла и срок жизни, поэтому по ней файл отдается без запросов к БД.
+    """
+
+    KINDS = {
+        'lesson_material': 'courses.LessonMaterial',
+        'lesson_recording': 'courses.LessonRecording',
+        'livesmart_recording': 'livesmart.LiveSmartRecording',
+        'chat_file': 'chat.Message',
+    }
+    SIGNING_SALT = 'protected-media'
+    # mimetypes не знает HLS-сегменты (.ts считает переводами Qt)
+    CONTENT_TYPES = {'.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t'}
+    SIGNED_FILENAME_RE = re.compile(r'^[\w-][\w.-]*$')
+
+    @staticmethod
+    def access_cache_timeout():
+        return getattr(settings, 'PROTECTED_MEDIA_ACCESS_CACHE_TIMEOUT', 5 * 60)
+
+    @staticmethod
+    def signed_url_ttl():
+        return getattr(settings, 'PROTECTED_MEDIA_SIGNED_URL_TTL', 10 * 60)
+
+    @staticmethod
+    def lesson_participants(lesson):
+        if lesson.student_id:
+            return [lesson.student_id]
+        if lesson.group_id:
+            return list(lesson.group.students.values_list('id', flat=True))
+        return []
+
+    @staticmethod
+    def build_access(kind, pk):
+        """{'name', 'owners', 'viewers', 'public'} или None, если объекта или файла нет"""
+        if kind not in ProtectedMediaService.KINDS:
+            return None
+        model_label = ProtectedMediaService.KINDS[kind]
+        if not apps.is_installed(model_label.split('.')[0]):
+            return None
+        queryset = apps.get_model(model_label).objects.filter(pk=pk)
+
+        if kind == 'chat_file':
+            message = queryset.select_related('room').first()
+            if message is None or not message.file:
+                return None
+            return {
+                'name': message.file.name,
+                'owners': [message.sender_id],
+                'viewers': list(message.room.participants.values_list('id', flat=True)),
+                'public': True,
+            }
+
+        if kind == 'livesmart_recording':
+            instance = queryset.select_related('room__lesson').first()
+            lesson = instance.room.lesson if instance else None
+        else:
+            instance = queryset.select_related('lesson').first()
+            lesson = instance.lesson if instance else None
+        if instance is None or not instance.file:
+            return None
+        # Материалы видят все участники занятия, записи - только публичные
+        owners = [lesson.teacher_id, getattr(instance, 'uploaded_by_id', None)]
+        hls_playlist = getattr(instance, 'hls_playlist', '')
+        return {
+            'name': instance.file.name,
+            'poster': instance.poster.name if getattr(instance, 'poster', None) else None,
+            'hls': hls_playlist or None,
+            'owners': [user_id for user_id in owners if user_id],
+            'viewers': ProtectedMediaService.lesson_participants(lesson),
+            'public': getattr(instance, 'is_public', True),
+        }
+
+    @staticmethod
+    def access_key(kind, pk):
+        return f'protected_media:access:{kind}:{pk}'
+
+    @staticmethod
+    def invalidate(kind, pk):
+        cache.delete(ProtectedMediaService.access_key(kind, pk))
+
+    @staticmethod
+    def invalidate_many(kind, pks):
+        keys = [ProtectedMediaService.access_key(kind, pk) for pk in pks]
+        if keys:
+            cache.delete_many(keys)
+
+    @staticmethod
+    def invalidate_lessons(lesson_ids):
+        """Права на материалы и записи занятий: сменились преподаватель или участники"""
+        lookups = {
+            'lesson_material': 'lesson_id__in',
+            'lesson_recording': 'lesson_id__in',
+            'livesmart_recording': 'room__lesson_id__in',
+        }
+        for kind, lookup in lookups.items():
+            model_label = ProtectedMediaService.KINDS[kind]
+            if not apps.is_installed(model_label.split('.')[0]):
+                continue
+            ProtectedMediaService.invalidate_many(kind, apps.get_model(model_label).objects.filter(
+                **{lookup: lesson_ids}
+            ).exclude(file='').values_list('pk', flat=True))
+
+    @staticmethod
+    def get_access(kind, pk):
+        key = ProtectedMediaService.access_key(kind, pk)
+        access = cache.get(key)
+        if access is None:
+            access = ProtectedMediaService.build_access(kind, pk) or {}
+            cache.set(key, access, ProtectedMediaService.access_cache_timeout())
+        return access or None
+
+    @staticmethod
+    def can_access(user, access):
+        if user.is_admin or user.id in access['owners']:
+            return True
+        return access['public'] and user.id in access['viewers']
+
+    @staticmethod
+    def sign(kind, pk, name):
+        return signing.dumps({'k': kind, 'i': pk, 'n': name}, salt=ProtectedMediaService.SIGNING_SALT)
+
+    @staticmethod
+    def unsign(token):
+        """Имя файла (или каталога HLS, с / на конце) из подписанной ссылки или None"""
+        try:
+            payload = signing.loads(
+                token,
+                salt=ProtectedMediaService.SIGNING_SALT,
+                max_age=ProtectedMediaService.signed_url_ttl()
+            )
+        except signing.BadSignature:
+            return None
+        return payload.get('n')
+
+    @staticmethod
+    def serve(name, download=False):
+        """Ответ с X-Accel-Redirect (или сам файл, если nginx перед Django нет - разработка)"""
+        content_type = ProtectedMediaService.CONTENT_TYPES.get(os.path.splitext(name)[1]) \
+            or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if getattr(settings, 'PROTECTED_MEDIA_X_ACCEL', False):
+            response = HttpResponse(content_type=content_type)
+            internal_url = getattr(settings, 'PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/')
+            response['X-Accel-Redirect'] = internal_url + quote(name)
+        else:
+            try:
+                response = FileResponse(default_storage.open(name, 'rb'), content_type=content_type)
+            except FileNotFoundError:
+                raise Http404
+        response['Content-Disposition'] = content_disposition_header(download, os.path.basename(name))
+        response['Cache-Control'] = 'private, max-age=%d' % ProtectedMediaService.signed_url_ttl()
+        return response
+
+
+class ProtectedFileField(serializers.FileField):
+    """Файл отдается ссылкой на защищенную выдачу, а не на публичный /media/"""
+
+    def __init__(self, kind, variant=None, **kwargs):
+        self.kind = kind
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse('protected-media', kwargs={'kind': self.kind, 'pk': value.instance.pk})
+        if self.variant:
+            url += f'?variant={self.variant}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+def hls_url(request, kind, instance):
+    """Ссылка на получение подписанного HLS плейлиста записи или None, пока его нет"""
+    if not getattr(instance, 'hls_playlist', ''):
+        return None
+    url = reverse('protected-media-url', kwargs={'kind': kind, 'pk': instance.pk}) + '?variant=hls'
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def get_accessible_file(request, kind, pk):
+    """Имя файла (?variant=poster|hls - производные записи) или None, если доступа нет"""
+    access = ProtectedMediaService.get_access(kind, pk)
+    if access is None:
+        raise Http404
+    if not ProtectedMediaService.can_access(request.user, access):
+        return None
+    variant = request.query_params.get('variant')
+    name = access.get(variant) if variant in ('poster', 'hls') else access['name']
+    if not name:
+        raise Http404
+    return name
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def protected_media(request, kind, pk):
+    """Скачать защищенный файл (?download=1 - как вложение)"""
+    name = get_accessible_file(request, kind, pk)
+    if name is None:
+        return Response({'error': 'Нет доступа к файлу'}, status=status.HTTP_403_FORBIDDEN)
+    return ProtectedMediaService.serve(name, download=request.query_params.get('download') == '1')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def protected_media_url(request, kind, pk):
+    """Короткоживущая подписанная ссылка на файл (для плеера и повторных просмотров)"""
+    name = get_accessible_file(request, kind, pk)
+    if name is None:
+        return Response({'error': 'Нет доступа к файлу'}, status=status.HTTP_403_FORBIDDEN)
+    if request.query_params.get('variant') == 'hls':
+        # Подписывается каталог: сегменты из плейлиста открываются по той же ссылке
+        directory, playlist = name.rsplit('/', 1)
+        token = ProtectedMediaService.sign(kind, pk, directory + '/')
+        url = reverse('protected-media-signed-file', kwargs={'token': token, 'filename': playlist})
+    else:
+        token = ProtectedMediaService.sign(kind, pk, name)
+        url = reverse('protected-media-signed', kwargs={'token': token})
+    return Response({
+        'url': request.build_absolute_uri(url),
+        'expires_in': ProtectedMediaService.signed_url_ttl(),
+    })
+
+
+@require_GET
+def protected_media_signed(request, token, filename=None):
+    """Файл по подписанной ссылке - без авторизации и запросов к БД (обычная вью: плееры шлют любой Accept)
+
+    filename - файл внутри подписанного каталога (плейлист и сегменты HLS).
+    """
+    name = ProtectedMediaService.unsign(token)
+    if name is None:
+        return JsonResponse({'error': 'Ссылка недействительна или истекла'}, status=status.HTTP_403_FORBIDDEN)
+    if name.endswith('/') != (filename is not None):
+        raise Http404
+    if filename is not None:
+        if not ProtectedMediaService.SIGNED_FILENAME_RE.match(filename):
+            raise Http404
+        name += filename
+    return ProtectedMediaService.serve(name, download=request.GET.get('download') == '1')
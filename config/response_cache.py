@@ -0,0 +1,136 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ResponseCache:
+    """Кеш ответов редко меняющихся GET эндпоинтов + условный GET (ETag / Last-Modified)
+
+    У каждой модели есть версия - время последнего изменения в наносекундах, которую
+    сигналы post_save/post_delete переставляют после коммита. ETag и ключ кеша считаются
+    из пути с параметрами, формата ответа и версий моделей, Last-Modified - по самой
+    свежей версии. Для ответов, зависящих от пользователя (per_user), добавляется его
+    id и его собственная версия. Старые записи не удаляются, а перестают читаться.
+    """
+
+    KEY_PREFIX = 'response_cache'
+
+    @staticmethod
+    def version_key(model):
+        return f'{ResponseCache.KEY_PREFIX}:version:{model._meta.label_lower}'
+
+    @staticmethod
+    def user_version_key(user_id):
+        return f'{ResponseCache.KEY_PREFIX}:version:user:{user_id}'
+
+    @staticmethod
+    def cache_timeout():
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+    @staticmethod
+    def _bump_key(key):
+        def bump():
+            current = cache.get(key) or 0
+            cache.set(key, max(time.time_ns(), current + 1), None)
+        transaction.on_commit(bump)
+
+    @staticmethod
+    def bump(model):
+        """Новая версия модели (после коммита, чтобы не закешировать незакоммиченное состояние)"""
+        ResponseCache._bump_key(ResponseCache.version_key(model))
+
+    @staticmethod
+    def bump_user(user_id):
+        ResponseCache._bump_key(ResponseCache.user_version_key(user_id))
+
+    @staticmethod
+    def versions(keys):
+        """Версии по ключам; пропавшая из кеша версия начинается с текущего времени"""
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                versions[key] = time.time_ns()
+                if not cache.add(key, versions[key], None):
+                    versions[key] = cache.get(key, versions[key])
+        return [versions[key] for key in keys]
+
+    @staticmethod
+    def validators(request, models, per_user=False):
+        """(etag, last_modified) для запроса"""
+        keys = [ResponseCache.version_key(model) for model in models]
+        variant = ''
+        if per_user:
+            keys.append(ResponseCache.user_version_key(request.user.pk))
+            variant = str(request.user.pk)
+        versions = ResponseCache.versions(keys)
+
+        media_type = getattr(request, 'accepted_media_type', '')
+        source = '|'.join([request.get_full_path(), media_type, variant] + [str(version) for version in versions])
+        etag = f'W/"{hashlib.md5(source.encode()).hexdigest()}"'
+        return etag, max(versions) // 1_000_000_000
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    @staticmethod
+    def respond(request, models, per_user, render):
+        """Ответ 304, ответ из кеша или результат render() с сохранением в кеш"""
+        if request.method != 'GET':
+            return render()
+
+        etag, last_modified = ResponseCache.validators(request, models, per_user)
+        if ResponseCache.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'{ResponseCache.KEY_PREFIX}:data:{etag[3:-1]}'
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = render()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, ResponseCache.cache_timeout())
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+def cache_response(*models, per_user=False):
+    """Декоратор функциональных вью (под @api_view): кеш ответа и условный GET по версиям models"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            return ResponseCache.respond(request, models, per_user, lambda: view(request, *args, **kwargs))
+        return wrapped
+    return decorator
+
+
+class CachedResponseMixin:
+    """То же для generic-вью: cache_models - модели, от которых зависит ответ"""
+    cache_models = ()
+    cache_per_user = False
+
+    def get(self, request, *args, **kwargs):
+        return ResponseCache.respond(
+            request,
+            self.cache_models,
+            self.cache_per_user,
+            lambda: super(CachedResponseMixin, self).get(request, *args, **kwargs)
+        )
@@ -5,6 +5,7 @@ Base settings for Online School project.
 import os
 from pathlib import Path
 from decouple import config
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -145,6 +146,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Защищенные файлы отдает nginx по X-Accel-Redirect (location /protected-media/ в config/nginx);
+# без nginx (разработка) файл отдает сам Django
+PROTECTED_MEDIA_X_ACCEL = config('PROTECTED_MEDIA_X_ACCEL', default=False, cast=bool)
+PROTECTED_MEDIA_INTERNAL_URL = '/protected-media/'
+
+# Обработка записей занятий (HLS, постер, длительность) - бинарники ffmpeg в PATH воркера Celery
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+FFPROBE_BINARY = config('FFPROBE_BINARY', default='ffprobe')
+
+# Внешние API (config/http_client.py): таймауты, повторы и предохранитель по сервисам,
+# не заданные ключи берутся из IntegrationClient.DEFAULTS
+INTEGRATION_HTTP = {
+    'zoom': {'connect_timeout': 3.05, 'read_timeout': 10},
+    'livesmart': {'connect_timeout': 3.05, 'read_timeout': 10},
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -190,10 +207,38 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+# Сколько писем отправляется одной задачей через одно SMTP соединение
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
 
 # Celery settings
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    # Повторная доставка уведомлений из outbox (ретраи и зависшие строки)
+    'dispatch-notification-outbox': {
+        'task': 'notifications.tasks.dispatch_notification_outbox',
+        'schedule': 60.0,
+    },
+    # Сверка счетчиков непрочитанного с БД
+    'reconcile-unread-counters': {
+        'task': 'notifications.tasks.reconcile_unread_counters',
+        'schedule': 60.0 * 60,
+    },
+    # Ночная сверка счетчиков дашборда прогресса
+    'rebuild-dashboard-counters': {
+        'task': 'courses.tasks.rebuild_dashboard_counters',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    # Удаление брошенных загрузок частями
+    'cleanup-chunked-uploads': {
+        'task': 'courses.tasks.cleanup_chunked_uploads',
+        'schedule': 60.0 * 60,
+    },
+}
 
 # Channels settings
 CHANNEL_LAYERS = {
@@ -205,6 +250,10 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Буфер записи сообщений чата: сброс в БД раз в N мс или по M сообщений
+CHAT_MESSAGE_FLUSH_INTERVAL_MS = config('CHAT_MESSAGE_FLUSH_INTERVAL_MS', default=50, cast=int)
+CHAT_MESSAGE_FLUSH_SIZE = config('CHAT_MESSAGE_FLUSH_SIZE', default=100, cast=int)
+
 # Stripe settings (заглушка)
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_placeholder')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='pk_test_placeholder')
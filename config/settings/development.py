@@ -184,6 +184,13 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 # Email backend for development
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_BATCH_SIZE = 100
+
+# Celery settings: без брокера задачи выполняются синхронно
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=True, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='memory://')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='cache+memory://')
 
 # Channels settings
 CHANNEL_LAYERS = {
@@ -192,6 +199,10 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Буфер записи сообщений чата
+CHAT_MESSAGE_FLUSH_INTERVAL_MS = 50
+CHAT_MESSAGE_FLUSH_SIZE = 100
+
 # Stripe settings for development (тестовые ключи)
 STRIPE_SECRET_KEY = 'sk_test_1234567890abcdef1234567890abcdef'
 STRIPE_PUBLISHABLE_KEY = 'pk_test_1234567890abcdef1234567890abcdef'
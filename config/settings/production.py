@@ -51,6 +51,8 @@ CSRF_COOKIE_SECURE = True
 # Static files
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
 
+PROTECTED_MEDIA_X_ACCEL = True
+
 # Logging for production
 LOGGING = {
     'version': 1,
@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from .http_client import integration_metrics
+from .protected_media import protected_media, protected_media_signed, protected_media_url
 
 # Swagger schema view
 schema_view = get_schema_view(
@@ -37,6 +39,15 @@ urlpatterns = [
     path('api/crm/', include('crm.urls')),
     path('api/ai_trainer/', include('ai_trainer.urls')),
     path('api/livesmart/', include('livesmart.urls')),
+    
+    # Защищенные файлы (материалы, записи, файлы чата): проверка доступа здесь, отдача - nginx
+    path('api/media/signed/<str:token>/', protected_media_signed, name='protected-media-signed'),
+    path('api/media/signed/<str:token>/<str:filename>', protected_media_signed, name='protected-media-signed-file'),
+    path('api/media/<str:kind>/<int:pk>/', protected_media, name='protected-media'),
+    path('api/media/<str:kind>/<int:pk>/url/', protected_media_url, name='protected-media-url'),
+    
+    # Метрики внешних API (Zoom, LiveSmart)
+    path('api/integrations/metrics/', integration_metrics, name='integration-metrics'),
 ]
 
 # Static and media files in development
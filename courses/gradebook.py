@@ -0,0 +1,286 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Avg, Case, Count, FilteredRelation, FloatField, Max, Min, OuterRef, Q, Subquery, Value, When
+
+from .models import Homework, TestResult
+
+# Значения, с которых табличные редакторы начинают формулу
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+_XML_ILLEGAL_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Gradebook:
+    """Журнал группы: студенты × домашние задания и тесты одним запросом
+
+    Колонки - задания занятий группы и тесты курса, которые сдавали ее студенты.
+    Сдачи присоединяются через FilteredRelation (не больше одной на задание) и
+    разворачиваются в колонки условной агрегацией, тест - последний результат
+    студента (подзапрос). Строки читаются через values().iterator(), поэтому
+    экспорт большой группы не держит журнал в памяти целиком.
+    """
+
+    CHUNK_SIZE = 500
+    SUMMARY_HEADERS = ['Сдано заданий', 'С опозданием', 'Средняя оценка', 'Средний % по тестам']
+
+    def __init__(self, group):
+        self.group = group
+        self._columns = None
+
+    def columns(self):
+        """[{'key', 'type', 'title', 'max_points', ...}] - сначала задания по сроку сдачи, потом тесты"""
+        if self._columns is not None:
+            return self._columns
+
+        columns = [
+            {
+                'key': f'homework_{homework["id"]}',
+                'type': 'homework',
+                'id': homework['id'],
+                'title': homework['title'],
+                'max_points': homework['max_points'],
+                'due_date': homework['due_date'],
+            }
+            for homework in Homework.objects.filter(lesson__group=self.group)
+            .order_by('due_date', 'id')
+            .values('id', 'title', 'max_points', 'due_date')
+        ]
+        tests = (
+            TestResult.objects.filter(course_id=self.group.course_id, student__learning_groups=self.group)
+            .values('test_name')
+            .annotate(max_points=Max('max_score'), first_taken=Min('date_taken'))
+            .order_by('first_taken', 'test_name')
+        )
+        columns += [
+            {
+                'key': f'test_{index}',
+                'type': 'test',
+                'title': test['test_name'],
+                'max_points': test['max_points'],
+            }
+            for index, test in enumerate(tests, start=1)
+        ]
+        self._columns = columns
+        return columns
+
+    def queryset(self):
+        """Студенты группы (values) с аннотацией оценки и состояния по каждой колонке"""
+        columns = self.columns()
+        homework_ids = [column['id'] for column in columns if column['type'] == 'homework']
+        queryset = self.group.students.order_by('last_name', 'first_name', 'id')
+        annotations = {}
+
+        if homework_ids:
+            queryset = queryset.alias(gradebook_submissions=FilteredRelation(
+                'homework_submissions',
+                condition=Q(homework_submissions__homework_id__in=homework_ids)
+            ))
+            annotations.update(
+                homework_submitted=Count('gradebook_submissions'),
+                homework_late=Count('gradebook_submissions', filter=Q(gradebook_submissions__is_late=True)),
+                homework_average=Avg('gradebook_submissions__grade'),
+            )
+        else:
+            annotations.update(
+                homework_submitted=Value(0),
+                homework_late=Value(0),
+                homework_average=Value(None, output_field=FloatField()),
+            )
+
+        for column in columns:
+            if column['type'] == 'homework':
+                submission = Q(gradebook_submissions__homework_id=column['id'])
+                annotations[f'{column["key"]}_score'] = Max(Case(When(submission, then='gradebook_submissions__grade')))
+                # 0 - не сдано, 1 - сдано, 2 - сдано с опозданием
+                annotations[f'{column["key"]}_state'] = Max(Case(
+                    When(submission & Q(gradebook_submissions__is_late=True), then=Value(2)),
+                    When(submission, then=Value(1)),
+                    default=Value(0)
+                ))
+            else:
+                annotations[f'{column["key"]}_score'] = Subquery(
+                    TestResult.objects.filter(
+                        student=OuterRef('pk'),
+                        course_id=self.group.course_id,
+                        test_name=column['title']
+                    ).order_by('-date_taken', '-id').values('score')[:1]
+                )
+
+        return queryset.annotate(**annotations).values(
+            'id', 'username', 'first_name', 'last_name', 'email', *annotations
+        )
+
+    def build_row(self, record):
+        """Строка журнала для JSON из записи queryset()"""
+        cells = {}
+        test_percents = []
+        for column in self.columns():
+            score = record[f'{column["key"]}_score']
+            if column['type'] == 'homework':
+                state = record[f'{column["key"]}_state'] or 0
+            else:
+                state = 0 if score is None else 1
+                if score is not None and column['max_points']:
+                    test_percents.append(score * 100 / column['max_points'])
+            cells[column['key']] = {'score': score, 'submitted': state > 0, 'late': state == 2}
+
+        average = record['homework_average']
+        full_name = f'{record["first_name"]} {record["last_name"]}'.strip()
+        return {
+            'student_id': record['id'],
+            'student_name': full_name or record['username'],
+            'email': record['email'],
+            'cells': cells,
+            'homework_submitted': record['homework_submitted'],
+            'homework_late': record['homework_late'],
+            'homework_average': round(float(average), 2) if average is not None else None,
+            'test_average': round(sum(test_percents) / len(test_percents), 2) if test_percents else None,
+        }
+
+    def rows(self):
+        """Все строки журнала потоком, без кеша результатов queryset"""
+        for record in self.queryset().iterator(chunk_size=self.CHUNK_SIZE):
+            yield self.build_row(record)
+
+    def header(self):
+        return ['Студент', 'Email'] + [column['title'] for column in self.columns()] + self.SUMMARY_HEADERS
+
+    def table(self):
+        """Заголовок и строки для выгрузки: оценка, 'сдано' без оценки или пусто"""
+        yield self.header()
+        for row in self.rows():
+            values = [row['student_name'], row['email']]
+            for column in self.columns():
+                cell = row['cells'][column['key']]
+                if cell['score'] is not None:
+                    values.append(cell['score'])
+                elif cell['submitted']:
+                    values.append('сдано')
+                else:
+                    values.append('')
+            values += [row['homework_submitted'], row['homework_late'], row['homework_average'], row['test_average']]
+            yield values
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: writerow возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _safe_text(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(table):
+    """CSV по строкам (UTF-8 с BOM - Excel иначе не распознает кириллицу)"""
+    writer = csv.writer(_Echo())
+    yield '\ufeff'
+    for values in table:
+        yield writer.writerow([_safe_text('' if value is None else value) for value in values])
+
+
+class _StreamBuffer:
+    """Приемник для zipfile без seek: записанные байты забираются по мере генерации"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for index, value in enumerate(values):
+        if value is None or value == '':
+            continue
+        ref = f'{_column_letter(index)}{number}'
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL_RE.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(table, sheet_name='Журнал'):
+    """Минимальный XLSX (один лист, строки inline) потоком: zip пишется без seek по мере чтения строк"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            for number, values in enumerate(table, start=1):
+                sheet.write(_xlsx_row(number, values).encode())
+                if number % Gradebook.CHUNK_SIZE == 0:
+                    yield buffer.pop()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.pop()
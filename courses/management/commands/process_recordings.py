@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from courses.services import RecordingMediaService
+
+
+class Command(BaseCommand):
+    help = 'Обработка записей занятий: длительность, размер, HLS и постер'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=RecordingMediaService.MODELS, action='append', dest='kinds', help='Только указанные записи')
+        parser.add_argument('--force', action='store_true', help='Заново обработать и уже готовые записи')
+        parser.add_argument('--failed', action='store_true', help='Повторить записи с ошибкой обработки')
+
+    def handle(self, *args, **options):
+        for kind in options['kinds'] or RecordingMediaService.MODELS:
+            if not apps.is_installed(RecordingMediaService.MODELS[kind].split('.')[0]):
+                continue
+            model = RecordingMediaService.model(kind)
+            queryset = model.objects.exclude(file='')
+            if not options['force']:
+                statuses = ['pending', 'failed'] if options['failed'] else ['pending']
+                queryset = queryset.filter(media_status__in=statuses)
+
+            results = {}
+            for pk in queryset.order_by('pk').values_list('pk', flat=True):
+                # Сброс источника - иначе process() посчитает запись уже обработанной
+                model.objects.filter(pk=pk).update(media_source='')
+                result = RecordingMediaService.process(kind, pk)
+                results[result] = results.get(result, 0) + 1
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {results.get("ready", 0)} готово, {results.get("failed", 0)} с ошибкой')
+        self.stdout.write(self.style.SUCCESS('Обработка записей завершена'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.services import DashboardCounterService
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков дашборда прогресса (DashboardCounters) по данным БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Только указанные пользователи')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DashboardCounterService.REBUILD_BATCH_SIZE,
+            help='Пользователей в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = DashboardCounterService.rebuild(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано счетчиков: {total} за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from courses.models import Course, Lesson, LessonMaterial
+from courses.search import search_vector
+
+SEARCH_MODELS = {'course': Course, 'lesson': Lesson, 'material': LessonMaterial}
+
+
+class Command(BaseCommand):
+    help = 'Заполнение поискового вектора (search_vector) курсов, занятий и материалов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=SEARCH_MODELS, action='append', dest='models', help='Только указанные модели')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Строк в одном UPDATE')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Полнотекстовый поиск доступен только на PostgreSQL'))
+            return
+
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        for name in options['models'] or SEARCH_MODELS:
+            model = SEARCH_MODELS[name]
+            ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+            total = 0
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                total += model.objects.filter(pk__gte=batch[0], pk__lte=batch[-1]).update(search_vector=search_vector())
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Поисковые векторы обновлены за {time.monotonic() - started:.2f} с'))
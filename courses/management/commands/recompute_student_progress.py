@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.services import StudentProgressEngine
+
+
+class Command(BaseCommand):
+    help = 'Пересчет прогресса студентов (StudentProgress) по посещаемости, заданиям и тестам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='course_ids', help='Только указанные курсы')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        course_ids = options['course_ids'] or Course.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+        for course_id in course_ids:
+            total += StudentProgressEngine.recompute(course_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано записей прогресса: {total} за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0005_remove_lessonmaterial_has_ai_trainer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_courses', models.PositiveIntegerField(default=0, verbose_name='Курсов')),
+                ('total_lessons', models.PositiveIntegerField(default=0, verbose_name='Занятий')),
+                ('completed_lessons', models.PositiveIntegerField(default=0, verbose_name='Посещено занятий')),
+                ('total_homework', models.PositiveIntegerField(default=0, verbose_name='Сдано заданий')),
+                ('submitted_homework', models.PositiveIntegerField(default=0, verbose_name='Оценено заданий')),
+                ('total_badges', models.PositiveIntegerField(default=0, verbose_name='Бейджей')),
+                ('total_achievements', models.PositiveIntegerField(default=0, verbose_name='Достижений')),
+                ('total_groups', models.PositiveIntegerField(default=0, verbose_name='Групп')),
+                ('total_students', models.PositiveIntegerField(default=0, verbose_name='Студентов')),
+                ('taught_lessons', models.PositiveIntegerField(default=0, verbose_name='Проведено занятий')),
+                ('graded_homework', models.PositiveIntegerField(default=0, verbose_name='Проверено заданий')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Счетчики дашборда',
+                'verbose_name_plural': 'Счетчики дашборда',
+            },
+        ),
+    ]
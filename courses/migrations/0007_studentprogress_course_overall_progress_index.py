@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_dashboardcounters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['course', '-overall_progress'], name='courses_stu_course__0a4e4c_idx'),
+        ),
+    ]
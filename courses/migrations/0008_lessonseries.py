@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0007_studentprogress_course_overall_progress_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Тема занятий')),
+                ('description', models.TextField(blank=True, verbose_name='Описание занятий')),
+                ('lesson_type', models.CharField(choices=[('group', 'Групповое занятие'), ('individual', 'Индивидуальное занятие')], default='group', max_length=20, verbose_name='Тип занятий')),
+                ('weekdays', models.JSONField(default=list, help_text='Номера дней недели: 0 - понедельник, 6 - воскресенье', verbose_name='Дни недели')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, verbose_name='Интервал (недели)')),
+                ('start_date', models.DateField(verbose_name='Дата начала')),
+                ('end_date', models.DateField(verbose_name='Дата окончания')),
+                ('start_time', models.TimeField(verbose_name='Время начала')),
+                ('duration_minutes', models.PositiveIntegerField(verbose_name='Длительность (минуты)')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Комнаты и уведомления обработаны')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_lesson_series', to=settings.AUTH_USER_MODEL, verbose_name='Создал')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lesson_series', to='courses.group', verbose_name='Группа')),
+                ('student', models.ForeignKey(blank=True, limit_choices_to={'role': 'student'}, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='individual_lesson_series', to=settings.AUTH_USER_MODEL, verbose_name='Студент (для индивидуальных)')),
+                ('teacher', models.ForeignKey(limit_choices_to={'role': 'teacher'}, on_delete=django.db.models.deletion.CASCADE, related_name='lesson_series', to=settings.AUTH_USER_MODEL, verbose_name='Преподаватель')),
+            ],
+            options={
+                'verbose_name': 'Серия занятий',
+                'verbose_name_plural': 'Серии занятий',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lessons', to='courses.lessonseries', verbose_name='Серия'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+GIST_COLUMNS = ['teacher_id', 'student_id', 'group_id']
+
+
+def create_gist_indexes(apps, schema_editor):
+    """GiST индексы (участник, tstzrange(start_time, end_time)) для поиска пересечений - только PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in GIST_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS courses_lesson_{column}_period_gist '
+            f'ON courses_lesson USING gist ({column}, tstzrange(start_time, end_time))'
+        )
+
+
+def drop_gist_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in GIST_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS courses_lesson_{column}_period_gist')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_lessonseries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher', 'start_time', 'end_time'], name='courses_les_teacher_31b99f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student', 'start_time', 'end_time'], name='courses_les_student_9e0061_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'start_time', 'end_time'], name='courses_les_group_i_552389_idx'),
+        ),
+        migrations.RunPython(create_gist_indexes, drop_gist_indexes),
+    ]
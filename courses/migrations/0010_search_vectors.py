@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:39
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_TABLES = ['courses_course', 'courses_lesson', 'courses_lessonmaterial']
+
+# Должно совпадать с courses.search.search_vector()
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('russian', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B')
+"""
+
+
+def create_search_triggers(apps, schema_editor):
+    """Триггер, поддерживающий search_vector, GIN индексы и заполнение существующих строк - только PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE OR REPLACE FUNCTION courses_search_vector_update() RETURNS trigger AS $$ '
+        f'BEGIN NEW.search_vector := {SEARCH_VECTOR_SQL.format(row="NEW.")}; RETURN NEW; END '
+        '$$ LANGUAGE plpgsql'
+    )
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}')
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF title, description '
+            f'ON {table} FOR EACH ROW EXECUTE FUNCTION courses_search_vector_update()'
+        )
+        schema_editor.execute(f'UPDATE {table} SET search_vector = {SEARCH_VECTOR_SQL.format(row="")}')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING gin (search_vector)'
+        )
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_gin')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}')
+    schema_editor.execute('DROP FUNCTION IF EXISTS courses_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_lesson_schedule_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddField(
+            model_name='lessonmaterial',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'created_at', 'id'], name='courses_att_student_29cca8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['created_at', 'id'], name='courses_att_created_7ac4ab_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0011_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('target', models.CharField(choices=[('homework_submission', 'Файл сданного задания'), ('lesson_material', 'Файл материала урока'), ('lesson_recording', 'Запись урока'), ('livesmart_recording', 'Запись LiveSmart')], max_length=30, verbose_name='Куда загружается')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID объекта')),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('total_size', models.BigIntegerField(verbose_name='Размер файла (байты)')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='Размер части (байты)')),
+                ('checksum', models.CharField(blank=True, help_text='В формате tus: "<алгоритм> <base64>", например "sha256 ..."', max_length=150, verbose_name='Контрольная сумма файла')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('assembling', 'Собирается'), ('complete', 'Завершена'), ('failed', 'Ошибка')], default='uploading', max_length=20, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('file_name', models.CharField(blank=True, max_length=500, verbose_name='Итоговый файл')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка частями',
+                'verbose_name_plural': 'Загрузки частями',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='lessonrecording',
+            name='file',
+            field=models.FileField(blank=True, upload_to='lesson_recordings/', verbose_name='Файл записи'),
+        ),
+        migrations.AlterField(
+            model_name='lessonrecording',
+            name='file_size',
+            field=models.BigIntegerField(default=0, verbose_name='Размер файла (байты)'),
+        ),
+        migrations.CreateModel(
+            name='ChunkedUploadPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Номер части')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер (байты)')),
+                ('checksum', models.CharField(max_length=150, verbose_name='Контрольная сумма')),
+                ('storage_name', models.CharField(max_length=500, verbose_name='Файл части')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='courses.chunkedupload', verbose_name='Загрузка')),
+            ],
+            options={
+                'verbose_name': 'Часть загрузки',
+                'verbose_name_plural': 'Части загрузки',
+                'ordering': ['index'],
+                'unique_together': {('upload', 'index')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chunkedupload',
+            index=models.Index(fields=['status', 'updated_at'], name='courses_chu_status_709d6b_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonrecording',
+            name='hls_playlist',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='HLS плейлист'),
+        ),
+        migrations.AddField(
+            model_name='lessonrecording',
+            name='media_error',
+            field=models.TextField(blank=True, editable=False, verbose_name='Ошибка обработки'),
+        ),
+        migrations.AddField(
+            model_name='lessonrecording',
+            name='media_source',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='Обработанный файл'),
+        ),
+        migrations.AddField(
+            model_name='lessonrecording',
+            name='media_status',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='pending', editable=False, max_length=20, verbose_name='Статус обработки'),
+        ),
+        migrations.AddField(
+            model_name='lessonrecording',
+            name='poster',
+            field=models.FileField(blank=True, editable=False, max_length=500, upload_to='', verbose_name='Постер'),
+        ),
+        migrations.AlterField(
+            model_name='lessonrecording',
+            name='duration',
+            field=models.DurationField(blank=True, null=True, verbose_name='Длительность'),
+        ),
+    ]
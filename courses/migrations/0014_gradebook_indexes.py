@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_recording_media'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testresult',
+            index=models.Index(fields=['student', 'course', 'test_name', 'date_taken'], name='courses_tes_student_e4836a_idx'),
+        ),
+    ]
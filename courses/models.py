@@ -1,8 +1,10 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from datetime import datetime
 from django.db import models
+import uuid
 
 User = settings.AUTH_USER_MODEL
 
@@ -50,6 +52,9 @@ class Course(models.Model):
         verbose_name=_('Дата обновления')
     )
     
+    # Заполняется триггером PostgreSQL (миграция 0010) для Course, Lesson и LessonMaterial, см. courses/search.py
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name=_('Поисковый вектор'))
+    
     class Meta:
         verbose_name = _('Курс')
         verbose_name_plural = _('Курсы')
@@ -112,18 +117,129 @@ class Group(models.Model):
     
     @property
     def student_count(self):
+        # students_count аннотируется в списках групп (Count('students'))
+        if hasattr(self, 'students_count'):
+            return self.students_count
         return self.students.count()
     
     @property
     def available_spots(self):
         return self.max_students - self.student_count
 
+class LessonSeries(models.Model):
+    """Серия повторяющихся занятий: правило повторения по дням недели"""
+    WEEKDAY_CHOICES = [
+        (0, _('Понедельник')),
+        (1, _('Вторник')),
+        (2, _('Среда')),
+        (3, _('Четверг')),
+        (4, _('Пятница')),
+        (5, _('Суббота')),
+        (6, _('Воскресенье')),
+    ]
+    
+    title = models.CharField(
+        max_length=255,
+        verbose_name=_('Тема занятий')
+    )
+    description = models.TextField(
+        blank=True,
+        verbose_name=_('Описание занятий')
+    )
+    lesson_type = models.CharField(
+        max_length=20,
+        choices=[
+            ('group', _('Групповое занятие')),
+            ('individual', _('Индивидуальное занятие')),
+        ],
+        default='group',
+        verbose_name=_('Тип занятий')
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='lesson_series',
+        null=True,
+        blank=True,
+        verbose_name=_('Группа')
+    )
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='individual_lesson_series',
+        limit_choices_to={'role': 'student'},
+        null=True,
+        blank=True,
+        verbose_name=_('Студент (для индивидуальных)')
+    )
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='lesson_series',
+        limit_choices_to={'role': 'teacher'},
+        verbose_name=_('Преподаватель')
+    )
+    weekdays = models.JSONField(
+        default=list,
+        verbose_name=_('Дни недели'),
+        help_text=_('Номера дней недели: 0 - понедельник, 6 - воскресенье')
+    )
+    interval_weeks = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name=_('Интервал (недели)')
+    )
+    start_date = models.DateField(
+        verbose_name=_('Дата начала')
+    )
+    end_date = models.DateField(
+        verbose_name=_('Дата окончания')
+    )
+    start_time = models.TimeField(
+        verbose_name=_('Время начала')
+    )
+    duration_minutes = models.PositiveIntegerField(
+        verbose_name=_('Длительность (минуты)')
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_lesson_series',
+        verbose_name=_('Создал')
+    )
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Комнаты и уведомления обработаны')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    
+    class Meta:
+        verbose_name = _('Серия занятий')
+        verbose_name_plural = _('Серии занятий')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.title} ({self.start_date} - {self.end_date})"
+
 class Lesson(models.Model):
     LESSON_TYPE_CHOICES = [
         ('group', _('Групповое занятие')),
         ('individual', _('Индивидуальное занятие')),
     ]
     has_ai_trainer = models.BooleanField(default=False, verbose_name=_('Есть ИИ-тренажер'))
+    series = models.ForeignKey(
+        LessonSeries,
+        on_delete=models.SET_NULL,
+        related_name='lessons',
+        null=True,
+        blank=True,
+        verbose_name=_('Серия')
+    )
     group = models.ForeignKey(
         Group,
         on_delete=models.CASCADE,
@@ -195,10 +311,18 @@ class Lesson(models.Model):
         verbose_name=_('Дата обновления')
     )
     
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name=_('Поисковый вектор'))
+    
     class Meta:
         verbose_name = _('Занятие')
         verbose_name_plural = _('Занятия')
         ordering = ['start_time']
+        # Поиск пересечений по участнику и времени (на PostgreSQL еще GiST по tstzrange, см. миграцию 0009)
+        indexes = [
+            models.Index(fields=['teacher', 'start_time', 'end_time']),
+            models.Index(fields=['student', 'start_time', 'end_time']),
+            models.Index(fields=['group', 'start_time', 'end_time']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.start_time.strftime('%d.%m.%Y %H:%M')}"
@@ -273,6 +397,10 @@ class Attendance(models.Model):
         verbose_name_plural = _('Посещения')
         unique_together = ['lesson', 'student']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['student', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.lesson} - {self.get_status_display()}"
@@ -378,6 +506,7 @@ class StudentProgress(models.Model):
         verbose_name = 'Прогресс студента'
         verbose_name_plural = 'Прогресс студентов'
         unique_together = ['student', 'course']
+        indexes = [models.Index(fields=['course', '-overall_progress'])]
 
 # 4. Модель результатов тестов
 class TestResult(models.Model):
@@ -407,6 +536,8 @@ class TestResult(models.Model):
     class Meta:
         verbose_name = 'Результат теста'
         verbose_name_plural = 'Результаты тестов'
+        # Последний результат студента по тесту курса (журнал группы, courses/gradebook.py)
+        indexes = [models.Index(fields=['student', 'course', 'test_name', 'date_taken'])]
 
 # === МОДЕЛИ ДЛЯ ВИДЕОУРОКОВ ===
 
@@ -463,8 +594,41 @@ class VideoLesson(models.Model):
         verbose_name = 'Видеоурок'
         verbose_name_plural = 'Видеоуроки'
 
+class RecordingMedia(models.Model):
+    """Производные записи, которые строит фоновый конвейер (RecordingMediaService)
+    
+    Длительность и размер берутся из ffprobe, рядом с оригиналом сохраняются HLS
+    низкого битрейта и постер. media_source - файл, по которому они построены:
+    новая обработка ставится в очередь, когда файл записи меняется.
+    """
+    MEDIA_STATUS_CHOICES = [
+        ('pending', 'Ожидает обработки'),
+        ('processing', 'Обрабатывается'),
+        ('ready', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    poster = models.FileField(max_length=500, blank=True, editable=False, verbose_name='Постер')
+    hls_playlist = models.CharField(max_length=500, blank=True, editable=False, verbose_name='HLS плейлист')
+    media_status = models.CharField(
+        max_length=20,
+        choices=MEDIA_STATUS_CHOICES,
+        default='pending',
+        editable=False,
+        verbose_name='Статус обработки'
+    )
+    media_error = models.TextField(blank=True, editable=False, verbose_name='Ошибка обработки')
+    media_source = models.CharField(max_length=500, blank=True, editable=False, verbose_name='Обработанный файл')
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def needs_media_processing(self):
+        return bool(self.file) and self.file.name != self.media_source and self.media_status != 'processing'
+
 # 2. Модель записей уроков
-class LessonRecording(models.Model):
+class LessonRecording(RecordingMedia):
     lesson = models.ForeignKey(
         Lesson,
         on_delete=models.CASCADE,
@@ -477,12 +641,16 @@ class LessonRecording(models.Model):
     )
     file = models.FileField(
         upload_to='lesson_recordings/',
+        blank=True,
         verbose_name='Файл записи'
     )
     duration = models.DurationField(
+        null=True,
+        blank=True,
         verbose_name='Длительность'
     )
     file_size = models.BigIntegerField(
+        default=0,
         verbose_name='Размер файла (байты)'
     )
     uploaded_by = models.ForeignKey(
@@ -502,6 +670,12 @@ class LessonRecording(models.Model):
     class Meta:
         verbose_name = 'Запись урока'
         verbose_name_plural = 'Записи уроков'
+    
+    def save(self, *args, **kwargs):
+        # Размер берем из файла (обычная загрузка); докачка выставляет его сама
+        if self.file and not self.file_size:
+            self.file_size = self.file.size
+        super().save(*args, **kwargs)
 
 # 3. Модель участников встречи
 class MeetingParticipant(models.Model):
@@ -698,6 +872,7 @@ class LessonMaterial(models.Model):
         verbose_name=_('Промпт ИИ-тренажёра'),
         help_text=_('Позволяет выбрать конкретный промпт для данного материала'),
     )
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name=_('Поисковый вектор'))
     class Meta:
         verbose_name = _('Материал урока')
         verbose_name_plural = _('Материалы урока')
@@ -846,4 +1021,118 @@ class TicketMessage(models.Model):
     class Meta:
         verbose_name = 'Сообщение тикета'
         verbose_name_plural = 'Сообщения тикетов'
-        ordering = ['created_at']
\ No newline at end of file
+        ordering = ['created_at']
+
+# 8. Счетчики дашборда прогресса (read model)
+class DashboardCounters(models.Model):
+    """Денормализованные счетчики для get_student_progress_dashboard
+    
+    Обновляются сигналами записей занятий, посещаемости, домашних заданий,
+    бейджей и достижений (DashboardCounterService) и пересчитываются
+    целиком командой rebuild_dashboard_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='dashboard_counters',
+        verbose_name='Пользователь'
+    )
+    # Студент
+    total_courses = models.PositiveIntegerField(default=0, verbose_name='Курсов')
+    total_lessons = models.PositiveIntegerField(default=0, verbose_name='Занятий')
+    completed_lessons = models.PositiveIntegerField(default=0, verbose_name='Посещено занятий')
+    total_homework = models.PositiveIntegerField(default=0, verbose_name='Сдано заданий')
+    submitted_homework = models.PositiveIntegerField(default=0, verbose_name='Оценено заданий')
+    total_badges = models.PositiveIntegerField(default=0, verbose_name='Бейджей')
+    total_achievements = models.PositiveIntegerField(default=0, verbose_name='Достижений')
+    # Преподаватель
+    total_groups = models.PositiveIntegerField(default=0, verbose_name='Групп')
+    total_students = models.PositiveIntegerField(default=0, verbose_name='Студентов')
+    taught_lessons = models.PositiveIntegerField(default=0, verbose_name='Проведено занятий')
+    graded_homework = models.PositiveIntegerField(default=0, verbose_name='Проверено заданий')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    
+    class Meta:
+        verbose_name = 'Счетчики дашборда'
+        verbose_name_plural = 'Счетчики дашборда'
+
+
+class ChunkedUpload(models.Model):
+    """Докачиваемая загрузка файла частями (в духе tus) с последующей привязкой к объекту"""
+    TARGET_CHOICES = [
+        ('homework_submission', 'Файл сданного задания'),
+        ('lesson_material', 'Файл материала урока'),
+        ('lesson_recording', 'Запись урока'),
+        ('livesmart_recording', 'Запись LiveSmart'),
+    ]
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('assembling', 'Собирается'),
+        ('complete', 'Завершена'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+        verbose_name='Пользователь'
+    )
+    target = models.CharField(max_length=30, choices=TARGET_CHOICES, verbose_name='Куда загружается')
+    object_id = models.PositiveIntegerField(verbose_name='ID объекта')
+    filename = models.CharField(max_length=255, verbose_name='Имя файла')
+    total_size = models.BigIntegerField(verbose_name='Размер файла (байты)')
+    chunk_size = models.PositiveIntegerField(verbose_name='Размер части (байты)')
+    checksum = models.CharField(
+        max_length=150,
+        blank=True,
+        verbose_name='Контрольная сумма файла',
+        help_text='В формате tus: "<алгоритм> <base64>", например "sha256 ..."'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name='Статус')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    file_name = models.CharField(max_length=500, blank=True, verbose_name='Итоговый файл')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата завершения')
+    
+    class Meta:
+        verbose_name = 'Загрузка частями'
+        verbose_name_plural = 'Загрузки частями'
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'updated_at'])]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+    
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def expected_chunk_size(self, index):
+        if index == self.chunk_count - 1:
+            return self.total_size - self.chunk_size * index
+        return self.chunk_size
+
+
+class ChunkedUploadPart(models.Model):
+    """Принятая часть загрузки; сама часть лежит в хранилище до сборки"""
+    upload = models.ForeignKey(
+        ChunkedUpload,
+        on_delete=models.CASCADE,
+        related_name='parts',
+        verbose_name='Загрузка'
+    )
+    index = models.PositiveIntegerField(verbose_name='Номер части')
+    size = models.PositiveIntegerField(verbose_name='Размер (байты)')
+    checksum = models.CharField(max_length=150, verbose_name='Контрольная сумма')
+    storage_name = models.CharField(max_length=500, verbose_name='Файл части')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
+    
+    class Meta:
+        verbose_name = 'Часть загрузки'
+        verbose_name_plural = 'Части загрузки'
+        ordering = ['index']
+        unique_together = ['upload', 'index']
+
@@ -0,0 +1,95 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+SEARCH_CONFIGS = ('russian', 'english')
+SEARCH_WEIGHTS = {'title': 'A', 'description': 'B'}
+MAX_SEARCH_WORDS = 8
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_vector():
+    """Выражение search_vector: название (A) и описание (B) в русской и английской конфигурациях
+
+    Должно совпадать с триггером courses_search_vector_update (миграция 0010).
+    """
+    vector = None
+    for field, weight in SEARCH_WEIGHTS.items():
+        for config in SEARCH_CONFIGS:
+            part = SearchVector(field, config=config, weight=weight)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def prefix_tsquery(text):
+    """Строка to_tsquery с префиксным поиском по каждому слову: 'англ грам' -> 'англ:* & грам:*'
+
+    Из запроса берутся только буквы и цифры, поэтому операторы tsquery в нем не работают.
+    """
+    words = _WORD_RE.findall(text or '')[:MAX_SEARCH_WORDS]
+    return ' & '.join(f'{word.lower()}:*' for word in words)
+
+
+def search_query(text):
+    """SearchQuery по обеим конфигурациям с префиксами или None для пустого запроса"""
+    raw = prefix_tsquery(text)
+    if not raw:
+        return None
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(raw, config=config, search_type='raw')
+        query = part if query is None else query | part
+    return query
+
+
+def supports_full_text(queryset):
+    return (
+        connections[queryset.db].vendor == 'postgresql'
+        and any(field.name == 'search_vector' for field in queryset.model._meta.get_fields())
+    )
+
+
+def full_text_search(queryset, text):
+    """Фильтр по search_vector (GIN индекс) с аннотацией search_rank"""
+    query = search_query(text)
+    if query is None:
+        return queryset.none()
+    return queryset.annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).filter(search_vector=query)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """Полнотекстовый поиск PostgreSQL с ранжированием и префиксами для подсказок
+
+    Без явного ?ordering= результаты сортируются по релевантности, поэтому фильтр
+    ставится после OrderingFilter. На других СУБД - обычный SearchFilter (icontains).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or not supports_full_text(queryset):
+            return super().filter_queryset(request, queryset, view)
+
+        queryset = full_text_search(queryset, ' '.join(search_terms))
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('-search_rank', *queryset.query.order_by)
+
+
+
+def suggest(queryset, text, limit=5):
+    """Подсказки для поиска по мере ввода: лучшие совпадения по префиксам слов"""
+    if supports_full_text(queryset):
+        return full_text_search(queryset, text).order_by('-search_rank')[:limit]
+    words = _WORD_RE.findall(text or '')[:MAX_SEARCH_WORDS]
+    if not words:
+        return queryset.none()
+    for word in words:
+        queryset = queryset.filter(title__icontains=word)
+    return queryset[:limit]
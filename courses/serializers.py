@@ -1,12 +1,27 @@
 from rest_framework import serializers
-from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
+from .models import Course, Group, Lesson, LessonSeries, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage, ChunkedUpload
 from accounts.models import User
 from payments.models import Payment
+from config.protected_media import ProtectedFileField, hls_url
+from .services import PaymentStatusResolver
+
+class PaymentStatusMixin:
+    """Проверка оплаты по парам, заранее загруженным во view (context['paid_pairs'])"""
+    
+    def has_payment(self, student_id, course_id):
+        paid_pairs = self.context.get('paid_pairs')
+        if paid_pairs is None:
+            return Payment.objects.filter(
+                student_id=student_id,
+                course_id=course_id,
+                status='paid'
+            ).exists()
+        return (student_id, course_id) in paid_pairs
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        fields = '__all__'
+        exclude = ['search_vector']
         read_only_fields = ['created_at', 'updated_at']
 
 class GroupSerializer(serializers.ModelSerializer):
@@ -21,6 +36,13 @@ class GroupSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['created_at', 'student_count', 'available_spots']
     
+    def get_fields(self):
+        fields = super().get_fields()
+        # ?compact=1 - список групп без students_list
+        if self.context.get('compact'):
+            fields.pop('students_list', None)
+        return fields
+    
     def get_students_list(self, obj):
         return [
             {
@@ -31,7 +53,7 @@ class GroupSerializer(serializers.ModelSerializer):
             for student in obj.students.all()
         ]
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(PaymentStatusMixin, serializers.ModelSerializer):
     group_title = serializers.CharField(source='group.title', read_only=True, allow_null=True)
     student_name = serializers.CharField(source='student.get_full_name', read_only=True, allow_null=True)
     teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
@@ -41,40 +63,30 @@ class LessonSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = ['search_vector']
         read_only_fields = ['created_at', 'updated_at', 'duration_minutes']
     
     def get_payment_status(self, obj):
         """Проверить статус оплаты для группы"""
         if obj.lesson_type == 'group' and obj.group:
-            payment_status = []
-            for student in obj.group.students.all():
-                # Проверить оплату студента за курс группы
-                has_payment = Payment.objects.filter(
-                    student=student,
-                    course=obj.group.course,
-                    status='paid'
-                ).exists()
-                payment_status.append({
+            course_id = obj.group.course_id
+            return [
+                {
                     'student_id': student.id,
                     'student_name': student.get_full_name(),
-                    'has_payment': has_payment
-                })
-            return payment_status
+                    'has_payment': self.has_payment(student.id, course_id)
+                }
+                for student in obj.group.students.all()
+            ]
         return []
     
     def get_student_payment_status(self, obj):
         """Проверить статус оплаты для индивидуального занятия"""
         if obj.lesson_type == 'individual' and obj.student:
-            has_payment = Payment.objects.filter(
-                student=obj.student,
-                course=obj.group.course if obj.group else None,
-                status='paid'
-            ).exists()
             return {
                 'student_id': obj.student.id,
                 'student_name': obj.student.get_full_name(),
-                'has_payment': has_payment
+                'has_payment': self.has_payment(obj.student.id, PaymentStatusResolver.get_lesson_course_id(obj))
             }
         return {}
     
@@ -101,6 +113,39 @@ class LessonSerializer(serializers.ModelSerializer):
         
         return attrs
 
+
+class LessonSeriesSerializer(serializers.ModelSerializer):
+    teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
+    lessons_count = serializers.IntegerField(read_only=True)
+    skip_conflicts = serializers.BooleanField(write_only=True, required=False, default=False)
+    
+    class Meta:
+        model = LessonSeries
+        fields = '__all__'
+        read_only_fields = ['created_by', 'processed_at', 'created_at']
+        extra_kwargs = {'teacher': {'required': False}}
+    
+    def validate_weekdays(self, value):
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError('Укажите хотя бы один день недели')
+        if any(not isinstance(day, int) or isinstance(day, bool) or not 0 <= day <= 6 for day in value):
+            raise serializers.ValidationError('Дни недели - числа от 0 (понедельник) до 6 (воскресенье)')
+        return sorted(set(value))
+    
+    def validate(self, attrs):
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError('Дата окончания раньше даты начала')
+        if not 0 < attrs['duration_minutes'] < 24 * 60:
+            raise serializers.ValidationError('Длительность занятия - от 1 минуты до суток')
+        if attrs.get('interval_weeks', 1) < 1:
+            raise serializers.ValidationError('Интервал - не меньше одной недели')
+        lesson_type = attrs.get('lesson_type', 'group')
+        if lesson_type == 'group' and not attrs.get('group'):
+            raise serializers.ValidationError('Для групповых занятий необходимо указать группу')
+        if lesson_type == 'individual' and not attrs.get('student'):
+            raise serializers.ValidationError('Для индивидуальных занятий необходимо указать студента')
+        return attrs
+
 class AttendanceSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
@@ -123,7 +168,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
         
         return attrs
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(PaymentStatusMixin, serializers.ModelSerializer):
     """Сериализатор для расписания"""
     course_title = serializers.CharField(source='group.course.title', read_only=True, allow_null=True)
     group_title = serializers.CharField(source='group.title', read_only=True, allow_null=True)
@@ -142,30 +187,20 @@ class ScheduleSerializer(serializers.ModelSerializer):
     def get_payment_status(self, obj):
         if obj.lesson_type == 'group' and obj.group:
             # Проверить оплату студентов группы
-            students = obj.group.students.all()
-            payment_status = []
-            for student in students:
-                has_payment = Payment.objects.filter(
-                    student=student,
-                    course=obj.group.course,
-                    status='paid'
-                ).exists()
-                payment_status.append({
+            course_id = obj.group.course_id
+            return [
+                {
                     'student_id': student.id,
                     'student_name': student.get_full_name(),
-                    'has_payment': has_payment
-                })
-            return payment_status
+                    'has_payment': self.has_payment(student.id, course_id)
+                }
+                for student in obj.group.students.all()
+            ]
         elif obj.lesson_type == 'individual' and obj.student:
-            has_payment = Payment.objects.filter(
-                student=obj.student,
-                course=obj.group.course if obj.group else None,
-                status='paid'
-            ).exists()
             return [{
                 'student_id': obj.student.id,
                 'student_name': obj.student.get_full_name(),
-                'has_payment': has_payment
+                'has_payment': self.has_payment(obj.student.id, PaymentStatusResolver.get_lesson_course_id(obj))
             }]
         return []
 
@@ -192,11 +227,11 @@ class TestResultSerializer(serializers.ModelSerializer):
         read_only_fields = ['date_taken']
 
 class StudentProgressSerializer(serializers.ModelSerializer):
-    test_results_data = TestResultSerializer(source='test_results.all', many=True, read_only=True)
-    
     class Meta:
         model = StudentProgress
         fields = '__all__'
+        # Считаются StudentProgressEngine, вручную задается только уровень
+        read_only_fields = ['student', 'course', 'completed_topics', 'test_results', 'overall_progress', 'last_activity']
 
 # === СЕРИАЛИЗАТОРЫ ДЛЯ ВИДЕОУРОКОВ ===
 
@@ -212,11 +247,17 @@ class VideoLessonSerializer(serializers.ModelSerializer):
 class LessonRecordingSerializer(serializers.ModelSerializer):
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
+    file = ProtectedFileField('lesson_recording', required=False)
+    poster = ProtectedFileField('lesson_recording', variant='poster', read_only=True)
+    hls_url = serializers.SerializerMethodField()
     
     class Meta:
         model = LessonRecording
-        fields = '__all__'
-        read_only_fields = ['uploaded_at']
+        exclude = ['hls_playlist', 'media_source']
+        read_only_fields = ['uploaded_at', 'file_size', 'duration']
+    
+    def get_hls_url(self, obj):
+        return hls_url(self.context.get('request'), 'lesson_recording', obj)
 
 class MeetingParticipantSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -250,10 +291,11 @@ class HomeworkSubmissionSerializer(serializers.ModelSerializer):
 # 2. Сериализатор материалов урока
 class LessonMaterialSerializer(serializers.ModelSerializer):
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
+    file = ProtectedFileField('lesson_material', required=False, allow_null=True)
     
     class Meta:
         model = LessonMaterial
-        fields = '__all__'
+        exclude = ['search_vector']
         read_only_fields = ['created_at']
 
 # 3. Сериализатор достижений
@@ -288,4 +330,11 @@ class TicketMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = TicketMessage
         fields = '__all__'
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+class ChunkedUploadCreateSerializer(serializers.Serializer):
+    """Создание загрузки частями"""
+    target = serializers.ChoiceField(choices=ChunkedUpload.TARGET_CHOICES)
+    object_id = serializers.IntegerField(min_value=1)
+    filename = serializers.CharField(max_length=255)
+    total_size = serializers.IntegerField(min_value=1)
+    checksum = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
@@ -1,10 +1,40 @@
 # courses/services.py
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
 import requests
 import jwt
+import subprocess
+import tempfile
 import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import Avg, Count, Exists, F, FloatField, Func, IntegerField, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+from django.db.models.functions import Cast
 from django.utils import timezone
-from .models import Lesson, VideoLesson, MeetingParticipant
+from accounts.models import User
+from payments.models import Payment
+from config.http_client import get_client
+from .models import (
+    Attendance, ChunkedUpload, ChunkedUploadPart, Course, DashboardCounters, Group, HomeworkSubmission, Lesson,
+    LessonSeries, VideoLesson, MeetingParticipant, StudentAchievement, StudentBadge, StudentProgress, TestResult
+)
+from .signals import attendance_marked
+from .tasks import process_lesson_series
+
+logger = logging.getLogger(__name__)
+
 
 class ZoomService:
     """Сервис для работы с Zoom API"""
@@ -52,11 +82,14 @@ class ZoomService:
             }
         }
         
-        response = requests.post(
-            f'https://api.zoom.us/v2/users/{settings.ZOOM_USER_ID}/meetings',
-            headers=headers,
-            json=meeting_data
-        )
+        try:
+            response = get_client('zoom').post(
+                f'https://api.zoom.us/v2/users/{settings.ZOOM_USER_ID}/meetings',
+                headers=headers,
+                json=meeting_data
+            )
+        except requests.RequestException as e:
+            return {'success': False, 'error': str(e)}
         
         if response.status_code == 201:
             data = response.json()
@@ -175,4 +208,1315 @@ class VideoLessonService:
                 message=f'Занятие "{lesson.title}" начинается. Присоединяйтесь по ссылке.',
                 notification_type='lesson',
                 channels=['email', 'in_app', 'push']
-            )
\ No newline at end of file
+            )
+
+
+class PaymentStatusResolver:
+    """Пакетная проверка оплат для страницы занятий"""
+
+    @staticmethod
+    def get_lesson_course_id(lesson):
+        """Курс, по которому проверяется оплата занятия"""
+        return lesson.group.course_id if lesson.group_id else None
+
+    @staticmethod
+    def load(lessons):
+        """Подгрузить связи занятий и вернуть множество оплаченных пар (student_id, course_id)"""
+        lessons = [lesson for lesson in lessons if isinstance(lesson, Lesson)]
+        if not lessons:
+            return set()
+
+        prefetch_related_objects(lessons, 'teacher', 'student', 'group__course', 'group__students')
+
+        student_ids = set()
+        course_ids = set()
+        for lesson in lessons:
+            course_id = PaymentStatusResolver.get_lesson_course_id(lesson)
+            if lesson.lesson_type == 'group' and lesson.group_id:
+                student_ids.update(student.id for student in lesson.group.students.all())
+                course_ids.add(course_id)
+            elif lesson.lesson_type == 'individual' and lesson.student_id:
+                student_ids.add(lesson.student_id)
+                course_ids.add(course_id)
+
+        if not student_ids:
+            return set()
+
+        course_filter = Q(course_id__in=[course_id for course_id in course_ids if course_id is not None])
+        if None in course_ids:
+            course_filter |= Q(course__isnull=True)
+
+        return set(
+            Payment.objects.filter(
+                course_filter,
+                student_id__in=student_ids,
+                status='paid'
+            ).values_list('student_id', 'course_id').distinct()
+        )
+
+
+class AttendanceService:
+    """Массовая отметка посещаемости занятия"""
+    
+    @staticmethod
+    def lesson_students(lesson, student_ids):
+        """Студенты занятия среди переданных id (один запрос)"""
+        if lesson.lesson_type == 'group' and lesson.group_id:
+            students = User.objects.filter(learning_groups=lesson.group_id)
+        else:
+            students = User.objects.filter(id=lesson.student_id)
+        return set(students.filter(id__in=student_ids).values_list('id', flat=True))
+    
+    @staticmethod
+    def mark(lesson, rows, notify_comments=False):
+        """Записать посещаемость пачкой
+        
+        rows - список словарей student_id / status / comment. Все студенты
+        проверяются одним запросом, записи вставляются или обновляются одним
+        bulk_create(update_conflicts=True), после чего отправляется один
+        сигнал attendance_marked для уведомлений и CRM.
+        """
+        valid_statuses = {value for value, label in Attendance.ATTENDANCE_STATUS_CHOICES}
+        values = {}
+        for row in rows:
+            try:
+                student_id = int(row.get('student_id'))
+            except (TypeError, ValueError):
+                raise ValidationError(f'Некорректный id студента: {row.get("student_id")}')
+            status_value = row.get('status') or 'present'
+            if status_value not in valid_statuses:
+                raise ValidationError(f'Некорректный статус посещения: {status_value}')
+            values[student_id] = (status_value, row.get('comment') or '')
+        
+        if not values:
+            return []
+        
+        allowed = AttendanceService.lesson_students(lesson, values)
+        invalid = sorted(set(values) - allowed)
+        if invalid:
+            raise ValidationError(
+                f'Студенты не относятся к занятию: {", ".join(str(student_id) for student_id in invalid)}'
+            )
+        
+        with transaction.atomic():
+            existing = set(
+                Attendance.objects.filter(
+                    lesson=lesson,
+                    student_id__in=values
+                ).values_list('student_id', flat=True)
+            )
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(lesson=lesson, student_id=student_id, status=status_value, comment=comment)
+                    for student_id, (status_value, comment) in values.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['lesson', 'student'],
+                update_fields=['status', 'comment', 'updated_at']
+            )
+            attendances = list(
+                Attendance.objects.filter(
+                    lesson=lesson,
+                    student_id__in=values
+                ).select_related('lesson', 'student').order_by('student_id')
+            )
+            
+            attendance_marked.send(
+                sender=Attendance,
+                lesson=lesson,
+                attendances=attendances,
+                created_student_ids=set(values) - existing,
+                notify_comments=notify_comments
+            )
+        
+        return attendances
+
+
+class StudentCardService:
+    """Карточка студента для преподавателя: один план предзагрузки + версионированный кеш
+    
+    Кеш карточки адресуется версией студента (прогресс, бейджи, тесты,
+    профиль) и общей версией справочников (курсы, бейджи). Сигналы записи
+    увеличивают версию, старые карточки просто перестают читаться и
+    истекают по таймауту.
+    """
+    
+    CATALOG_VERSION_KEY = 'courses:student_card:catalog_version'
+    
+    @staticmethod
+    def version_key(student_id):
+        return f'courses:student_card:version:{student_id}'
+    
+    @staticmethod
+    def cache_timeout():
+        return getattr(settings, 'STUDENT_CARD_CACHE_TIMEOUT', 60 * 60)
+    
+    @staticmethod
+    def bump(key):
+        """Увеличить версию; пропавшая из кеша версия начинается заново с уникального значения"""
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    
+    @staticmethod
+    def invalidate_student(student_id):
+        StudentCardService.bump(StudentCardService.version_key(student_id))
+    
+    @staticmethod
+    def invalidate_catalog():
+        StudentCardService.bump(StudentCardService.CATALOG_VERSION_KEY)
+    
+    @staticmethod
+    def cache_key(student_id):
+        keys = [StudentCardService.version_key(student_id), StudentCardService.CATALOG_VERSION_KEY]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                versions[key] = time.time_ns()
+                if not cache.add(key, versions[key], None):
+                    versions[key] = cache.get(key, versions[key])
+        return f'courses:student_card:{student_id}:{versions[keys[0]]}:{versions[keys[1]]}'
+    
+    @staticmethod
+    def get(student, use_cache=True):
+        """Карточка студента из кеша или из БД"""
+        if not use_cache or not StudentCardService.cache_timeout():
+            return StudentCardService.build(student)
+        
+        key = StudentCardService.cache_key(student.id)
+        card = cache.get(key)
+        if card is None:
+            card = StudentCardService.build(student)
+            cache.set(key, card, StudentCardService.cache_timeout())
+        return card
+    
+    @staticmethod
+    def build(student):
+        """Собрать карточку: по одному запросу на прогресс, бейджи и результаты тестов"""
+        prefetch_related_objects(
+            [student],
+            Prefetch('progress', queryset=StudentProgress.objects.select_related('course')),
+            Prefetch(
+                'badges_received',
+                queryset=StudentBadge.objects.select_related('badge', 'awarded_by').order_by('id')
+            ),
+            Prefetch('test_results', queryset=TestResult.objects.select_related('course')),
+        )
+        
+        return {
+            'student': {
+                'id': student.id,
+                'username': student.username,
+                'full_name': student.get_full_name(),
+                'email': student.email,
+                'birth_date': student.birth_date,
+                'phone': student.phone,
+                'avatar': student.avatar.url if student.avatar else None,
+            },
+            'progress': [
+                {
+                    'course': {
+                        'id': progress.course.id,
+                        'title': progress.course.title,
+                    },
+                    'completed_topics': progress.completed_topics,
+                    'current_level': progress.current_level,
+                    'overall_progress': progress.overall_progress,
+                    'last_activity': progress.last_activity,
+                }
+                for progress in student.progress.all()
+            ],
+            'badges': [
+                {
+                    'id': student_badge.id,
+                    'badge': {
+                        'id': student_badge.badge.id,
+                        'name': student_badge.badge.name,
+                        'description': student_badge.badge.description,
+                        'badge_type': student_badge.badge.badge_type,
+                        'icon': student_badge.badge.icon.url if student_badge.badge.icon else None,
+                    },
+                    'awarded_at': student_badge.awarded_at,
+                    'awarded_by': student_badge.awarded_by.get_full_name(),
+                    'comment': student_badge.comment,
+                }
+                for student_badge in student.badges_received.all()
+            ],
+            'test_results': [
+                {
+                    'test_name': test_result.test_name,
+                    'score': test_result.score,
+                    'max_score': test_result.max_score,
+                    'date_taken': test_result.date_taken,
+                    'course': {
+                        'id': test_result.course.id,
+                        'title': test_result.course.title,
+                    },
+                }
+                for test_result in student.test_results.all()
+            ],
+        }
+
+
+class SubqueryCount(Subquery):
+    """Число строк подзапроса (0, если строк нет)"""
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+
+class DashboardCounterService:
+    """Счетчики дашборда прогресса: одна строка DashboardCounters на пользователя
+    
+    Сигналы держат счетчики в актуальном состоянии: бейджи и достижения
+    меняются на +1/-1, остальные счетчики затронутых пользователей
+    пересчитываются одним UPDATE с подзапросами. Строка создается при
+    первом чтении, ночной rebuild сверяет все строки с БД.
+    """
+    
+    STUDENT_FIELDS = [
+        'total_courses', 'total_lessons', 'completed_lessons', 'total_homework',
+        'submitted_homework', 'total_badges', 'total_achievements',
+    ]
+    TEACHER_FIELDS = ['total_groups', 'total_students', 'taught_lessons', 'graded_homework']
+    FIELDS = STUDENT_FIELDS + TEACHER_FIELDS
+    REBUILD_BATCH_SIZE = 1000
+    
+    @staticmethod
+    def count_expression(field):
+        """Подзапрос, считающий поле для строки счетчиков (OuterRef('user_id'))"""
+        user = OuterRef('user_id')
+        querysets = {
+            'total_courses': Group.objects.filter(students=user).values('course_id').distinct(),
+            'total_lessons': Lesson.objects.filter(
+                Q(group__students=user) | Q(student=user)
+            ).values('id').distinct(),
+            'completed_lessons': Attendance.objects.filter(student=user, status='present').values('id'),
+            'total_homework': HomeworkSubmission.objects.filter(student=user).values('id'),
+            'submitted_homework': HomeworkSubmission.objects.filter(
+                student=user,
+                grade__isnull=False
+            ).values('id'),
+            'total_badges': StudentBadge.objects.filter(student=user).values('id'),
+            'total_achievements': StudentAchievement.objects.filter(student=user).values('id'),
+            'total_groups': Group.objects.filter(teacher=user).values('id'),
+            'total_students': Group.students.through.objects.filter(
+                group__teacher=user
+            ).values('user_id').distinct(),
+            'taught_lessons': Lesson.objects.filter(teacher=user).values('id'),
+            'graded_homework': HomeworkSubmission.objects.filter(
+                homework__lesson__teacher=user,
+                grade__isnull=False
+            ).values('id'),
+        }
+        return SubqueryCount(querysets[field].order_by())
+    
+    @staticmethod
+    def get(user):
+        """Счетчики пользователя: одно чтение строки, при отсутствии - полный расчет"""
+        try:
+            return DashboardCounters.objects.get(user=user)
+        except DashboardCounters.DoesNotExist:
+            DashboardCounterService.rebuild([user.id])
+            return DashboardCounters.objects.get(user=user)
+    
+    @staticmethod
+    def refresh(user_ids, fields):
+        """Пересчитать поля для пользователей одним UPDATE
+        
+        user_ids - список id или queryset со значениями id. Пользователи
+        без строки счетчиков пропускаются: строка будет посчитана при чтении.
+        """
+        if isinstance(user_ids, (list, set, tuple)):
+            user_ids = [user_id for user_id in user_ids if user_id is not None]
+            if not user_ids:
+                return 0
+        return DashboardCounters.objects.filter(user_id__in=user_ids).update(**{
+            field: DashboardCounterService.count_expression(field)
+            for field in fields
+        })
+    
+    @staticmethod
+    def add(user_id, field, delta):
+        """Изменить счетчик на delta без пересчета"""
+        counters = DashboardCounters.objects.filter(user_id=user_id)
+        if delta < 0:
+            counters = counters.filter(**{f'{field}__gte': -delta})
+        return counters.update(**{field: F(field) + delta})
+    
+    @staticmethod
+    def aggregate(user_ids):
+        """Все счетчики для пачки пользователей: группирующие запросы с условной агрегацией"""
+        through = Group.students.through
+        rows = {user_id: dict.fromkeys(DashboardCounterService.FIELDS, 0) for user_id in user_ids}
+        
+        def collect(queryset, key, **fields):
+            for values in queryset.order_by().values(key).annotate(**fields):
+                rows[values[key]].update({field: values[field] for field in fields})
+        
+        collect(
+            through.objects.filter(user_id__in=user_ids), 'user_id',
+            total_courses=Count('group__course', distinct=True),
+            total_lessons=Count('group__lessons', distinct=True),
+        )
+        # Занятия, где студент указан сам, а не через группу, добавляются к групповым
+        for values in Lesson.objects.filter(student_id__in=user_ids).exclude(
+            Exists(through.objects.filter(group_id=OuterRef('group_id'), user_id=OuterRef('student_id')))
+        ).order_by().values('student_id').annotate(individual=Count('id')):
+            rows[values['student_id']]['total_lessons'] += values['individual']
+        collect(
+            Attendance.objects.filter(student_id__in=user_ids), 'student_id',
+            completed_lessons=Count('id', filter=Q(status='present')),
+        )
+        collect(
+            HomeworkSubmission.objects.filter(student_id__in=user_ids), 'student_id',
+            total_homework=Count('id'),
+            submitted_homework=Count('id', filter=Q(grade__isnull=False)),
+        )
+        collect(StudentBadge.objects.filter(student_id__in=user_ids), 'student_id', total_badges=Count('id'))
+        collect(
+            StudentAchievement.objects.filter(student_id__in=user_ids), 'student_id',
+            total_achievements=Count('id'),
+        )
+        collect(
+            Group.objects.filter(teacher_id__in=user_ids), 'teacher_id',
+            total_groups=Count('id', distinct=True),
+            total_students=Count('students', distinct=True),
+        )
+        collect(Lesson.objects.filter(teacher_id__in=user_ids), 'teacher_id', taught_lessons=Count('id'))
+        collect(
+            HomeworkSubmission.objects.filter(homework__lesson__teacher_id__in=user_ids),
+            'homework__lesson__teacher_id',
+            graded_homework=Count('id', filter=Q(grade__isnull=False)),
+        )
+        return rows
+    
+    @staticmethod
+    def rebuild(user_ids=None, batch_size=None):
+        """Полный пересчет счетчиков (по умолчанию для всех студентов и преподавателей)"""
+        if user_ids is None:
+            user_ids = User.objects.filter(role__in=['student', 'teacher']).order_by('id').values_list('id', flat=True)
+        user_ids = list(user_ids)
+        batch_size = batch_size or DashboardCounterService.REBUILD_BATCH_SIZE
+        
+        for start in range(0, len(user_ids), batch_size):
+            rows = DashboardCounterService.aggregate(user_ids[start:start + batch_size])
+            DashboardCounters.objects.bulk_create(
+                [DashboardCounters(user_id=user_id, **values) for user_id, values in rows.items()],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=DashboardCounterService.FIELDS + ['updated_at']
+            )
+        return len(user_ids)
+
+
+class StudentProgressEngine:
+    """Расчет StudentProgress по посещаемости, оценкам за задания и тестам
+    
+    Прогресс - взвешенное среднее долей (0..1) по доступным компонентам:
+    посещенные занятия группы курса, средняя оценка за задания курса
+    (grade / max_points) и средний результат тестов (score / max_score).
+    Компоненты без данных не учитываются. completed_topics - темы
+    посещенных занятий, test_results - последний результат каждого теста.
+    
+    Любой пересчет - это несколько группирующих запросов на курс и один
+    upsert строк прогресса, поэтому один и тот же код обслуживает и
+    запись одного студента, и пересчет всего курса.
+    """
+    
+    WEIGHTS = {'attendance': 0.4, 'homework': 0.3, 'tests': 0.3}
+    ATTENDED_STATUSES = ['present', 'late']
+    
+    @staticmethod
+    def score(components):
+        """Общий прогресс в процентах по долям компонентов (None - нет данных)"""
+        weights = StudentProgressEngine.WEIGHTS
+        available = {name: value for name, value in components.items() if value is not None}
+        if not available:
+            return 0
+        total_weight = sum(weights[name] for name in available)
+        value = sum(weights[name] * min(max(ratio, 0.0), 1.0) for name, ratio in available.items())
+        return round(100 * value / total_weight)
+    
+    @staticmethod
+    def schedule(course_id, student_ids):
+        """Пересчитать прогресс после фиксации транзакции"""
+        student_ids = {student_id for student_id in student_ids if student_id is not None}
+        if course_id is None or not student_ids:
+            return
+        transaction.on_commit(
+            lambda: StudentProgressEngine.recompute(course_id, student_ids),
+            robust=True
+        )
+    
+    @staticmethod
+    def course_students(course_id):
+        """Студенты курса: участники групп, студенты с тестами и с уже созданным прогрессом"""
+        student_ids = set(
+            Group.students.through.objects.filter(group__course_id=course_id).values_list('user_id', flat=True)
+        )
+        student_ids.update(TestResult.objects.filter(course_id=course_id).values_list('student_id', flat=True))
+        student_ids.update(StudentProgress.objects.filter(course_id=course_id).values_list('student_id', flat=True))
+        return student_ids
+    
+    @staticmethod
+    def recompute(course_id, student_ids=None):
+        """Пересчитать и сохранить прогресс по курсу (все студенты курса или переданные)"""
+        if not Course.objects.filter(id=course_id).exists():
+            return 0
+        if student_ids is None:
+            student_ids = StudentProgressEngine.course_students(course_id)
+        else:
+            # Студент мог быть удален в той же транзакции, что и его записи
+            student_ids = set(User.objects.filter(id__in=student_ids).values_list('id', flat=True))
+        if not student_ids:
+            return 0
+        
+        components = {
+            student_id: {'attendance': None, 'homework': None, 'tests': None}
+            for student_id in student_ids
+        }
+        topics = {student_id: [] for student_id in student_ids}
+        tests = {student_id: {} for student_id in student_ids}
+        
+        attendances = Attendance.objects.filter(lesson__group__course_id=course_id, student_id__in=student_ids)
+        for row in attendances.order_by().values('student_id').annotate(
+            total=Count('id'),
+            attended=Count('id', filter=Q(status__in=StudentProgressEngine.ATTENDED_STATUSES))
+        ):
+            components[row['student_id']]['attendance'] = row['attended'] / row['total']
+        
+        for student_id, title in attendances.filter(
+            status__in=StudentProgressEngine.ATTENDED_STATUSES
+        ).order_by('lesson__start_time', 'lesson_id').values_list('student_id', 'lesson__title'):
+            if title not in topics[student_id]:
+                topics[student_id].append(title)
+        
+        for row in HomeworkSubmission.objects.filter(
+            homework__lesson__group__course_id=course_id,
+            homework__max_points__gt=0,
+            student_id__in=student_ids,
+            grade__isnull=False
+        ).order_by().values('student_id').annotate(
+            ratio=Avg(Cast('grade', FloatField()) / F('homework__max_points'))
+        ):
+            components[row['student_id']]['homework'] = row['ratio']
+        
+        results = TestResult.objects.filter(course_id=course_id, student_id__in=student_ids, max_score__gt=0)
+        for row in results.order_by().values('student_id').annotate(
+            ratio=Avg(Cast('score', FloatField()) / F('max_score'))
+        ):
+            components[row['student_id']]['tests'] = row['ratio']
+        
+        for student_id, test_name, score, max_score in results.order_by('date_taken', 'id').values_list(
+            'student_id', 'test_name', 'score', 'max_score'
+        ):
+            tests[student_id][test_name] = {'score': score, 'max_score': max_score}
+        
+        StudentProgress.objects.bulk_create(
+            [
+                StudentProgress(
+                    student_id=student_id,
+                    course_id=course_id,
+                    completed_topics=topics[student_id],
+                    test_results=tests[student_id],
+                    overall_progress=StudentProgressEngine.score(components[student_id])
+                )
+                for student_id in student_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['student', 'course'],
+            update_fields=['completed_topics', 'test_results', 'overall_progress']
+        )
+        # bulk_create не отправляет post_save - карточки студентов сбрасываем сами
+        for student_id in student_ids:
+            StudentCardService.invalidate_student(student_id)
+        return len(student_ids)
+
+
+class ScheduleConflict(ValidationError):
+    """Занятия пересекаются с уже запланированными"""
+    
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f'Пересечений с существующими занятиями: {len(conflicts)}')
+
+
+class ScheduleConflictService:
+    """Пересечения занятий преподавателей и студентов и свободные окна
+    
+    Все проверки - один запрос по диапазону времени. На PostgreSQL он
+    идет через tstzrange(start_time, end_time) && tstzrange(...) и GiST
+    индексы (teacher_id / student_id / group_id, tstzrange) из миграции
+    0009, на остальных БД - через start_time < end AND end_time > start
+    и btree индексы (участник, start_time).
+    """
+    
+    @staticmethod
+    def overlapping(queryset, start_time, end_time):
+        """Занятия queryset, пересекающиеся с [start_time, end_time)"""
+        if connections[queryset.db].vendor == 'postgresql':
+            from django.contrib.postgres.fields import DateTimeRangeField
+            from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+            return queryset.alias(
+                period=Func(F('start_time'), F('end_time'), function='TSTZRANGE', output_field=DateTimeRangeField())
+            ).filter(period__overlap=DateTimeTZRange(start_time, end_time))
+        return queryset.filter(start_time__lt=end_time, end_time__gt=start_time)
+    
+    @staticmethod
+    def participant_ids(group_id=None, student_id=None):
+        """Студенты занятия: участники группы или студент индивидуального занятия"""
+        if group_id:
+            return list(User.objects.filter(learning_groups=group_id).values_list('id', flat=True))
+        return [student_id] if student_id else []
+    
+    @staticmethod
+    def busy_lessons(start_time, end_time, teacher_id=None, student_ids=(), group_id=None, exclude_ids=()):
+        """Занятия преподавателя, группы и студентов (в том числе в других группах) в диапазоне"""
+        participants = Q(pk__in=[])
+        if teacher_id:
+            participants |= Q(teacher_id=teacher_id)
+        if group_id:
+            participants |= Q(group_id=group_id)
+        if student_ids:
+            participants |= Q(student_id__in=student_ids) | Q(group__students__in=student_ids)
+        queryset = Lesson.objects.filter(participants).exclude(pk__in=exclude_ids)
+        rows = ScheduleConflictService.overlapping(queryset, start_time, end_time).order_by(
+            'start_time', 'id'
+        ).values('id', 'title', 'start_time', 'end_time')
+        
+        # Соединение с group__students может повторять занятия
+        lessons = {}
+        for row in rows:
+            lessons.setdefault(row['id'], row)
+        return list(lessons.values())
+    
+    @staticmethod
+    def lock(teacher_id, student_ids=()):
+        """Заблокировать строки участников до конца транзакции - параллельные записи встают в очередь"""
+        user_ids = sorted({teacher_id, *student_ids} - {None})
+        list(User.objects.select_for_update().filter(id__in=user_ids).order_by('id').values_list('id', flat=True))
+    
+    @staticmethod
+    def find_conflicts(slots, teacher_id, group_id=None, student_id=None, exclude_ids=(), lock=False):
+        """Пересечения слотов (start_time, end_time) с занятиями участников
+        
+        Один запрос на весь диапазон слотов, дальше - бинарный поиск по
+        отсортированным началам занятий. Возвращает {индекс слота: занятие}.
+        """
+        if not slots:
+            return {}
+        
+        student_ids = ScheduleConflictService.participant_ids(group_id, student_id)
+        if lock:
+            ScheduleConflictService.lock(teacher_id, student_ids)
+        existing = ScheduleConflictService.busy_lessons(
+            min(start_time for start_time, end_time in slots),
+            max(end_time for start_time, end_time in slots),
+            teacher_id=teacher_id,
+            student_ids=student_ids,
+            group_id=group_id,
+            exclude_ids=exclude_ids
+        )
+        if not existing:
+            return {}
+        
+        starts = [lesson['start_time'] for lesson in existing]
+        longest = max(lesson['end_time'] - lesson['start_time'] for lesson in existing)
+        conflicts = {}
+        for index, (start_time, end_time) in enumerate(slots):
+            low = bisect_left(starts, start_time - longest)
+            high = bisect_left(starts, end_time)
+            for lesson in existing[low:high]:
+                if lesson['end_time'] > start_time:
+                    conflicts[index] = lesson
+                    break
+        return conflicts
+    
+    @staticmethod
+    def check_lesson(start_time, end_time, teacher_id, group_id=None, student_id=None, exclude_ids=()):
+        """Проверить одно занятие перед сохранением (внутри transaction.atomic)"""
+        conflicts = ScheduleConflictService.find_conflicts(
+            [(start_time, end_time)],
+            teacher_id,
+            group_id=group_id,
+            student_id=student_id,
+            exclude_ids=exclude_ids,
+            lock=True
+        )
+        if conflicts:
+            raise ScheduleConflict([
+                {'lesson_id': lesson['id'], 'lesson_title': lesson['title'],
+                 'start_time': lesson['start_time'], 'end_time': lesson['end_time']}
+                for lesson in conflicts.values()
+            ])
+    
+    @staticmethod
+    def free_slots(teacher_id, date_from, date_to, duration, day_start, day_end):
+        """Свободные окна преподавателя не короче duration в рабочие часы каждого дня
+        
+        Занятия за весь диапазон читаются одним запросом.
+        """
+        tz = timezone.get_current_timezone()
+        range_start = timezone.make_aware(datetime.combine(date_from, day_start), tz)
+        range_end = timezone.make_aware(datetime.combine(date_to, day_end), tz)
+        if range_end <= range_start:
+            return []
+        busy = ScheduleConflictService.busy_lessons(range_start, range_end, teacher_id=teacher_id)
+        
+        slots = []
+        index = 0
+        day = date_from
+        while day <= date_to:
+            cursor = timezone.make_aware(datetime.combine(day, day_start), tz)
+            window_end = timezone.make_aware(datetime.combine(day, day_end), tz)
+            # Занятия, закончившиеся до начала окна, больше не понадобятся
+            while index < len(busy) and busy[index]['end_time'] <= cursor:
+                index += 1
+            position = index
+            while cursor < window_end:
+                if position < len(busy) and busy[position]['start_time'] < window_end:
+                    lesson = busy[position]
+                    position += 1
+                    if lesson['start_time'] - cursor >= duration:
+                        slots.append({'start_time': cursor, 'end_time': lesson['start_time']})
+                    cursor = max(cursor, lesson['end_time'])
+                else:
+                    if window_end - cursor >= duration:
+                        slots.append({'start_time': cursor, 'end_time': window_end})
+                    break
+            day += timedelta(days=1)
+        return slots
+
+
+class LessonSeriesService:
+    """Серия занятий по правилу повторения
+    
+    Правило разворачивается в слоты, пересечения проверяются одним
+    запросом ScheduleConflictService, занятия вставляются одним bulk_create. Комнаты LiveSmart, письма,
+    уведомления и CRM обрабатываются одной фоновой задачей на серию
+    (process_lesson_series) вместо post_save на каждое занятие.
+    """
+    
+    @staticmethod
+    def max_lessons():
+        return getattr(settings, 'LESSON_SERIES_MAX_LESSONS', 500)
+    
+    @staticmethod
+    def expand(series):
+        """Слоты (start_time, end_time) серии в текущем часовом поясе"""
+        tz = timezone.get_current_timezone()
+        weekdays = set(series.weekdays)
+        first_week = series.start_date - timedelta(days=series.start_date.weekday())
+        duration = timedelta(minutes=series.duration_minutes)
+        
+        slots = []
+        day = series.start_date
+        while day <= series.end_date:
+            if day.weekday() in weekdays and ((day - first_week).days // 7) % series.interval_weeks == 0:
+                start_time = timezone.make_aware(datetime.combine(day, series.start_time), tz)
+                slots.append((start_time, start_time + duration))
+            day += timedelta(days=1)
+        return slots
+    
+    @staticmethod
+    def create(data, created_by=None, skip_conflicts=False):
+        """Создать серию и ее занятия
+        
+        При пересечениях без skip_conflicts ничего не сохраняется и
+        выбрасывается ScheduleConflict. Возвращает (серия, занятия,
+        пропущенные слоты).
+        """
+        with transaction.atomic():
+            series = LessonSeries.objects.create(created_by=created_by, **data)
+            slots = LessonSeriesService.expand(series)
+            if not slots:
+                raise ValidationError('Правило повторения не дает ни одного занятия')
+            if len(slots) > LessonSeriesService.max_lessons():
+                raise ValidationError(
+                    f'Слишком много занятий в серии: {len(slots)} (максимум {LessonSeriesService.max_lessons()})'
+                )
+            
+            conflicts = ScheduleConflictService.find_conflicts(
+                slots,
+                series.teacher_id,
+                group_id=series.group_id,
+                student_id=series.student_id,
+                lock=True
+            )
+            skipped = [
+                {
+                    'start_time': slots[index][0],
+                    'end_time': slots[index][1],
+                    'lesson_id': lesson['id'],
+                    'lesson_title': lesson['title'],
+                }
+                for index, lesson in sorted(conflicts.items())
+            ]
+            if skipped and not skip_conflicts:
+                raise ScheduleConflict(skipped)
+            
+            # bulk_create не вызывает Lesson.save - длительность задаем сами
+            lessons = Lesson.objects.bulk_create([
+                Lesson(
+                    series=series,
+                    title=series.title,
+                    description=series.description,
+                    lesson_type=series.lesson_type,
+                    group_id=series.group_id,
+                    student_id=series.student_id,
+                    teacher_id=series.teacher_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    duration_minutes=series.duration_minutes
+                )
+                for index, (start_time, end_time) in enumerate(slots)
+                if index not in conflicts
+            ])
+            
+            if series.group_id:
+                student_ids = User.objects.filter(learning_groups=series.group_id).values('id')
+            else:
+                student_ids = [series.student_id]
+            DashboardCounterService.refresh([series.teacher_id], ['taught_lessons'])
+            DashboardCounterService.refresh(student_ids, ['total_lessons'])
+            
+            if lessons:
+                transaction.on_commit(lambda: process_lesson_series.delay(series.id), robust=True)
+        
+        return series, lessons, skipped
+    
+    @staticmethod
+    def process(series_id):
+        """Побочные эффекты серии одной пачкой: комнаты LiveSmart и сигнал lesson_series_created"""
+        from django.apps import apps
+        from .signals import lesson_series_created
+        
+        series = LessonSeries.objects.filter(
+            id=series_id,
+            processed_at__isnull=True
+        ).select_related('teacher', 'group', 'student').first()
+        if series is None:
+            return 0
+        
+        lessons = list(
+            series.lessons.select_related('group__course', 'teacher', 'student').order_by('start_time')
+        )
+        if apps.is_installed('livesmart'):
+            from livesmart.services import LiveSmartService
+            LiveSmartService().create_rooms(lessons)
+        
+        lesson_series_created.send(sender=LessonSeries, series=series, lessons=lessons)
+        
+        series.processed_at = timezone.now()
+        series.save(update_fields=['processed_at'])
+        return len(lessons)
+
+
+class HashingReader:
+    """Чтение потока с подсчетом размера и хеша; больше limit байт не читает"""
+    
+    def __init__(self, stream, algorithm, limit):
+        self.stream = stream
+        self.hash = hashlib.new(algorithm)
+        self.remaining = limit
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        self.hash.update(data)
+        self.bytes_read += len(data)
+        self.remaining -= len(data)
+        return data
+
+
+class PartsReader:
+    """Последовательное чтение частей загрузки из хранилища как одного файла"""
+    
+    def __init__(self, storage, names, algorithm=None):
+        self.storage = storage
+        self.names = list(names)
+        self.current = None
+        self.hash = hashlib.new(algorithm) if algorithm else None
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        chunks = []
+        while size is None or size < 0 or size > 0:
+            if self.current is None:
+                if not self.names:
+                    break
+                self.current = self.storage.open(self.names.pop(0), 'rb')
+            data = self.current.read(size if size is not None and size > 0 else -1)
+            if not data:
+                self.current.close()
+                self.current = None
+                continue
+            chunks.append(data)
+            if size is not None and size > 0:
+                size -= len(data)
+        data = b''.join(chunks)
+        if self.hash is not None:
+            self.hash.update(data)
+        self.bytes_read += len(data)
+        return data
+    
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+class ChunkedUploadService:
+    """Докачиваемая загрузка больших файлов частями (в духе tus)
+    
+    Клиент создает загрузку под конкретный объект (сданное задание, материал,
+    запись), шлет части PUT-запросами с заголовком Upload-Checksum и в любой момент
+    может узнать, какие части уже приняты. Части пишутся в хранилище потоком, не
+    попадая в память воркера целиком. После complete фоновая задача склеивает их
+    потоком в итоговый файл в хранилище поля, проверяет общую контрольную сумму и
+    привязывает файл к объекту вместе с file_size.
+    """
+    
+    TARGETS = {
+        'homework_submission': ('courses.HomeworkSubmission', 'file'),
+        'lesson_material': ('courses.LessonMaterial', 'file'),
+        'lesson_recording': ('courses.LessonRecording', 'file'),
+        'livesmart_recording': ('livesmart.LiveSmartRecording', 'file'),
+    }
+    CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+    PARTS_DIR = 'chunked_uploads'
+    
+    @staticmethod
+    def chunk_size():
+        return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    
+    @staticmethod
+    def max_size():
+        return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 5 * 1024 ** 3)
+    
+    @staticmethod
+    def expire_after():
+        return timedelta(hours=getattr(settings, 'CHUNKED_UPLOAD_EXPIRE_HOURS', 24))
+    
+    @staticmethod
+    def parse_checksum(value):
+        """'sha256 <base64>' -> ('sha256', b'...')"""
+        try:
+            algorithm, encoded = value.strip().split(' ', 1)
+            digest = base64.b64decode(encoded.strip(), validate=True)
+        except (AttributeError, ValueError, binascii.Error):
+            raise ValidationError('Контрольная сумма - "<алгоритм> <base64>", например "sha256 ..."')
+        algorithm = algorithm.lower()
+        if algorithm not in ChunkedUploadService.CHECKSUM_ALGORITHMS:
+            raise ValidationError(
+                f'Поддерживаемые алгоритмы: {", ".join(ChunkedUploadService.CHECKSUM_ALGORITHMS)}'
+            )
+        return algorithm, digest
+    
+    @staticmethod
+    def get_target(target, object_id):
+        from django.apps import apps
+        
+        if target not in ChunkedUploadService.TARGETS:
+            raise ValidationError('Неизвестный тип загрузки')
+        model_label, field_name = ChunkedUploadService.TARGETS[target]
+        if not apps.is_installed(model_label.split('.')[0]):
+            raise ValidationError('Тип загрузки недоступен')
+        instance = apps.get_model(model_label).objects.filter(pk=object_id).first()
+        if instance is None:
+            raise ValidationError('Объект для загрузки не найден')
+        return instance, field_name
+    
+    @staticmethod
+    def can_upload(user, target, instance):
+        if target == 'homework_submission':
+            return instance.student_id == user.id
+        if user.is_admin:
+            return True
+        if target == 'lesson_material':
+            return instance.lesson.teacher_id == user.id
+        if target == 'lesson_recording':
+            return user.id in (instance.uploaded_by_id, instance.lesson.teacher_id)
+        if target == 'livesmart_recording':
+            return user.id in (instance.uploaded_by_id, instance.room.lesson.teacher_id)
+        return False
+    
+    @staticmethod
+    def create(user, target, object_id, filename, total_size, checksum=''):
+        from django.core.exceptions import PermissionDenied
+        
+        if total_size <= 0 or total_size > ChunkedUploadService.max_size():
+            raise ValidationError(f'Размер файла - от 1 байта до {ChunkedUploadService.max_size()} байт')
+        if checksum:
+            ChunkedUploadService.parse_checksum(checksum)
+        filename = os.path.basename((filename or '').replace('\\', '/'))[:255]
+        if not filename:
+            raise ValidationError('Не указано имя файла')
+        
+        instance, _ = ChunkedUploadService.get_target(target, object_id)
+        if not ChunkedUploadService.can_upload(user, target, instance):
+            raise PermissionDenied('Нет прав на загрузку файла для этого объекта')
+        
+        return ChunkedUpload.objects.create(
+            user=user,
+            target=target,
+            object_id=object_id,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=ChunkedUploadService.chunk_size(),
+            checksum=checksum or ''
+        )
+    
+    @staticmethod
+    def receive_part(upload, index, stream, checksum):
+        """Принять часть index из потока; повторная отправка части заменяет прежнюю"""
+        if upload.status != 'uploading':
+            raise ValidationError('Загрузка уже завершена')
+        if not 0 <= index < upload.chunk_count:
+            raise ValidationError(f'Номер части - от 0 до {upload.chunk_count - 1}')
+        if not checksum:
+            raise ValidationError('Не указан заголовок Upload-Checksum')
+        algorithm, digest = ChunkedUploadService.parse_checksum(checksum)
+        
+        expected_size = upload.expected_chunk_size(index)
+        reader = HashingReader(stream, algorithm, expected_size + 1)
+        storage_name = default_storage.save(f'{ChunkedUploadService.PARTS_DIR}/{upload.id}/{index:06d}', reader)
+        if reader.bytes_read != expected_size:
+            default_storage.delete(storage_name)
+            raise ValidationError(f'Размер части {index} должен быть {expected_size} байт')
+        if reader.hash.digest() != digest:
+            default_storage.delete(storage_name)
+            raise ValidationError(f'Контрольная сумма части {index} не совпадает')
+        
+        with transaction.atomic():
+            previous = ChunkedUploadPart.objects.select_for_update().filter(upload=upload, index=index).first()
+            part, _ = ChunkedUploadPart.objects.update_or_create(
+                upload=upload,
+                index=index,
+                defaults={'size': reader.bytes_read, 'checksum': checksum.strip(), 'storage_name': storage_name}
+            )
+            ChunkedUpload.objects.filter(id=upload.id).update(updated_at=timezone.now())
+        if previous is not None and previous.storage_name != storage_name:
+            default_storage.delete(previous.storage_name)
+        return part
+    
+    @staticmethod
+    def describe(upload):
+        """Состояние загрузки: какие части приняты и сколько байт получено"""
+        parts = list(upload.parts.values_list('index', 'size'))
+        received = [index for index, _ in parts]
+        return {
+            'id': str(upload.id),
+            'target': upload.target,
+            'object_id': upload.object_id,
+            'filename': upload.filename,
+            'total_size': upload.total_size,
+            'chunk_size': upload.chunk_size,
+            'chunk_count': upload.chunk_count,
+            'received': received,
+            'missing': sorted(set(range(upload.chunk_count)) - set(received)),
+            'received_bytes': sum(size for _, size in parts),
+            'status': upload.status,
+            'error': upload.error,
+            'file_name': upload.file_name,
+        }
+    
+    @staticmethod
+    def complete(upload):
+        """Все части на месте - сборка в фоне"""
+        from .tasks import assemble_chunked_upload
+        
+        if upload.status != 'uploading':
+            return upload
+        missing = set(range(upload.chunk_count)) - set(upload.parts.values_list('index', flat=True))
+        if missing:
+            raise ValidationError(f'Не загружены части: {", ".join(map(str, sorted(missing)))}')
+        
+        upload.status = 'assembling'
+        upload.save(update_fields=['status', 'updated_at'])
+        upload_id = str(upload.id)
+        transaction.on_commit(lambda: assemble_chunked_upload.delay(upload_id), robust=True)
+        return upload
+    
+    @staticmethod
+    def assemble(upload_id):
+        """Склеить части потоком в хранилище поля, проверить файл и привязать к объекту"""
+        upload = ChunkedUpload.objects.filter(id=upload_id, status='assembling').first()
+        if upload is None:
+            return None
+        
+        try:
+            instance, field_name = ChunkedUploadService.get_target(upload.target, upload.object_id)
+        except ValidationError as e:
+            return ChunkedUploadService.fail(upload, ' '.join(e.messages))
+        
+        field = instance._meta.get_field(field_name)
+        previous_name = getattr(instance, field_name).name
+        target_name = name = None
+        try:
+            algorithm, digest = ChunkedUploadService.parse_checksum(upload.checksum) if upload.checksum else (None, None)
+            reader = PartsReader(
+                default_storage,
+                upload.parts.order_by('index').values_list('storage_name', flat=True),
+                algorithm
+            )
+            # Имя известно заранее: недописанный при ошибке файл тоже удаляется
+            target_name = field.storage.get_available_name(
+                field.generate_filename(instance, upload.filename),
+                max_length=field.max_length
+            )
+            try:
+                name = field.storage.save(target_name, reader, max_length=field.max_length)
+            finally:
+                reader.close()
+            
+            if reader.bytes_read != upload.total_size:
+                error = 'Размер собранного файла не совпадает с заявленным'
+            elif digest is not None and reader.hash.digest() != digest:
+                error = 'Контрольная сумма файла не совпадает'
+            else:
+                error = None
+                setattr(instance, field_name, name)
+                update_fields = [field_name]
+                if any(f.name == 'file_size' for f in instance._meta.concrete_fields):
+                    instance.file_size = reader.bytes_read
+                    update_fields.append('file_size')
+                instance.save(update_fields=update_fields)
+        except Exception as e:
+            logger.error(f"Ошибка сборки загрузки {upload.id}: {str(e)}")
+            error = f'Ошибка сборки файла: {str(e)}'
+        
+        if error is not None:
+            ChunkedUploadService.delete_file(field.storage, name or target_name)
+            return ChunkedUploadService.fail(upload, error)
+        
+        # Прежний файл объекта больше ни на что не ссылается
+        if previous_name and previous_name != name:
+            ChunkedUploadService.delete_file(field.storage, previous_name)
+        ChunkedUploadService.delete_parts(upload)
+        upload.status = 'complete'
+        upload.file_name = name
+        upload.completed_at = timezone.now()
+        upload.save(update_fields=['status', 'file_name', 'completed_at', 'updated_at'])
+        return upload
+    
+    @staticmethod
+    def delete_file(storage, name):
+        if not name:
+            return
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error(f"Ошибка удаления файла {name}: {str(e)}")
+    
+    @staticmethod
+    def fail(upload, error):
+        upload.status = 'failed'
+        upload.error = error
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+        return upload
+    
+    @staticmethod
+    def delete_parts(upload):
+        for storage_name in upload.parts.values_list('storage_name', flat=True):
+            default_storage.delete(storage_name)
+        upload.parts.all().delete()
+    
+    @staticmethod
+    def abort(upload):
+        ChunkedUploadService.delete_parts(upload)
+        upload.delete()
+    
+    @staticmethod
+    def cleanup_expired():
+        """Удалить брошенные, неудачные и зависшие на сборке загрузки вместе с частями"""
+        expired = ChunkedUpload.objects.filter(
+            status__in=['uploading', 'failed', 'assembling'],
+            updated_at__lt=timezone.now() - ChunkedUploadService.expire_after()
+        )
+        count = 0
+        for upload in expired.iterator():
+            ChunkedUploadService.abort(upload)
+            count += 1
+        return count
+
+
+class RecordingMediaService:
+    """Фоновая обработка записей занятий локальным ffmpeg
+    
+    ffprobe дает длительность и размер, ffmpeg - HLS низкого битрейта (для
+    просмотра вместо оригинала) и постер. Производные кладутся рядом с
+    оригиналом в <имя файла>_media/<метка>/, прежние удаляются после успешной
+    обработки. Списки и плеер читают только поля модели и производные.
+    """
+    
+    MODELS = {
+        'lesson_recording': 'courses.LessonRecording',
+        'livesmart_recording': 'livesmart.LiveSmartRecording',
+    }
+    HLS_PLAYLIST = 'index.m3u8'
+    
+    @staticmethod
+    def ffmpeg():
+        return getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+    
+    @staticmethod
+    def ffprobe():
+        return getattr(settings, 'FFPROBE_BINARY', 'ffprobe')
+    
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'RECORDING_MEDIA_TIMEOUT', 60 * 60 * 2)
+    
+    @staticmethod
+    def hls_options():
+        """Одна рендиция ~480p: видео 600 кбит/с, моно-звук 64 кбит/с"""
+        return getattr(settings, 'RECORDING_HLS_OPTIONS', [
+            '-vf', 'scale=-2:480', '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+            '-b:v', '600k', '-maxrate', '700k', '-bufsize', '1200k',
+            '-c:a', 'aac', '-b:a', '64k', '-ac', '1',
+        ])
+    
+    @staticmethod
+    def model(kind):
+        from django.apps import apps
+        return apps.get_model(RecordingMediaService.MODELS[kind])
+    
+    @staticmethod
+    def schedule(kind, instance):
+        """Обработка после коммита, если файл записи новый"""
+        from .tasks import process_recording_media
+        
+        if instance.needs_media_processing:
+            pk = instance.pk
+            transaction.on_commit(lambda: process_recording_media.delay(kind, pk), robust=True)
+    
+    @staticmethod
+    def run(args):
+        return subprocess.run(
+            args,
+            check=True,
+            capture_output=True,
+            timeout=RecordingMediaService.timeout()
+        )
+    
+    @staticmethod
+    def probe(path):
+        """{'duration': секунды или None, 'size': байты, 'has_video': bool}"""
+        result = RecordingMediaService.run([
+            RecordingMediaService.ffprobe(), '-v', 'error',
+            '-show_entries', 'format=duration,size:stream=codec_type',
+            '-of', 'json', path
+        ])
+        info = json.loads(result.stdout or b'{}')
+        media_format = info.get('format', {})
+        duration = media_format.get('duration')
+        return {
+            'duration': float(duration) if duration not in (None, 'N/A') else None,
+            'size': int(media_format.get('size') or os.path.getsize(path)),
+            'has_video': any(stream.get('codec_type') == 'video' for stream in info.get('streams', [])),
+        }
+    
+    @staticmethod
+    def render(path, info, output_dir):
+        """Постер и HLS в output_dir; возвращает список имен файлов"""
+        ffmpeg = RecordingMediaService.ffmpeg()
+        if info['has_video']:
+            offset = min(5.0, (info['duration'] or 0) / 10)
+            RecordingMediaService.run([
+                ffmpeg, '-v', 'error', '-y', '-ss', f'{offset:.2f}', '-i', path,
+                '-frames:v', '1', '-vf', 'scale=640:-2', os.path.join(output_dir, 'poster.jpg')
+            ])
+        options = RecordingMediaService.hls_options() if info['has_video'] else ['-vn', '-c:a', 'aac', '-b:a', '64k', '-ac', '1']
+        RecordingMediaService.run([
+            ffmpeg, '-v', 'error', '-y', '-i', path, *options,
+            '-f', 'hls', '-hls_time', '6', '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(output_dir, 'segment_%05d.ts'),
+            os.path.join(output_dir, RecordingMediaService.HLS_PLAYLIST)
+        ])
+        return sorted(os.listdir(output_dir))
+    
+    @staticmethod
+    @contextmanager
+    def local_path(storage, name):
+        """Путь к оригиналу на диске; из удаленного хранилища файл скачивается во временный"""
+        try:
+            yield storage.path(name)
+            return
+        except NotImplementedError:
+            pass
+        suffix = os.path.splitext(name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as local_file:
+            with storage.open(name, 'rb') as source:
+                for chunk in source.chunks():
+                    local_file.write(chunk)
+            local_file.flush()
+            yield local_file.name
+    
+    @staticmethod
+    def delete_derivatives(storage, names, hls_playlist=''):
+        for name in names:
+            if name:
+                storage.delete(name)
+        if hls_playlist:
+            directory = os.path.dirname(hls_playlist)
+            try:
+                _, files = storage.listdir(directory)
+            except FileNotFoundError:
+                files = []
+            for name in files:
+                storage.delete(f'{directory}/{name}')
+    
+    @staticmethod
+    def process(kind, pk):
+        """Пробить длительность и размер, построить HLS и постер, сохранить их у записи"""
+        from config.protected_media import ProtectedMediaService
+        
+        model = RecordingMediaService.model(kind)
+        with transaction.atomic():
+            instance = model.objects.select_for_update().filter(pk=pk).first()
+            if instance is None or not instance.file or instance.file.name == instance.media_source:
+                return None
+            instance.media_status = 'processing'
+            instance.media_error = ''
+            instance.save(update_fields=['media_status', 'media_error'])
+        
+        storage = instance.file.storage
+        source = instance.file.name
+        base = f'{os.path.splitext(source)[0]}_media/{uuid.uuid4().hex[:8]}'
+        previous_poster, previous_playlist = instance.poster.name, instance.hls_playlist
+        saved = {}
+        try:
+            with RecordingMediaService.local_path(storage, source) as path, \
+                    tempfile.TemporaryDirectory() as output_dir:
+                info = RecordingMediaService.probe(path)
+                for filename in RecordingMediaService.render(path, info, output_dir):
+                    with open(os.path.join(output_dir, filename), 'rb') as derivative:
+                        saved[filename] = storage.save(f'{base}/{filename}', File(derivative))
+            
+            if info['duration'] is not None:
+                instance.duration = timedelta(seconds=round(info['duration']))
+            instance.file_size = info['size']
+            instance.poster = saved.get('poster.jpg', '')
+            instance.hls_playlist = saved.get(RecordingMediaService.HLS_PLAYLIST, '')
+            instance.media_status = 'ready'
+            instance.media_source = source
+            instance.save(update_fields=[
+                'duration', 'file_size', 'poster', 'hls_playlist', 'media_status', 'media_source'
+            ])
+        except Exception as e:
+            # Любая ошибка оставляет запись в failed, а не в processing
+            stderr = getattr(e, 'stderr', None)
+            error = stderr.decode(errors='replace')[-2000:] if stderr else str(e)
+            logger.error(f"Ошибка обработки записи {kind} {pk}: {error}")
+            RecordingMediaService.delete_derivatives(storage, saved.values())
+            model.objects.filter(pk=pk).update(media_status='failed', media_error=error, media_source=source)
+            return 'failed'
+        
+        RecordingMediaService.delete_derivatives(storage, [previous_poster], previous_playlist)
+        ProtectedMediaService.invalidate(kind, pk)
+        return 'ready'
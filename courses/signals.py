@@ -1,10 +1,24 @@
-from django.db.models.signals import post_save, m2m_changed
-from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.db.models import Q
+from django.dispatch import receiver, Signal
 from django.utils import timezone
-from .models import Lesson, Group, Attendance, VideoLesson, MeetingParticipant, HomeworkSubmission, SupportTicket
+from .models import (
+    Lesson, Group, Attendance, VideoLesson, MeetingParticipant, HomeworkSubmission, SupportTicket,
+    Course, Badge, StudentBadge, StudentProgress, TestResult, Achievement, StudentAchievement,
+    LessonMaterial, LessonRecording
+)
+from config.protected_media import ProtectedMediaService
+from config.response_cache import ResponseCache
 from accounts.models import User
+from notifications.tasks import queue_email, queue_mass_email
+
+# Пачка отметок посещаемости записана одним запросом (AttendanceService.mark).
+# Аргументы: lesson, attendances, created_student_ids, notify_comments
+attendance_marked = Signal()
+
+# Занятия серии созданы bulk_create и обработаны фоновой задачей (LessonSeriesService.process).
+# Аргументы: series, lessons
+lesson_series_created = Signal()
 
 @receiver(post_save, sender=Lesson)
 def notify_lesson_created(sender, instance, created, **kwargs):
@@ -25,6 +39,7 @@ def notify_lesson_created(sender, instance, created, **kwargs):
             recipients.append(instance.teacher)
         
         # Отправляем уведомления
+        emails = []
         for recipient in recipients:
             if recipient.email:
                 try:
@@ -42,15 +57,52 @@ def notify_lesson_created(sender, instance, created, **kwargs):
                     С уважением,
                     Онлайн-школа
                     '''
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [recipient.email],
-                        fail_silently=True,
-                    )
+                    emails.append((subject, message, [recipient.email]))
                 except Exception as e:
                     print(f"Ошибка отправки email: {e}")
+        queue_mass_email(emails)
+
+
+def lesson_recipients(lesson_or_series):
+    """Студенты занятия (или серии) и преподаватель"""
+    if lesson_or_series.lesson_type == 'group' and lesson_or_series.group:
+        recipients = list(lesson_or_series.group.students.all())
+    elif lesson_or_series.lesson_type == 'individual' and lesson_or_series.student:
+        recipients = [lesson_or_series.student]
+    else:
+        recipients = []
+    if lesson_or_series.teacher not in recipients:
+        recipients.append(lesson_or_series.teacher)
+    return recipients
+
+@receiver(lesson_series_created)
+def notify_lesson_series_created(sender, series, lessons, **kwargs):
+    """Одно письмо на получателя с расписанием всей серии"""
+    if not lessons:
+        return
+    schedule = '\n'.join(
+        f"                    - {timezone.localtime(lesson.start_time).strftime('%d.%m.%Y %H:%M')}"
+        for lesson in lessons
+    )
+    emails = []
+    for recipient in lesson_recipients(series):
+        if recipient.email:
+            subject = f'Новые занятия: {series.title}'
+            message = f'''
+                    Здравствуйте, {recipient.get_full_name() or recipient.username}!
+                    
+                    Запланирована серия занятий ({len(lessons)}):
+                    Тема: {series.title}
+                    Тип: {series.get_lesson_type_display()}
+                    Преподаватель: {series.teacher.get_full_name()}
+                    Расписание:
+{schedule}
+                    
+                    С уважением,
+                    Онлайн-школа
+                    '''
+            emails.append((subject, message, [recipient.email]))
+    queue_mass_email(emails)
 
 
 @receiver(m2m_changed, sender=Group.students.through)
@@ -60,6 +112,7 @@ def notify_student_added_to_group(sender, instance, action, pk_set, **kwargs):
         group = instance
         students = User.objects.filter(pk__in=pk_set)
         
+        emails = []
         for student in students:
             if student.email:
                 try:
@@ -75,15 +128,10 @@ def notify_student_added_to_group(sender, instance, action, pk_set, **kwargs):
                     Онлайн-школа
                     '''
                     
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [student.email],
-                        fail_silently=True,
-                    )
+                    emails.append((subject, message, [student.email]))
                 except Exception as e:
                     print(f"Ошибка отправки email: {e}")
+        queue_mass_email(emails)
 
 @receiver(post_save, sender=Attendance)
 def notify_attendance_marked(sender, instance, created, **kwargs):
@@ -107,16 +155,31 @@ def notify_attendance_marked(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [student.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
+@receiver(attendance_marked)
+def notify_attendance_marked_bulk(sender, lesson, attendances, **kwargs):
+    """Письма студентам о выставленной посещаемости одной пачкой"""
+    emails = []
+    for attendance in attendances:
+        student = attendance.student
+        if student.email:
+            subject = f'Отметка посещаемости: {lesson.title}'
+            message = f'''
+                Здравствуйте, {student.get_full_name() or student.username}!
+                
+                По вашему занятию "{lesson.title}" выставлена отметка:
+                Статус: {attendance.get_status_display()}
+                Комментарий: {attendance.comment or 'Нет комментария'}
+                
+                С уважением,
+                Онлайн-школа
+                '''
+            emails.append((subject, message, [student.email]))
+    queue_mass_email(emails)
+
 @receiver(post_save, sender=VideoLesson)
 def create_zoom_meeting_for_lesson(sender, instance, created, **kwargs):
     """Создание Zoom встречи при создании видеоурока"""
@@ -139,13 +202,7 @@ def create_zoom_meeting_for_lesson(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [teacher.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [teacher.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -170,13 +227,7 @@ def notify_meeting_participation(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [user.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -200,13 +251,7 @@ def notify_homework_graded(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [student.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -231,12 +276,268 @@ def notify_support_ticket_created(sender, instance, created, **kwargs):
                 Служба поддержки
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [user.email])
             except Exception as e:
-                print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+                print(f"Ошибка отправки email: {e}")
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+@receiver(post_save, sender=StudentBadge)
+@receiver(post_delete, sender=StudentBadge)
+@receiver(post_save, sender=TestResult)
+@receiver(post_delete, sender=TestResult)
+def invalidate_student_card(sender, instance, **kwargs):
+    """Новая версия карточки студента при изменении его прогресса, бейджей и тестов"""
+    from .services import StudentCardService
+    StudentCardService.invalidate_student(instance.student_id)
+
+@receiver(post_save, sender=User)
+def invalidate_student_card_profile(sender, instance, **kwargs):
+    """Новая версия карточки при изменении профиля студента"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    if instance.role == 'student':
+        from .services import StudentCardService
+        StudentCardService.invalidate_student(instance.id)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def invalidate_student_card_catalog(sender, instance, **kwargs):
+    """Названия курсов и бейджей входят во все карточки - меняем общую версию"""
+    from .services import StudentCardService
+    StudentCardService.invalidate_catalog()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def bump_response_cache_version(sender, **kwargs):
+    """Версии кеша ответов каталога курсов, бейджей и достижений"""
+    ResponseCache.bump(sender)
+
+
+# === СЧЕТЧИКИ ДАШБОРДА ===
+
+def lesson_student_ids(group_id, student_id):
+    """Студенты занятия (queryset id)"""
+    if group_id:
+        return User.objects.filter(Q(learning_groups=group_id) | Q(id=student_id)).values('id')
+    return [student_id]
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_participants(sender, instance, update_fields=None, **kwargs):
+    """Прежние преподаватель, группа и студент занятия - после сохранения их уже не прочитать"""
+    instance._dashboard_previous = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not {'teacher', 'group', 'student'} & set(update_fields):
+        return
+    instance._dashboard_previous = Lesson.objects.filter(pk=instance.pk).values(
+        'teacher_id', 'group_id', 'student_id'
+    ).first()
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def update_dashboard_lessons(sender, instance, **kwargs):
+    """Занятия студентов и преподавателя"""
+    from .services import DashboardCounterService
+    if kwargs.get('created'):
+        DashboardCounterService.add(instance.teacher_id, 'taught_lessons', 1)
+    elif 'created' not in kwargs:
+        DashboardCounterService.add(instance.teacher_id, 'taught_lessons', -1)
+    else:
+        previous = getattr(instance, '_dashboard_previous', None)
+        if previous and previous['teacher_id'] != instance.teacher_id:
+            DashboardCounterService.add(previous['teacher_id'], 'taught_lessons', -1)
+            DashboardCounterService.add(instance.teacher_id, 'taught_lessons', 1)
+        if previous and (previous['group_id'], previous['student_id']) != (instance.group_id, instance.student_id):
+            # Занятие ушло у прежних студентов
+            DashboardCounterService.refresh(
+                lesson_student_ids(previous['group_id'], previous['student_id']), ['total_lessons']
+            )
+    DashboardCounterService.refresh(lesson_student_ids(instance.group_id, instance.student_id), ['total_lessons'])
+
+@receiver(pre_delete, sender=Group)
+def remember_group_students(sender, instance, **kwargs):
+    """Студенты удаляемой группы - после удаления связи уже не прочитать"""
+    instance._dashboard_student_ids = list(instance.students.values_list('id', flat=True))
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def update_dashboard_groups(sender, instance, **kwargs):
+    """Группы преподавателя и курсы студентов группы"""
+    from .services import DashboardCounterService
+    DashboardCounterService.refresh([instance.teacher_id], ['total_groups', 'total_students', 'taught_lessons'])
+    if 'created' in kwargs:
+        student_ids = User.objects.filter(learning_groups=instance.id).values('id')
+    else:
+        student_ids = getattr(instance, '_dashboard_student_ids', [])
+    DashboardCounterService.refresh(student_ids, ['total_courses', 'total_lessons'])
+
+@receiver(m2m_changed, sender=Group.students.through)
+def update_dashboard_group_students(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав группы: курсы и занятия студентов, студенты преподавателя"""
+    from .services import DashboardCounterService
+    if action == 'pre_clear':
+        if reverse:
+            instance._dashboard_group_ids = list(instance.learning_groups.values_list('id', flat=True))
+        else:
+            instance._dashboard_student_ids = list(instance.students.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    if reverse:
+        # user.learning_groups.add(...): pk_set - группы
+        group_ids = pk_set if action != 'post_clear' else getattr(instance, '_dashboard_group_ids', [])
+        student_ids = [instance.pk]
+        teacher_ids = Group.objects.filter(id__in=group_ids).values('teacher_id')
+    else:
+        student_ids = pk_set if action != 'post_clear' else getattr(instance, '_dashboard_student_ids', [])
+        teacher_ids = [instance.teacher_id]
+    DashboardCounterService.refresh(list(student_ids), ['total_courses', 'total_lessons'])
+    DashboardCounterService.refresh(teacher_ids, ['total_students'])
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def update_dashboard_attendance(sender, instance, **kwargs):
+    """Посещенные занятия студента"""
+    from .services import DashboardCounterService
+    DashboardCounterService.refresh([instance.student_id], ['completed_lessons'])
+
+@receiver(attendance_marked)
+def update_dashboard_attendance_bulk(sender, attendances, **kwargs):
+    """Посещенные занятия после массовой отметки - один UPDATE на пачку"""
+    from .services import DashboardCounterService
+    DashboardCounterService.refresh(
+        [attendance.student_id for attendance in attendances],
+        ['completed_lessons']
+    )
+
+@receiver(post_save, sender=HomeworkSubmission)
+@receiver(post_delete, sender=HomeworkSubmission)
+def update_dashboard_homework(sender, instance, **kwargs):
+    """Сданные и оцененные задания студента и проверенные задания преподавателя"""
+    from .services import DashboardCounterService
+    DashboardCounterService.refresh([instance.student_id], ['total_homework', 'submitted_homework'])
+    DashboardCounterService.refresh(
+        Lesson.objects.filter(homeworks=instance.homework_id).values('teacher_id'),
+        ['graded_homework']
+    )
+
+@receiver(post_save, sender=StudentBadge)
+@receiver(post_delete, sender=StudentBadge)
+@receiver(post_save, sender=StudentAchievement)
+@receiver(post_delete, sender=StudentAchievement)
+def update_dashboard_awards(sender, instance, **kwargs):
+    """Бейджи и достижения студента: +1 при выдаче, -1 при удалении"""
+    from .services import DashboardCounterService
+    field = 'total_badges' if sender is StudentBadge else 'total_achievements'
+    if kwargs.get('created'):
+        DashboardCounterService.add(instance.student_id, field, 1)
+    elif 'created' not in kwargs:
+        DashboardCounterService.add(instance.student_id, field, -1)
+
+
+# === ПРОГРЕСС СТУДЕНТОВ ===
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def update_progress_attendance(sender, instance, **kwargs):
+    """Пересчет прогресса по курсу группы занятия"""
+    from .services import StudentProgressEngine
+    course_id = Group.objects.filter(lessons=instance.lesson_id).values_list('course_id', flat=True).first()
+    StudentProgressEngine.schedule(course_id, [instance.student_id])
+
+@receiver(attendance_marked)
+def update_progress_attendance_bulk(sender, lesson, attendances, **kwargs):
+    """Пересчет прогресса всех отмеченных студентов одним проходом"""
+    from .services import StudentProgressEngine
+    if lesson.group_id:
+        StudentProgressEngine.schedule(
+            lesson.group.course_id,
+            [attendance.student_id for attendance in attendances]
+        )
+
+@receiver(post_save, sender=HomeworkSubmission)
+@receiver(post_delete, sender=HomeworkSubmission)
+def update_progress_homework(sender, instance, **kwargs):
+    """Пересчет прогресса после сдачи или оценки задания"""
+    from .services import StudentProgressEngine
+    course_id = Group.objects.filter(
+        lessons__homeworks=instance.homework_id
+    ).values_list('course_id', flat=True).first()
+    StudentProgressEngine.schedule(course_id, [instance.student_id])
+
+@receiver(post_save, sender=TestResult)
+@receiver(post_delete, sender=TestResult)
+def update_progress_test_result(sender, instance, **kwargs):
+    """Пересчет прогресса после результата теста"""
+    from .services import StudentProgressEngine
+    StudentProgressEngine.schedule(instance.course_id, [instance.student_id])
+
+
+# === ОБРАБОТКА ЗАПИСЕЙ (HLS, постер, длительность) ===
+
+@receiver(post_save, sender=LessonRecording)
+def process_lesson_recording_media(sender, instance, **kwargs):
+    from .services import RecordingMediaService
+    RecordingMediaService.schedule('lesson_recording', instance)
+
+
+# Обработчик здесь, а не в livesmart: сигналы livesmart не подключаются (см. livesmart/app.py)
+@receiver(post_save, sender='livesmart.LiveSmartRecording')
+def process_livesmart_recording_media(sender, instance, **kwargs):
+    from .services import RecordingMediaService
+    RecordingMediaService.schedule('livesmart_recording', instance)
+
+
+# === ПРАВА НА ЗАЩИЩЕННЫЕ ФАЙЛЫ (кеш ProtectedMediaService) ===
+
+@receiver(post_save, sender=LessonMaterial)
+@receiver(post_delete, sender=LessonMaterial)
+def invalidate_lesson_material_access(sender, instance, **kwargs):
+    ProtectedMediaService.invalidate('lesson_material', instance.pk)
+
+@receiver(post_save, sender=LessonRecording)
+@receiver(post_delete, sender=LessonRecording)
+def invalidate_lesson_recording_access(sender, instance, **kwargs):
+    ProtectedMediaService.invalidate('lesson_recording', instance.pk)
+
+@receiver(post_save, sender='livesmart.LiveSmartRecording')
+@receiver(post_delete, sender='livesmart.LiveSmartRecording')
+def invalidate_livesmart_recording_access(sender, instance, **kwargs):
+    ProtectedMediaService.invalidate('livesmart_recording', instance.pk)
+
+@receiver(post_save, sender=Lesson)
+def invalidate_lesson_files_access(sender, instance, created, **kwargs):
+    """Сменились преподаватель, группа или студент занятия (см. remember_lesson_participants)"""
+    previous = getattr(instance, '_dashboard_previous', None)
+    if previous and previous != {
+        'teacher_id': instance.teacher_id,
+        'group_id': instance.group_id,
+        'student_id': instance.student_id,
+    }:
+        ProtectedMediaService.invalidate_lessons([instance.pk])
+
+@receiver(m2m_changed, sender=Group.students.through)
+def invalidate_group_files_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав группы: права на файлы ее занятий"""
+    if reverse and action == 'pre_clear':
+        instance._protected_media_group_ids = list(instance.learning_groups.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        group_ids = [instance.pk]
+    elif action == 'post_clear':
+        group_ids = getattr(instance, '_protected_media_group_ids', [])
+    else:
+        group_ids = pk_set
+    ProtectedMediaService.invalidate_lessons(Lesson.objects.filter(group_id__in=list(group_ids)).values('id'))
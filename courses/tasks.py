@@ -0,0 +1,50 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def rebuild_dashboard_counters():
+    """Ночной пересчет счетчиков дашборда прогресса"""
+    from .services import DashboardCounterService
+
+    return DashboardCounterService.rebuild()
+
+
+@shared_task(ignore_result=True)
+def recompute_course_progress(course_id):
+    """Пересчет прогресса всех студентов курса"""
+    from .services import StudentProgressEngine
+
+    return StudentProgressEngine.recompute(course_id)
+
+
+@shared_task(ignore_result=True)
+def process_lesson_series(series_id):
+    """Комнаты, письма, уведомления и CRM для новой серии занятий"""
+    from .services import LessonSeriesService
+
+    return LessonSeriesService.process(series_id)
+
+
+@shared_task(ignore_result=True)
+def assemble_chunked_upload(upload_id):
+    """Сборка загруженного частями файла и привязка к объекту"""
+    from .services import ChunkedUploadService
+
+    upload = ChunkedUploadService.assemble(upload_id)
+    return upload.status if upload else None
+
+
+@shared_task(ignore_result=True)
+def cleanup_chunked_uploads():
+    """Удаление брошенных загрузок частями"""
+    from .services import ChunkedUploadService
+
+    return ChunkedUploadService.cleanup_expired()
+
+
+@shared_task(ignore_result=True)
+def process_recording_media(kind, pk):
+    """Длительность, размер, HLS и постер для записи занятия"""
+    from .services import RecordingMediaService
+
+    return RecordingMediaService.process(kind, pk)
@@ -6,6 +6,8 @@ from django.urls import reverse
 from django.utils import timezone
 from django.db.models.signals import post_save, m2m_changed
 import datetime
+import shutil
+import unittest
 from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant
 
 User = get_user_model()
@@ -245,4 +247,1537 @@ class APIBasicTestCase(SignalFreeTestCase, APITestCase):
         
         # В зависимости от настроек, может быть 401 или 200 с пустым списком
         # Это нормально для разных настроек разрешений
-        self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED])
\ No newline at end of file
+        self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED])
+
+
+class ScheduleQueryCountTestCase(SignalFreeTestCase, APITestCase):
+    """Количество запросов расписания не зависит от числа занятий и студентов"""
+    
+    def setUp(self):
+        super().setUp()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+    
+    def create_lessons(self, lessons_count, students_count):
+        from payments.models import Payment
+        
+        group = Group.objects.create(
+            title=f'Группа {lessons_count}',
+            course=self.course,
+            teacher=self.teacher_user,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        for index in range(students_count):
+            student = User.objects.create_user(
+                username=f'student_{lessons_count}_{index}',
+                password='testpass123',
+                role='student'
+            )
+            group.students.add(student)
+            Payment.objects.create(
+                student=student,
+                course=self.course,
+                amount=1000,
+                status='paid' if index % 2 == 0 else 'pending',
+                transaction_id=f'tx_{lessons_count}_{index}'
+            )
+        start_time = timezone.now() + datetime.timedelta(days=1)
+        for index in range(lessons_count):
+            Lesson.objects.create(
+                title=f'Занятие {index}',
+                lesson_type='group',
+                group=group,
+                teacher=self.teacher_user,
+                start_time=start_time + datetime.timedelta(hours=index * 2),
+                end_time=start_time + datetime.timedelta(hours=index * 2 + 1)
+            )
+    
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), response
+    
+    def assert_constant_queries(self, url):
+        self.create_lessons(1, 1)
+        small_count, _ = self.count_queries(url)
+        
+        self.create_lessons(5, 6)
+        large_count, response = self.count_queries(url)
+        
+        self.assertEqual(small_count, large_count)
+        return response
+    
+    def test_schedule_view_query_count(self):
+        """ScheduleView"""
+        response = self.assert_constant_queries(reverse('courses:schedule'))
+        
+        lesson = response.data['results'][-1]
+        self.assertEqual(len(lesson['payment_status']), 6)
+        paid_students = set(
+            User.objects.filter(payments__status='paid').values_list('id', flat=True)
+        )
+        for item in lesson['payment_status']:
+            self.assertEqual(item['has_payment'], item['student_id'] in paid_students)
+    
+    def test_teacher_schedule_view_query_count(self):
+        """TeacherScheduleView"""
+        self.assert_constant_queries(
+            reverse('courses:teacher-schedule', kwargs={'teacher_id': self.teacher_user.id})
+        )
+
+class GroupListQueryCountTestCase(SignalFreeTestCase, APITestCase):
+    """Список групп: число запросов не зависит от числа групп и студентов"""
+    
+    def setUp(self):
+        super().setUp()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    def create_groups(self, count, students_count=3):
+        for index in range(count):
+            group = Group.objects.create(
+                title=f'Группа {count}-{index}',
+                course=self.course,
+                teacher=self.teacher_user,
+                start_date=datetime.date.today(),
+                end_date=datetime.date.today() + datetime.timedelta(days=30)
+            )
+            group.students.add(*[
+                User.objects.create_user(
+                    username=f'student_{count}_{index}_{student_index}',
+                    email=f'student_{count}_{index}_{student_index}@test.com',
+                    password='testpass123',
+                    role='student'
+                )
+                for student_index in range(students_count)
+            ])
+    
+    def get_groups(self, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('courses:group-list'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(context)
+    
+    def test_group_list_query_count(self):
+        """Число запросов одинаково для 2 и 10 групп"""
+        self.create_groups(2)
+        _, small_count = self.get_groups()
+        self.create_groups(8)
+        data, large_count = self.get_groups()
+        
+        self.assertEqual(small_count, large_count)
+        groups = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(len(groups), 10)
+        self.assertEqual(groups[0]['student_count'], 3)
+        self.assertEqual(groups[0]['available_spots'], 7)
+        self.assertEqual(groups[0]['course_title'], 'Курс')
+        self.assertEqual(len(groups[0]['students_list']), 3)
+    
+    def test_compact_mode(self):
+        """?compact=1 не отдает students_list"""
+        self.create_groups(2)
+        data, _ = self.get_groups({'compact': '1'})
+        
+        groups = data['results'] if isinstance(data, dict) else data
+        self.assertNotIn('students_list', groups[0])
+        self.assertEqual(len(groups[0]['students']), 3)
+        self.assertEqual(groups[0]['student_count'], 3)
+
+class AttendanceBulkTestCase(SignalFreeTestCase, APITestCase):
+    """Массовая отметка посещаемости"""
+    
+    def setUp(self):
+        super().setUp()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    def create_lesson(self, students_count):
+        group = Group.objects.create(
+            title=f'Группа {students_count}',
+            course=self.course,
+            teacher=self.teacher_user,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        students = [
+            User.objects.create_user(
+                username=f'student_{students_count}_{index}',
+                email=f'student_{students_count}_{index}@test.com',
+                password='testpass123',
+                role='student'
+            )
+            for index in range(students_count)
+        ]
+        group.students.add(*students)
+        start_time = timezone.now() + datetime.timedelta(days=1)
+        lesson = Lesson.objects.create(
+            title=f'Занятие {students_count}',
+            lesson_type='group',
+            group=group,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        return lesson, students
+    
+    def mark(self, lesson, students, status_value='present', comment='Молодец'):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('courses:mark-attendance-with-comment'), {
+                'lesson_id': lesson.id,
+                'attendance': [
+                    {'student_id': student.id, 'status': status_value, 'comment': comment}
+                    for student in students
+                ]
+            }, format='json')
+        return response, len(context)
+    
+    def test_query_count_does_not_grow(self):
+        """Число запросов не зависит от размера группы"""
+        small_lesson, small_students = self.create_lesson(2)
+        large_lesson, large_students = self.create_lesson(15)
+        
+        response, small_count = self.mark(small_lesson, small_students)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response, large_count = self.mark(large_lesson, large_students)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data['attendances']), 15)
+    
+    def test_upsert_and_side_effects(self):
+        """Повторная отметка обновляет записи, активность CRM пишется только для новых"""
+        from crm.models import StudentActivity
+        from notifications.models import Notification
+        
+        lesson, students = self.create_lesson(3)
+        response, _ = self.mark(lesson, students)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StudentActivity.objects.filter(activity_type='lesson_attended').count(), 3)
+        self.assertEqual(Notification.objects.filter(title__startswith='Комментарий к занятию').count(), 3)
+        
+        response, _ = self.mark(lesson, students, status_value='late', comment='')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Attendance.objects.filter(lesson=lesson).count(), 3)
+        self.assertEqual(Attendance.objects.filter(lesson=lesson, status='late', comment='').count(), 3)
+        self.assertEqual(StudentActivity.objects.count(), 3)
+        self.assertEqual(Notification.objects.filter(title__startswith='Комментарий к занятию').count(), 3)
+    
+    def test_foreign_student_rejected(self):
+        """Студент не из группы отклоняется, ничего не записывается"""
+        lesson, students = self.create_lesson(2)
+        other_lesson, other_students = self.create_lesson(1)
+        
+        response, _ = self.mark(lesson, students + other_students)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(other_students[0].id), response.data['error'])
+        self.assertFalse(Attendance.objects.exists())
+    
+    def test_list_keyset_pagination(self):
+        """Список посещений листается курсором без COUNT, ?page= возвращает прежний ответ"""
+        lesson, students = self.create_lesson(5)
+        self.mark(lesson, students)
+        Attendance.objects.update(created_at=timezone.now())
+        
+        seen = []
+        url = reverse('courses:attendance-list') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen += [attendance['id'] for attendance in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Attendance.objects.values_list('id', flat=True), reverse=True))
+        
+        response = self.client.get(reverse('courses:attendance-list'), {'page': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+
+class StudentCardTestCase(SignalFreeTestCase, APITestCase):
+    """Карточка студента: постоянное число запросов и версионированный кеш"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    def create_student(self, name, items_count):
+        student = User.objects.create_user(
+            username=name,
+            email=f'{name}@test.com',
+            password='testpass123',
+            role='student'
+        )
+        StudentProgress.objects.create(student=student, course=self.course, overall_progress=50)
+        for index in range(items_count):
+            badge = Badge.objects.create(
+                name=f'Бейдж {name} {index}',
+                description='Описание',
+                badge_type='participation'
+            )
+            StudentBadge.objects.create(student=student, badge=badge, awarded_by=self.teacher_user)
+            TestResult.objects.create(
+                student=student,
+                course=self.course,
+                test_name=f'Тест {index}',
+                score=80
+            )
+        return student
+    
+    def get_card(self, student, fresh=True):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('courses:student-detailed-info', kwargs={'student_id': student.id})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'fresh': '1'} if fresh else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(context)
+    
+    def test_query_count_is_constant(self):
+        """Число запросов не зависит от количества бейджей и результатов"""
+        small, small_count = self.get_card(self.create_student('small', 1))
+        large, large_count = self.get_card(self.create_student('large', 12))
+        
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(large.data['badges']), 12)
+        self.assertEqual(len(large.data['test_results']), 12)
+        self.assertEqual(large.data['progress'][0]['course']['title'], 'Курс')
+        self.assertEqual(large.data['badges'][0]['awarded_by'], self.teacher_user.get_full_name())
+    
+    def test_cached_card_invalidated_by_writes(self):
+        """Кешированная карточка обновляется после записи бейджа"""
+        from .signals import invalidate_student_card
+        post_save.connect(invalidate_student_card, sender=StudentBadge)
+        
+        student = self.create_student('cached', 2)
+        first, _ = self.get_card(student, fresh=False)
+        cached, cached_count = self.get_card(student, fresh=False)
+        self.assertEqual(cached.data, first.data)
+        # Только пользователь: карточка из кеша
+        self.assertEqual(cached_count, 1)
+        
+        badge = Badge.objects.create(
+            name='Новый бейдж',
+            description='Описание',
+            badge_type='participation'
+        )
+        StudentBadge.objects.create(student=student, badge=badge, awarded_by=self.teacher_user)
+        
+        updated, _ = self.get_card(student, fresh=False)
+        self.assertEqual(len(updated.data['badges']), 3)
+
+class DashboardCountersTestCase(SignalFreeTestCase, APITestCase):
+    """Дашборд прогресса из счетчиков DashboardCounters"""
+    
+    def setUp(self):
+        super().setUp()
+        from . import signals
+        # Обработчики счетчиков нужны в этих тестах, остальные сигналы остаются отключены
+        post_save.connect(signals.update_dashboard_lessons, sender=Lesson)
+        post_save.connect(signals.update_dashboard_attendance, sender=Attendance)
+        post_save.connect(signals.update_dashboard_awards, sender=StudentBadge)
+        m2m_changed.connect(signals.update_dashboard_group_students, sender=Group.students.through)
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.student_user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.groups = [
+            Group.objects.create(
+                title=f'Группа {index}',
+                course=self.course,
+                teacher=self.teacher_user,
+                start_date=datetime.date.today(),
+                end_date=datetime.date.today() + datetime.timedelta(days=30)
+            )
+            for index in range(2)
+        ]
+        for group in self.groups:
+            group.students.add(self.student_user)
+        self.lesson = self.create_lesson(self.groups[0])
+    
+    def create_lesson(self, group):
+        start_time = timezone.now() + datetime.timedelta(days=1)
+        return Lesson.objects.create(
+            title='Занятие',
+            lesson_type='group',
+            group=group,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+    
+    def get_dashboard(self, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('courses:student-progress-dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(context)
+    
+    def test_single_row_read(self):
+        """После первого расчета дашборд читается одним запросом"""
+        self.get_dashboard(self.student_user)
+        data, queries = self.get_dashboard(self.student_user)
+        
+        self.assertEqual(queries, 1)
+        self.assertEqual(data['total_courses'], 1)
+        self.assertEqual(data['total_lessons'], 1)
+    
+    def test_teacher_counts_distinct_students(self):
+        """Студент в двух группах преподавателя считается один раз"""
+        data, _ = self.get_dashboard(self.teacher_user)
+        
+        self.assertEqual(data['total_groups'], 2)
+        self.assertEqual(data['total_students'], 1)
+        self.assertEqual(data['total_lessons'], 1)
+    
+    def test_incremental_updates_match_rebuild(self):
+        """Сигналы обновляют счетчики так же, как полный пересчет"""
+        from .models import DashboardCounters
+        from .services import DashboardCounterService
+        
+        self.get_dashboard(self.student_user)
+        self.get_dashboard(self.teacher_user)
+        
+        other_student = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.groups[1].students.add(other_student)
+        self.create_lesson(self.groups[1])
+        # Студент, указанный в занятии чужой группы, тоже видит это занятие
+        extra_lesson = self.create_lesson(self.groups[0])
+        extra_lesson.student = other_student
+        extra_lesson.save()
+        Attendance.objects.create(lesson=self.lesson, student=self.student_user, status='present')
+        badge = Badge.objects.create(name='Бейдж', description='Описание', badge_type='participation')
+        StudentBadge.objects.create(student=self.student_user, badge=badge, awarded_by=self.teacher_user)
+        
+        student_data, _ = self.get_dashboard(self.student_user)
+        self.assertEqual(student_data['total_lessons'], 3)
+        self.assertEqual(student_data['completed_lessons'], 1)
+        self.assertEqual(student_data['total_badges'], 1)
+        teacher_data, _ = self.get_dashboard(self.teacher_user)
+        self.assertEqual(teacher_data['total_students'], 2)
+        self.assertEqual(teacher_data['total_lessons'], 3)
+        other_data, _ = self.get_dashboard(other_student)
+        self.assertEqual(other_data['total_lessons'], 2)
+        
+        fields = DashboardCounterService.FIELDS
+        incremental = list(DashboardCounters.objects.order_by('user_id').values('user_id', *fields))
+        DashboardCounterService.rebuild([row['user_id'] for row in incremental])
+        rebuilt = list(DashboardCounters.objects.order_by('user_id').values('user_id', *fields))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_lesson_reassignment_updates_previous_participants(self):
+        """Перенос занятия в другую группу к другому преподавателю обновляет и прежних участников"""
+        from .models import DashboardCounters
+        from .services import DashboardCounterService
+        
+        other_teacher = User.objects.create_user(
+            username='other_teacher',
+            email='other_teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        other_student = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.groups[1].students.set([other_student])
+        for user in (self.teacher_user, other_teacher, self.student_user, other_student):
+            self.get_dashboard(user)
+        
+        self.lesson.group = self.groups[1]
+        self.lesson.teacher = other_teacher
+        self.lesson.save()
+        
+        fields = DashboardCounterService.FIELDS
+        incremental = list(DashboardCounters.objects.order_by('user_id').values('user_id', *fields))
+        DashboardCounterService.rebuild([row['user_id'] for row in incremental])
+        rebuilt = list(DashboardCounters.objects.order_by('user_id').values('user_id', *fields))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(DashboardCounters.objects.get(user=self.teacher_user).taught_lessons, 0)
+        self.assertEqual(DashboardCounters.objects.get(user=other_teacher).taught_lessons, 1)
+        self.assertEqual(DashboardCounters.objects.get(user=self.student_user).total_lessons, 0)
+        self.assertEqual(DashboardCounters.objects.get(user=other_student).total_lessons, 1)
+
+class StudentProgressEngineTestCase(SignalFreeTestCase, APITestCase):
+    """Расчет прогресса по посещаемости, заданиям и тестам"""
+    
+    def setUp(self):
+        super().setUp()
+        from . import signals
+        post_save.connect(signals.update_progress_attendance, sender=Attendance)
+        post_save.connect(signals.update_progress_test_result, sender=TestResult)
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.student_user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.group = Group.objects.create(
+            title='Группа',
+            course=self.course,
+            teacher=self.teacher_user,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        self.group.students.add(self.student_user)
+        self.lessons = []
+        for index in range(2):
+            start_time = timezone.now() + datetime.timedelta(days=index)
+            self.lessons.append(Lesson.objects.create(
+                title=f'Тема {index}',
+                lesson_type='group',
+                group=self.group,
+                teacher=self.teacher_user,
+                start_time=start_time,
+                end_time=start_time + datetime.timedelta(hours=1)
+            ))
+    
+    def test_score_uses_available_components(self):
+        """Компоненты без данных не снижают прогресс"""
+        from .services import StudentProgressEngine
+        
+        self.assertEqual(StudentProgressEngine.score({'attendance': None, 'homework': None, 'tests': None}), 0)
+        self.assertEqual(StudentProgressEngine.score({'attendance': 0.5, 'homework': None, 'tests': None}), 50)
+        self.assertEqual(StudentProgressEngine.score({'attendance': 1.0, 'homework': None, 'tests': 0.5}), 79)
+    
+    def test_incremental_update_on_writes(self):
+        """Посещение и тест пересчитывают прогресс после фиксации"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.create(lesson=self.lessons[0], student=self.student_user, status='present')
+            Attendance.objects.create(lesson=self.lessons[1], student=self.student_user, status='absent')
+        progress = StudentProgress.objects.get(student=self.student_user, course=self.course)
+        self.assertEqual(progress.overall_progress, 50)
+        self.assertEqual(progress.completed_topics, ['Тема 0'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            TestResult.objects.create(
+                student=self.student_user,
+                course=self.course,
+                test_name='Итоговый',
+                score=80
+            )
+        progress.refresh_from_db()
+        # 0.4 * 0.5 + 0.3 * 0.8 = 0.44 из 0.7
+        self.assertEqual(progress.overall_progress, 63)
+        self.assertEqual(progress.test_results, {'Итоговый': {'score': 80, 'max_score': 100}})
+    
+    def test_course_recompute_and_list(self):
+        """Пересчет курса создает прогресс, список читается одним запросом"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import StudentProgressEngine
+        
+        other_student = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.group.students.add(other_student)
+        Attendance.objects.create(lesson=self.lessons[0], student=other_student, status='present')
+        
+        self.assertEqual(StudentProgressEngine.recompute(self.course.id), 2)
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('courses:course-progress-list', kwargs={'course_id': self.course.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['student'] for row in results], [other_student.id, self.student_user.id])
+        self.assertEqual(results[0]['overall_progress'], 100)
+        self.assertLessEqual(len(context), 2)
+
+    def test_recompute_keeps_last_activity(self):
+        """Пересчет не трогает последнюю активность; опоздание - посещение для прогресса, но не для дашборда"""
+        from .models import DashboardCounters
+        from .services import DashboardCounterService, StudentProgressEngine
+        
+        progress = StudentProgress.objects.create(student=self.student_user, course=self.course)
+        last_activity = timezone.now() - datetime.timedelta(days=3)
+        StudentProgress.objects.filter(id=progress.id).update(last_activity=last_activity)
+        Attendance.objects.create(lesson=self.lessons[0], student=self.student_user, status='late')
+        
+        StudentProgressEngine.recompute(self.course.id)
+        
+        progress.refresh_from_db()
+        self.assertEqual(progress.last_activity, last_activity)
+        self.assertEqual(progress.completed_topics, ['Тема 0'])
+        DashboardCounterService.rebuild([self.student_user.id])
+        self.assertEqual(DashboardCounters.objects.get(user=self.student_user).completed_lessons, 0)
+
+class LessonSeriesTestCase(SignalFreeTestCase, APITestCase):
+    """Серия занятий: bulk_create, проверка пересечений и одна фоновая обработка"""
+    
+    def setUp(self):
+        super().setUp()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.group = Group.objects.create(
+            title='Группа',
+            course=self.course,
+            teacher=self.teacher_user,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=90)
+        )
+        self.group.students.add(*[
+            User.objects.create_user(
+                username=f'student_{index}',
+                email=f'student_{index}@test.com',
+                password='testpass123',
+                role='student'
+            )
+            for index in range(3)
+        ])
+        # Ближайший понедельник
+        today = datetime.date.today()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    def create_series(self, weeks, **extra):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        data = {
+            'title': 'Разговорный клуб',
+            'lesson_type': 'group',
+            'group': self.group.id,
+            'weekdays': [0, 2],
+            'start_date': self.monday.isoformat(),
+            'end_date': (self.monday + datetime.timedelta(weeks=weeks, days=-1)).isoformat(),
+            'start_time': '18:00',
+            'duration_minutes': 90,
+        }
+        data.update(extra)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('courses:lesson-series-list'), data, format='json')
+        return response, len(context)
+    
+    def test_query_count_does_not_depend_on_length(self):
+        """Серия на 2 и на 12 недель создается одинаковым числом запросов"""
+        response, short_count = self.create_series(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lessons_created'], 4)
+        
+        response, long_count = self.create_series(12, start_time='10:00')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lessons_created'], 24)
+        self.assertEqual(short_count, long_count)
+        
+        lesson = Lesson.objects.filter(series_id=response.data['series']['id']).first()
+        self.assertEqual(lesson.duration_minutes, 90)
+        self.assertEqual(timezone.localtime(lesson.start_time).weekday(), 0)
+    
+    def test_conflicts(self):
+        """Пересечения отклоняют серию или пропускаются по skip_conflicts"""
+        start_time = timezone.make_aware(
+            datetime.datetime.combine(self.monday + datetime.timedelta(days=2), datetime.time(18, 30))
+        )
+        existing = Lesson.objects.create(
+            title='Существующее',
+            lesson_type='group',
+            group=self.group,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        
+        response, _ = self.create_series(2)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['conflicts'][0]['lesson_id'], existing.id)
+        self.assertEqual(Lesson.objects.count(), 1)
+        
+        response, _ = self.create_series(2, skip_conflicts=True)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lessons_created'], 3)
+        self.assertEqual(len(response.data['skipped']), 1)
+    
+    def test_side_effects_batched_per_series(self):
+        """Комнаты, уведомления и CRM создаются одной задачей на серию"""
+        from django.core import mail
+        from crm.models import StudentActivity
+        from livesmart.models import LiveSmartParticipant, LiveSmartRoom
+        from notifications.models import Notification
+        from .models import LessonSeries
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _ = self.create_series(4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        series = LessonSeries.objects.get(id=response.data['series']['id'])
+        self.assertIsNotNone(series.processed_at)
+        self.assertEqual(LiveSmartRoom.objects.filter(lesson__series=series).count(), 8)
+        self.assertEqual(LiveSmartParticipant.objects.filter(room__lesson__series=series).count(), 8 * 4)
+        # Одно уведомление и одно письмо на получателя (3 студента и преподаватель)
+        self.assertEqual(Notification.objects.filter(title='Новые занятия').count(), 4)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(StudentActivity.objects.filter(activity_type='lesson_scheduled').count(), 8)
+
+class ScheduleConflictTestCase(SignalFreeTestCase, APITestCase):
+    """Пересечения занятий преподавателя и студентов, свободные окна"""
+    
+    def setUp(self):
+        super().setUp()
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.other_teacher = User.objects.create_user(
+            username='other_teacher',
+            email='other_teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.student_user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.group = Group.objects.create(
+            title='Группа',
+            course=course,
+            teacher=self.other_teacher,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        self.group.students.add(self.student_user)
+        self.day = datetime.date.today() + datetime.timedelta(days=3)
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(hour, minute)))
+    
+    def book(self, start_hour, end_hour, teacher=None, student=None):
+        return self.client.post(reverse('courses:lesson-list'), {
+            'title': 'Индивидуальное',
+            'lesson_type': 'individual',
+            'student': (student or self.student_user).id,
+            'teacher': (teacher or self.teacher_user).id,
+            'start_time': self.at(start_hour).isoformat(),
+            'end_time': self.at(end_hour).isoformat(),
+        }, format='json')
+    
+    def test_individual_booking_conflicts(self):
+        """Студент занят в группе, преподаватель - своим занятием"""
+        group_lesson = Lesson.objects.create(
+            title='Групповое',
+            lesson_type='group',
+            group=self.group,
+            teacher=self.other_teacher,
+            start_time=self.at(10),
+            end_time=self.at(11)
+        )
+        
+        response = self.book(10, 12)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['conflicts'][0]['lesson_id'], group_lesson.id)
+        
+        response = self.book(11, 12)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        other_student = User.objects.create_user(
+            username='other_student',
+            email='other_student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        response = self.book(11, 12, student=other_student)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    
+    def test_free_slots(self):
+        """Свободные окна вокруг занятий, одним запросом к занятиям"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        for start_hour, end_hour in [(10, 11), (13, 15)]:
+            Lesson.objects.create(
+                title='Занятие',
+                lesson_type='individual',
+                student=self.student_user,
+                teacher=self.teacher_user,
+                start_time=self.at(start_hour),
+                end_time=self.at(end_hour)
+            )
+        
+        url = reverse('courses:teacher-free-slots', kwargs={'teacher_id': self.teacher_user.id})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {
+                'date_from': self.day.isoformat(),
+                'date_to': self.day.isoformat(),
+                'duration': 90,
+                'day_start': '09:00',
+                'day_end': '18:00',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['start_time'], slot['end_time']) for slot in response.data['slots']],
+            [(self.at(11), self.at(13)), (self.at(15), self.at(18))]
+        )
+        # Преподаватель и занятия
+        self.assertEqual(len(context), 2)
+
+
+class FullTextSearchTestCase(SignalFreeTestCase, APITestCase):
+    """Поиск по курсам и подсказки (на SQLite - запасной вариант через icontains)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        for title in ['Английская грамматика', 'Разговорный английский', 'Немецкий для начинающих']:
+            Course.objects.create(
+                title=title,
+                description='Описание',
+                price=1000,
+                duration_hours=20,
+                level='beginner'
+            )
+        self.client.force_authenticate(user=self.user)
+    
+    def test_prefix_tsquery(self):
+        """Каждое слово - префикс, операторы tsquery из запроса отбрасываются"""
+        from .search import prefix_tsquery, search_query
+        
+        self.assertEqual(prefix_tsquery('Англ. грам & | !'), 'англ:* & грам:*')
+        self.assertEqual(prefix_tsquery(' !& '), '')
+        self.assertIsNone(search_query(''))
+    
+    def test_course_search(self):
+        response = self.client.get(reverse('courses:course-list'), {'search': 'грамматика'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course['title'] for course in response.data['results']], ['Английская грамматика'])
+        self.assertNotIn('search_vector', response.data['results'][0])
+    
+    def test_suggest(self):
+        response = self.client.get(reverse('courses:search-suggest'), {'q': 'нгл'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(course['title'] for course in response.data['courses']),
+            ['Английская грамматика', 'Разговорный английский']
+        )
+        self.assertEqual(response.data['lessons'], [])
+        self.assertEqual(response.data['materials'], [])
+
+
+class ResponseCacheTestCase(SignalFreeTestCase, APITestCase):
+    """Условный GET и кеш ответов справочников по версиям моделей"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        from .signals import bump_response_cache_version
+        post_save.connect(bump_response_cache_version, sender=Badge)
+        self.user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.create_badge('Первый')
+        self.client.force_authenticate(user=self.user)
+    
+    def create_badge(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Badge.objects.create(name=name, description='Описание', badge_type='participation')
+    
+    def get_badges(self, **headers):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('courses:badge-list'), **headers)
+        return response, len(context)
+    
+    def test_not_modified_and_cached(self):
+        first, _ = self.get_badges()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+        
+        not_modified, queries = self.get_badges(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        
+        not_modified, _ = self.get_badges(HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        cached, queries = self.get_badges()
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertEqual(queries, 0)
+    
+    def test_write_changes_etag(self):
+        first, _ = self.get_badges()
+        self.create_badge('Второй')
+        
+        response, _ = self.get_badges(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.data['count'], 2)
+
+
+class ChunkedUploadTestCase(SignalFreeTestCase, APITestCase):
+    """Загрузка записи урока частями с докачкой и сборкой в FileSystemStorage"""
+    
+    def setUp(self):
+        super().setUp()
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CHUNKED_UPLOAD_CHUNK_SIZE=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        start_time = timezone.now() - datetime.timedelta(hours=2)
+        lesson = Lesson.objects.create(
+            title='Занятие',
+            lesson_type='individual',
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        self.recording = LessonRecording.objects.create(
+            lesson=lesson,
+            title='Запись',
+            duration=datetime.timedelta(hours=1),
+            uploaded_by=self.teacher_user
+        )
+        self.content = b'0123456789'
+        self.client.force_authenticate(user=self.teacher_user)
+    
+    @staticmethod
+    def checksum(data):
+        import base64
+        import hashlib
+        return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+    
+    def start(self):
+        response = self.client.post(reverse('courses:chunked-upload-create'), {
+            'target': 'lesson_recording',
+            'object_id': self.recording.id,
+            'filename': '../lesson.mp4',
+            'total_size': len(self.content),
+            'checksum': self.checksum(self.content),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['chunk_count'], 3)
+        return response.data['id']
+    
+    def put_chunk(self, upload_id, index, data, checksum=None):
+        return self.client.generic(
+            'PUT',
+            reverse('courses:chunked-upload-chunk', kwargs={'upload_id': upload_id, 'index': index}),
+            data,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_CHECKSUM=checksum or self.checksum(data)
+        )
+    
+    def test_resume_and_assemble(self):
+        from .models import ChunkedUpload
+        
+        upload_id = self.start()
+        chunks = [self.content[i:i + 4] for i in range(0, len(self.content), 4)]
+        self.assertEqual(self.put_chunk(upload_id, 2, chunks[2]).status_code, status.HTTP_200_OK)
+        
+        # Битая часть отклоняется, после обрыва клиент узнает, чего не хватает
+        response = self.put_chunk(upload_id, 0, chunks[0], checksum=self.checksum(b'other'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('courses:chunked-upload-detail', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.data['missing'], [0, 1])
+        
+        response = self.client.post(reverse('courses:chunked-upload-complete', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        for index in (0, 1):
+            self.assertEqual(self.put_chunk(upload_id, index, chunks[index]).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('courses:chunked-upload-complete', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.status, 'complete')
+        self.assertFalse(upload.parts.exists())
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.file_size, len(self.content))
+        self.assertTrue(self.recording.file.name.startswith('lesson_recordings/lesson'))
+        with self.recording.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+    
+    def upload_all(self):
+        upload_id = self.start()
+        for index in range(3):
+            chunk = self.content[index * 4:index * 4 + 4]
+            self.assertEqual(self.put_chunk(upload_id, index, chunk).status_code, status.HTTP_200_OK)
+        return upload_id
+    
+    def test_assemble_failure_and_file_replacement(self):
+        """Ошибка сборки не оставляет файлов, новый файл заменяет прежний в хранилище"""
+        import os
+        from unittest import mock
+        from django.conf import settings
+        from django.core.files.storage import default_storage
+        from .models import ChunkedUpload
+        from .services import ChunkedUploadService
+        
+        upload_id = self.upload_all()
+        ChunkedUpload.objects.filter(id=upload_id).update(status='assembling')
+        with mock.patch.object(LessonRecording, 'save', side_effect=RuntimeError('БД недоступна')):
+            upload = ChunkedUploadService.assemble(upload_id)
+        self.assertEqual(upload.status, 'failed')
+        self.assertIn('БД недоступна', upload.error)
+        self.assertFalse(os.listdir(os.path.join(settings.MEDIA_ROOT, 'lesson_recordings')))
+        
+        for _ in range(2):
+            upload_id = self.upload_all()
+            ChunkedUpload.objects.filter(id=upload_id).update(status='assembling')
+            self.assertEqual(ChunkedUploadService.assemble(upload_id).status, 'complete')
+        self.recording.refresh_from_db()
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'lesson_recordings')), [
+            os.path.basename(self.recording.file.name)
+        ])
+        
+        # Зависшая сборка удаляется вместе с частями
+        upload_id = self.upload_all()
+        ChunkedUpload.objects.filter(id=upload_id).update(
+            status='assembling',
+            updated_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        parts = list(ChunkedUpload.objects.get(id=upload_id).parts.values_list('storage_name', flat=True))
+        ChunkedUploadService.cleanup_expired()
+        self.assertFalse(ChunkedUpload.objects.filter(id=upload_id).exists())
+        self.assertFalse(any(default_storage.exists(name) for name in parts))
+    
+    def test_wrong_chunk_size_and_foreign_object(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, b'01234').status_code, status.HTTP_400_BAD_REQUEST)
+        
+        other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('courses:chunked-upload-detail', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('courses:chunked-upload-create'), {
+            'target': 'lesson_recording',
+            'object_id': self.recording.id,
+            'filename': 'lesson.mp4',
+            'total_size': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProtectedMediaTestCase(SignalFreeTestCase, APITestCase):
+    """Выдача материалов урока через X-Accel-Redirect и подписанные ссылки"""
+    
+    def setUp(self):
+        super().setUp()
+        import shutil
+        import tempfile
+        from django.core.cache import cache
+        from django.core.files.base import ContentFile
+        from django.test import override_settings
+        from .models import LessonMaterial
+        
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, PROTECTED_MEDIA_X_ACCEL=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.student_user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.outsider = User.objects.create_user(
+            username='outsider',
+            email='outsider@test.com',
+            password='testpass123',
+            role='student'
+        )
+        start_time = timezone.now() + datetime.timedelta(days=1)
+        lesson = Lesson.objects.create(
+            title='Занятие',
+            lesson_type='individual',
+            student=self.student_user,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        self.material = LessonMaterial(lesson=lesson, title='Конспект', material_type='pdf')
+        self.material.file.save('notes.pdf', ContentFile(b'%PDF-1.4'), save=False)
+        self.material.save()
+        self.url = reverse('protected-media', kwargs={'kind': 'lesson_material', 'pk': self.material.id})
+    
+    def test_access_checked_and_offloaded_to_nginx(self):
+        self.client.force_authenticate(user=self.student_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.material.file.name)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+        
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        
+        response = self.client.get(reverse('courses:lesson-materials'), {'lesson_id': self.material.lesson_id})
+        self.assertTrue(response.data['results'][0]['file'].endswith(self.url))
+    
+    def test_signed_url_skips_database(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(reverse('protected-media-url', kwargs={'kind': 'lesson_material', 'pk': self.material.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        signed_url = response.data['url']
+        
+        self.client.force_authenticate(user=None)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(signed_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('X-Accel-Redirect', response)
+        self.assertEqual(len(context), 0)
+        
+        self.assertEqual(self.client.get(signed_url.rstrip('/') + 'x/').status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_cached_access_invalidated_by_writes(self):
+        """Снятие публикации и изменение состава группы действуют сразу, без ожидания кеша"""
+        from django.core.files.base import ContentFile
+        from . import signals
+        post_save.connect(signals.invalidate_lesson_recording_access, sender=LessonRecording)
+        m2m_changed.connect(signals.invalidate_group_files_access, sender=Group.students.through)
+        
+        recording = LessonRecording(lesson=self.material.lesson, title='Запись', uploaded_by=self.teacher_user)
+        recording.file.save('lesson.mp4', ContentFile(b'video'), save=False)
+        recording.save()
+        url = reverse('protected-media', kwargs={'kind': 'lesson_recording', 'pk': recording.id})
+        
+        self.client.force_authenticate(user=self.student_user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        recording.is_public = False
+        recording.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        
+        course = Course.objects.create(
+            title='Курс',
+            description='Описание',
+            price=1000,
+            duration_hours=20,
+            level='beginner'
+        )
+        group = Group.objects.create(
+            title='Группа',
+            course=course,
+            teacher=self.teacher_user,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        start_time = timezone.now() + datetime.timedelta(days=2)
+        lesson = Lesson.objects.create(
+            title='Групповое занятие',
+            lesson_type='group',
+            group=group,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        group_recording = LessonRecording(lesson=lesson, title='Запись группы', uploaded_by=self.teacher_user)
+        group_recording.file.save('group.mp4', ContentFile(b'video'), save=False)
+        group_recording.save()
+        url = reverse('protected-media', kwargs={'kind': 'lesson_recording', 'pk': group_recording.id})
+        
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        group.students.add(self.outsider)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class RecordingMediaTestCase(SignalFreeTestCase, APITestCase):
+    """Фоновая обработка записей: ffprobe/ffmpeg, постер и HLS через защищенную выдачу"""
+    
+    def setUp(self):
+        super().setUp()
+        import shutil
+        import tempfile
+        from django.core.cache import cache
+        from django.core.files.base import ContentFile
+        from django.test import override_settings
+        
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        start_time = timezone.now() - datetime.timedelta(days=1)
+        lesson = Lesson.objects.create(
+            title='Занятие',
+            lesson_type='individual',
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        self.recording = LessonRecording(lesson=lesson, title='Запись', uploaded_by=self.teacher_user)
+        self.recording.file.save('lesson.mp4', ContentFile(b'not a video'), save=False)
+        self.recording.save()
+    
+    def test_failed_probe_is_recorded_once(self):
+        from django.test import override_settings
+        from .services import RecordingMediaService
+        
+        self.assertTrue(self.recording.needs_media_processing)
+        with override_settings(FFPROBE_BINARY='/nonexistent/ffprobe'):
+            self.assertEqual(RecordingMediaService.process('lesson_recording', self.recording.id), 'failed')
+        
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.media_status, 'failed')
+        self.assertTrue(self.recording.media_error)
+        self.assertFalse(self.recording.needs_media_processing)
+        self.assertIsNone(RecordingMediaService.process('lesson_recording', self.recording.id))
+    
+    def test_unexpected_error_marks_failed(self):
+        """Непредвиденная ошибка не оставляет запись в processing"""
+        from unittest import mock
+        from .services import RecordingMediaService
+        
+        with mock.patch.object(RecordingMediaService, 'probe', side_effect=KeyError('format')):
+            self.assertEqual(RecordingMediaService.process('lesson_recording', self.recording.id), 'failed')
+        
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.media_status, 'failed')
+        self.assertIn('format', self.recording.media_error)
+    
+    def test_hls_served_from_signed_directory(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        
+        base = 'recordings/lesson_media/abc'
+        playlist = default_storage.save(f'{base}/index.m3u8', ContentFile(b'#EXTM3U\nsegment_00000.ts\n'))
+        default_storage.save(f'{base}/segment_00000.ts', ContentFile(b'\x47' * 188))
+        LessonRecording.objects.filter(pk=self.recording.pk).update(hls_playlist=playlist, media_status='ready')
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        url = reverse('protected-media-url', kwargs={'kind': 'lesson_recording', 'pk': self.recording.id})
+        response = self.client.get(url, {'variant': 'hls'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        playlist_url = response.data['url']
+        self.assertTrue(playlist_url.endswith('/index.m3u8'))
+        
+        self.client.force_authenticate(user=None)
+        response = self.client.get(playlist_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        response = self.client.get(playlist_url.replace('index.m3u8', 'segment_00000.ts'))
+        self.assertEqual(response['Content-Type'], 'video/mp2t')
+        self.assertEqual(b''.join(response.streaming_content), b'\x47' * 188)
+        self.assertEqual(self.client.get(playlist_url.replace('index.m3u8', '..')).status_code, status.HTTP_404_NOT_FOUND)
+    
+    @unittest.skipUnless(shutil.which('ffmpeg') and shutil.which('ffprobe'), 'ffmpeg не установлен')
+    def test_process_builds_poster_and_hls(self):
+        import subprocess
+        from .services import RecordingMediaService
+        
+        path = self.recording.file.path
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=duration=3:size=320x240:rate=10',
+            '-f', 'lavfi', '-i', 'sine=duration=3', '-shortest', '-pix_fmt', 'yuv420p', path
+        ], check=True)
+        
+        self.assertEqual(RecordingMediaService.process('lesson_recording', self.recording.id), 'ready')
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.media_status, 'ready')
+        self.assertEqual(self.recording.duration, datetime.timedelta(seconds=3))
+        self.assertTrue(self.recording.poster.name.endswith('poster.jpg'))
+        self.assertTrue(self.recording.hls_playlist.endswith('index.m3u8'))
+        self.assertTrue(self.recording.poster.storage.exists(self.recording.hls_playlist))
+
+
+class GradebookTestCase(SignalFreeTestCase, APITestCase):
+    """Журнал группы: развернутый запрос, страницы JSON и потоковая выгрузка"""
+    
+    def setUp(self):
+        super().setUp()
+        from .models import Homework, HomeworkSubmission
+        
+        self.teacher_user = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        self.other_teacher = User.objects.create_user(
+            username='other_teacher',
+            email='other@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        course = Course.objects.create(
+            title='Тестовый курс',
+            description='Описание тестового курса',
+            price=100.00,
+            duration_hours=20,
+            level='beginner'
+        )
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            course=course,
+            teacher=self.teacher_user,
+            start_date='2024-01-01',
+            end_date='2024-06-01'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'student{index}',
+                email=f'student{index}@test.com',
+                password='testpass123',
+                first_name=first_name,
+                last_name=last_name,
+                role='student'
+            )
+            for index, (first_name, last_name) in enumerate([('Анна', 'Алексеева'), ('Борис', 'Иванов'), ('=Вера', 'Яковлева')])
+        ]
+        self.group.students.set(self.students)
+        
+        start_time = timezone.now() - datetime.timedelta(days=7)
+        lesson = Lesson.objects.create(
+            title='Занятие',
+            lesson_type='group',
+            group=self.group,
+            teacher=self.teacher_user,
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        self.homeworks = [
+            Homework.objects.create(
+                lesson=lesson,
+                title=title,
+                description='Задание',
+                due_date=start_time + datetime.timedelta(days=days)
+            )
+            for title, days in [('Эссе', 1), ('Упражнения', 2)]
+        ]
+        HomeworkSubmission.objects.create(homework=self.homeworks[0], student=self.students[0], grade=90)
+        HomeworkSubmission.objects.create(homework=self.homeworks[1], student=self.students[0], grade=70, is_late=True)
+        HomeworkSubmission.objects.create(homework=self.homeworks[0], student=self.students[1])
+        TestResult.objects.create(student=self.students[0], course=course, test_name='Модуль 1', score=40, max_score=50)
+        TestResult.objects.create(student=self.students[0], course=course, test_name='Модуль 1', score=45, max_score=50)
+        self.url = reverse('courses:group-gradebook', kwargs={'group_id': self.group.id})
+    
+    def test_gradebook_pivot(self):
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(
+            [column['title'] for column in response.data['columns']],
+            ['Эссе', 'Упражнения', 'Модуль 1']
+        )
+        
+        essay, exercises, test = [column['key'] for column in response.data['columns']]
+        anna, boris = response.data['results']
+        self.assertEqual(anna['cells'][essay], {'score': 90, 'submitted': True, 'late': False})
+        self.assertEqual(anna['cells'][exercises], {'score': 70, 'submitted': True, 'late': True})
+        self.assertEqual(anna['cells'][test]['score'], 45)
+        self.assertEqual(anna['homework_average'], 80.0)
+        self.assertEqual(anna['test_average'], 90.0)
+        self.assertEqual(boris['cells'][essay], {'score': None, 'submitted': True, 'late': False})
+        self.assertEqual(boris['homework_submitted'], 1)
+        
+        self.client.force_authenticate(user=self.other_teacher)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_export_streams_csv_and_xlsx(self):
+        import csv
+        import io
+        import zipfile
+        from xml.etree import ElementTree
+        from .gradebook import Gradebook
+        
+        gradebook = Gradebook(self.group)
+        # Колонки (задания и тесты) и один запрос на все строки, сколько бы ни было студентов
+        with self.assertNumQueries(3):
+            table = list(gradebook.table())
+        self.assertEqual(len(table), 4)
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        url = reverse('courses:group-gradebook-export', kwargs={'group_id': self.group.id, 'file_format': 'csv'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:5], ['Студент', 'Email', 'Эссе', 'Упражнения', 'Модуль 1'])
+        self.assertEqual(rows[1][2:5], ['90', '70', '45'])
+        self.assertEqual(rows[2][2:4], ['сдано', ''])
+        self.assertEqual(rows[3][0], "'=Вера Яковлева")
+        
+        response = self.client.get(url.replace('/csv/', '/xlsx/'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        sheet_rows = sheet.findall('.//x:row', namespace)
+        self.assertEqual(len(sheet_rows), 4)
+        self.assertEqual(sheet_rows[1].find('x:c[@r="C2"]/x:v', namespace).text, '90')
+        self.assertEqual(sheet_rows[0].find('x:c[@r="A1"]//x:t', namespace).text, 'Студент')
+        
+        self.assertEqual(
+            self.client.get(url.replace('/csv/', '/pdf/')).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
@@ -6,11 +6,14 @@ from .views import (
     GroupDetailView,
     LessonListCreateView,
     LessonDetailView,
+    LessonSeriesListCreateView,
     AttendanceListCreateView,
     AttendanceDetailView,
     ScheduleView,
     StudentScheduleView,
     TeacherScheduleView,
+    get_teacher_free_slots,
+    search_suggest,
     mark_attendance,
     get_group_students,
     # === НОВЫЕ URL ДЛЯ ПРЕПОДАВАТЕЛЯ ===
@@ -46,6 +49,10 @@ from .views import (
     # Материалы урока
     LessonMaterialListView,
     LessonMaterialDetailView,
+    create_chunked_upload,
+    chunked_upload_detail,
+    upload_chunk,
+    complete_chunked_upload,
     # Достижения
     AchievementListView,
     StudentAchievementsView,
@@ -57,6 +64,8 @@ from .views import (
     assign_ticket,
     # Аналитика
     get_student_homework_stats,
+    get_group_gradebook,
+    export_group_gradebook,
     get_lesson_materials_stats,
     get_student_progress_dashboard
 )
@@ -66,6 +75,7 @@ urlpatterns = [
     # Курсы
     path('courses/', CourseListCreateView.as_view(), name='course-list'),
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
+    path('search/suggest/', search_suggest, name='search-suggest'),
     
     # Группы
     path('groups/', GroupListCreateView.as_view(), name='group-list'),
@@ -75,6 +85,7 @@ urlpatterns = [
     # Занятия
     path('lessons/', LessonListCreateView.as_view(), name='lesson-list'),
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
+    path('lesson-series/', LessonSeriesListCreateView.as_view(), name='lesson-series-list'),
     
     # Посещения
     path('attendance/', AttendanceListCreateView.as_view(), name='attendance-list'),
@@ -86,6 +97,7 @@ urlpatterns = [
     path('schedule/', ScheduleView.as_view(), name='schedule'),
     path('schedule/student/<int:student_id>/', StudentScheduleView.as_view(), name='student-schedule'),
     path('schedule/teacher/<int:teacher_id>/', TeacherScheduleView.as_view(), name='teacher-schedule'),
+    path('schedule/teacher/<int:teacher_id>/free-slots/', get_teacher_free_slots, name='teacher-free-slots'),
     
     # === НОВЫЕ URL ДЛЯ ПРЕПОДАВАТЕЛЯ ===
     # Бейджи
@@ -138,6 +150,12 @@ urlpatterns = [
     path('lesson-materials/', LessonMaterialListView.as_view(), name='lesson-materials'),
     path('lesson-materials/<int:pk>/', LessonMaterialDetailView.as_view(), name='lesson-material-detail'),
     
+    # === ЗАГРУЗКА ФАЙЛОВ ЧАСТЯМИ ===
+    path('uploads/', create_chunked_upload, name='chunked-upload-create'),
+    path('uploads/<uuid:upload_id>/', chunked_upload_detail, name='chunked-upload-detail'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', upload_chunk, name='chunked-upload-chunk'),
+    path('uploads/<uuid:upload_id>/complete/', complete_chunked_upload, name='chunked-upload-complete'),
+    
     # === ДОСТИЖЕНИЯ ===
     path('achievements/', AchievementListView.as_view(), name='achievements'),
     path('students/<int:student_id>/achievements/', StudentAchievementsView.as_view(), name='student-achievements'),
@@ -151,6 +169,8 @@ urlpatterns = [
     
     # === АНАЛИТИКА ===
     path('students/<int:student_id>/homework-stats/', get_student_homework_stats, name='student-homework-stats'),
+    path('groups/<int:group_id>/gradebook/', get_group_gradebook, name='group-gradebook'),
+    path('groups/<int:group_id>/gradebook/export/<str:file_format>/', export_group_gradebook, name='group-gradebook-export'),
     path('lessons/<int:lesson_id>/materials-stats/', get_lesson_materials_stats, name='lesson-materials-stats'),
     path('dashboard/progress/', get_student_progress_dashboard, name='student-progress-dashboard'),
 ]
\ No newline at end of file
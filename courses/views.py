@@ -4,17 +4,26 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from config.http_client import get_client
+from config.pagination import KeysetPagination
+from config.response_cache import CachedResponseMixin
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Prefetch
+from .models import Course, Group, Lesson, LessonSeries, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage, ChunkedUpload
 from accounts.models import User
 from payments.models import Payment
 from .serializers import (
     CourseSerializer, 
     GroupSerializer, 
     LessonSerializer, 
+    LessonSeriesSerializer,
     AttendanceSerializer,
     ScheduleSerializer,
     BadgeSerializer,
@@ -30,7 +39,8 @@ from .serializers import (
     AchievementSerializer,
     StudentAchievementSerializer,
     SupportTicketSerializer,
-    TicketMessageSerializer
+    TicketMessageSerializer,
+    ChunkedUploadCreateSerializer
 )
 from .permissions import (
     IsTeacherOrAdmin, 
@@ -44,17 +54,37 @@ from .permissions import (
     CanManageSupportTicket
 )
 from notifications.services import NotificationService
+from .services import (
+    AttendanceService, ChunkedUploadService, DashboardCounterService, LessonSeriesService, PaymentStatusResolver,
+    ScheduleConflict, ScheduleConflictService, StudentCardService, StudentProgressEngine
+)
+from .search import FullTextSearchFilter, suggest
+from .gradebook import Gradebook, stream_csv, stream_xlsx
+import io
 import requests
 import jwt
 import time
 from django.conf import settings
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class PaymentStatusContextMixin:
+    """Загружает статусы оплат для всей страницы занятий одним запросом"""
+    
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None and 'data' not in kwargs:
+            lessons = list(args[0]) if kwargs.get('many') else [args[0]]
+            if kwargs.get('many'):
+                args = (lessons,) + args[1:]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            context['paid_pairs'] = PaymentStatusResolver.load(lessons)
+        return super().get_serializer(*args, **kwargs)
+
+class CourseListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     """Список курсов и создание нового курса"""
+    cache_models = [Course]
     queryset = Course.objects.filter(is_active=True)
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['level', 'language']
     search_fields = ['title', 'description']
     ordering_fields = ['title', 'price', 'created_at']
@@ -66,7 +96,33 @@ class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
 
-class GroupListCreateView(generics.ListCreateAPIView):
+class GroupQuerysetMixin:
+    """Группы с числом студентов, курсом, преподавателем и студентами за фиксированное число запросов"""
+    
+    def is_compact(self):
+        return self.request.query_params.get('compact') in ('1', 'true')
+    
+    def get_queryset(self):
+        if self.is_compact():
+            # В компактном режиме нужны только id студентов (поле students)
+            students = User.objects.only('id')
+        else:
+            students = User.objects.only('id', 'username', 'first_name', 'last_name')
+        return super().get_queryset().select_related('course', 'teacher').annotate(
+            students_count=models.Count('students', distinct=True)
+        ).prefetch_related(Prefetch('students', queryset=students))
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['compact'] = self.is_compact()
+        return context
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # Состав группы мог измениться - аннотация больше не актуальна
+        vars(serializer.instance).pop('students_count', None)
+
+class GroupListCreateView(GroupQuerysetMixin, generics.ListCreateAPIView):
     """Список групп и создание новой группы"""
     queryset = Group.objects.filter(is_active=True)
     serializer_class = GroupSerializer
@@ -75,29 +131,125 @@ class GroupListCreateView(generics.ListCreateAPIView):
     filterset_fields = ['course', 'teacher']
     search_fields = ['title', 'course__title']
 
-class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
+class GroupDetailView(GroupQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Детали группы"""
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated, IsGroupTeacherOrAdmin]
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonConflictCheckMixin:
+    """Занятие не сохраняется, если преподаватель или студенты уже заняты в это время"""
+    
+    def check_conflicts(self, serializer):
+        instance = serializer.instance
+        values = {
+            field: serializer.validated_data.get(field, getattr(instance, field, None))
+            for field in ['start_time', 'end_time', 'teacher', 'group', 'student', 'lesson_type']
+        }
+        if not values['start_time'] or not values['end_time'] or not values['teacher']:
+            return
+        group = values['group'] if values['lesson_type'] == 'group' else None
+        student = values['student'] if values['lesson_type'] == 'individual' else None
+        ScheduleConflictService.check_lesson(
+            values['start_time'],
+            values['end_time'],
+            values['teacher'].id,
+            group_id=group.id if group else None,
+            student_id=student.id if student else None,
+            exclude_ids=[instance.id] if instance else []
+        )
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            self.check_conflicts(serializer)
+            serializer.save()
+    
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self.check_conflicts(serializer)
+            serializer.save()
+    
+    def handle_exception(self, exc):
+        if isinstance(exc, ScheduleConflict):
+            return Response(
+                {'error': ' '.join(exc.messages), 'conflicts': exc.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        return super().handle_exception(exc)
+
+class LessonListCreateView(LessonConflictCheckMixin, PaymentStatusContextMixin, generics.ListCreateAPIView):
     """Список занятий и создание нового занятия"""
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['lesson_type', 'teacher', 'group', 'is_completed']
     search_fields = ['title', 'description']
     ordering_fields = ['start_time', 'end_time']
     ordering = ['start_time']
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LessonDetailView(LessonConflictCheckMixin, PaymentStatusContextMixin, generics.RetrieveUpdateDestroyAPIView):
     """Детали занятия"""
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated, IsLessonOwnerOrAdmin]
 
+class LessonSeriesListCreateView(generics.ListCreateAPIView):
+    """Серии занятий и создание серии по правилу повторения"""
+    serializer_class = LessonSeriesSerializer
+    permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+    
+    def get_queryset(self):
+        queryset = LessonSeries.objects.select_related('teacher').annotate(lessons_count=models.Count('lessons'))
+        if not self.request.user.is_admin:
+            queryset = queryset.filter(teacher=self.request.user)
+        return queryset
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        skip_conflicts = data.pop('skip_conflicts', False)
+        
+        if not request.user.is_admin:
+            # Преподаватель планирует только свои занятия и только для своих групп
+            data['teacher'] = request.user
+            if data.get('group') and data['group'].teacher_id != request.user.id:
+                return Response(
+                    {'error': 'Нет прав на планирование занятий этой группы'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif not data.get('teacher'):
+            return Response(
+                {'error': 'Необходимо указать преподавателя'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            series, lessons, skipped = LessonSeriesService.create(
+                data,
+                created_by=request.user,
+                skip_conflicts=skip_conflicts
+            )
+        except ScheduleConflict as e:
+            return Response(
+                {'error': ' '.join(e.messages), 'conflicts': e.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        except ValidationError as e:
+            return Response(
+                {'error': ' '.join(e.messages)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        series.lessons_count = len(lessons)
+        return Response({
+            'message': 'Серия занятий создана',
+            'series': self.get_serializer(series).data,
+            'lessons_created': len(lessons),
+            'skipped': skipped
+        }, status=status.HTTP_201_CREATED)
+
 class AttendanceListCreateView(generics.ListCreateAPIView):
     """Список посещений и отметка посещения"""
     queryset = Attendance.objects.all()
@@ -105,6 +257,8 @@ class AttendanceListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['lesson', 'student', 'status']
+    pagination_class = KeysetPagination
+    ordering = ['-created_at']
 
 class AttendanceDetailView(generics.RetrieveUpdateAPIView):
     """Детали посещения"""
@@ -112,7 +266,7 @@ class AttendanceDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
 
-class ScheduleView(generics.ListAPIView):
+class ScheduleView(PaymentStatusContextMixin, generics.ListAPIView):
     """Просмотр расписания"""
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated]
@@ -155,7 +309,7 @@ class ScheduleView(generics.ListAPIView):
         
         return Lesson.objects.none()
 
-class StudentScheduleView(generics.ListAPIView):
+class StudentScheduleView(PaymentStatusContextMixin, generics.ListAPIView):
     """Расписание для конкретного студента"""
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated]
@@ -192,7 +346,7 @@ class StudentScheduleView(generics.ListAPIView):
         
         return group_lessons.union(individual_lessons).order_by('start_time')
 
-class TeacherScheduleView(generics.ListAPIView):
+class TeacherScheduleView(PaymentStatusContextMixin, generics.ListAPIView):
     """Расписание для преподавателя с детальной информацией"""
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated]
@@ -212,11 +366,83 @@ class TeacherScheduleView(generics.ListAPIView):
         
         return Lesson.objects.none()
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_teacher_free_slots(request, teacher_id):
+    """Свободные окна преподавателя в рабочие часы за период (одним запросом к занятиям)
+    
+    Параметры: date_from, date_to (YYYY-MM-DD), duration (минуты, по умолчанию 60),
+    day_start, day_end (HH:MM, по умолчанию 09:00 и 21:00).
+    """
+    teacher = get_object_or_404(User, id=teacher_id, role='teacher')
+    params = request.query_params
+    try:
+        date_from = datetime.strptime(params['date_from'], '%Y-%m-%d').date() \
+            if params.get('date_from') else timezone.localdate()
+        date_to = datetime.strptime(params['date_to'], '%Y-%m-%d').date() \
+            if params.get('date_to') else date_from + timedelta(days=6)
+        duration = int(params.get('duration', 60))
+        day_start = datetime.strptime(params.get('day_start', '09:00'), '%H:%M').time()
+        day_end = datetime.strptime(params.get('day_end', '21:00'), '%H:%M').time()
+    except ValueError:
+        return Response(
+            {'error': 'Некорректные параметры периода'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if date_to < date_from or (date_to - date_from).days > 92:
+        return Response(
+            {'error': 'Период - от одного дня до трех месяцев'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if duration <= 0 or day_end <= day_start:
+        return Response(
+            {'error': 'Некорректная длительность или рабочие часы'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    slots = ScheduleConflictService.free_slots(
+        teacher.id,
+        date_from,
+        date_to,
+        timedelta(minutes=duration),
+        day_start,
+        day_end
+    )
+    return Response({
+        'teacher_id': teacher.id,
+        'date_from': date_from,
+        'date_to': date_to,
+        'duration_minutes': duration,
+        'slots': slots
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_suggest(request):
+    """Подсказки поиска по мере ввода: курсы, занятия и материалы (?q=, ?limit= до 20)"""
+    text = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 5)), 1), 20)
+    except ValueError:
+        limit = 5
+    
+    querysets = {
+        'courses': Course.objects.filter(is_active=True),
+        'lessons': Lesson.objects.all(),
+        'materials': LessonMaterial.objects.all(),
+    }
+    return Response({
+        key: list(suggest(queryset, text, limit).values('id', 'title'))
+        for key, queryset in querysets.items()
+    })
+
 # === НОВЫЕ ВЬЮХИ ДЛЯ ПРЕПОДАВАТЕЛЯ ===
 
 # 1. API для бейджей
-class BadgeListView(generics.ListAPIView):
+class BadgeListView(CachedResponseMixin, generics.ListAPIView):
     """Список всех бейджей"""
+    cache_models = [Badge]
     queryset = Badge.objects.all()
     serializer_class = BadgeSerializer
     permission_classes = [IsAuthenticated]
@@ -247,10 +473,11 @@ class StudentProgressView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         student_id = self.kwargs['student_id']
         course_id = self.kwargs['course_id']
-        progress, created = StudentProgress.objects.get_or_create(
-            student_id=student_id,
-            course_id=course_id
-        )
+        progress = StudentProgress.objects.filter(student_id=student_id, course_id=course_id).first()
+        if progress is None:
+            # Первое обращение - считаем прогресс по уже накопленным данным
+            StudentProgressEngine.recompute(course_id, [student_id])
+            progress = get_object_or_404(StudentProgress, student_id=student_id, course_id=course_id)
         return progress
 
 class StudentProgressListView(generics.ListAPIView):
@@ -260,7 +487,8 @@ class StudentProgressListView(generics.ListAPIView):
     
     def get_queryset(self):
         course_id = self.kwargs['course_id']
-        return StudentProgress.objects.filter(course_id=course_id)
+        # Индекс (course, -overall_progress)
+        return StudentProgress.objects.filter(course_id=course_id).order_by('-overall_progress', 'id')
 
 # 3. API для результатов тестов
 class TestResultListView(generics.ListCreateAPIView):
@@ -295,34 +523,7 @@ def mark_attendance_with_comment(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        created_attendances = []
-        for data in attendance_data:
-            student_id = data.get('student_id')
-            status_value = data.get('status', 'present')
-            comment = data.get('comment', '')
-            
-            # Создаем или обновляем запись посещения
-            attendance, created = Attendance.objects.update_or_create(
-                lesson=lesson,
-                student_id=student_id,
-                defaults={
-                    'status': status_value,
-                    'comment': comment
-                }
-            )
-            
-            # Отправляем уведомление студенту
-            student = User.objects.get(id=student_id)
-            if comment:
-                NotificationService.send_notification(
-                    user=student,
-                    title=f'Комментарий к занятию: {lesson.title}',
-                    message=f'Преподаватель оставил комментарий: {comment}',
-                    notification_type='info',
-                    channels=['email', 'in_app']
-                )
-            
-            created_attendances.append(attendance)
+        created_attendances = AttendanceService.mark(lesson, attendance_data, notify_comments=True)
         
         serializer = AttendanceSerializer(created_attendances, many=True)
         return Response({
@@ -335,6 +536,11 @@ def mark_attendance_with_comment(request):
             {'error': 'Занятие не найдено'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except ValidationError as e:
+        return Response(
+            {'error': ' '.join(e.messages)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -352,74 +558,15 @@ def get_student_detailed_info(request, student_id):
         # Проверка прав доступа
         if not (user.is_admin or 
                 user.is_teacher or 
-                (user.is_parent and student.parent == user)):
+                (user.is_parent and student.parent_id == user.id)):
             return Response(
                 {'error': 'Нет прав для просмотра информации о студенте'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Получаем информацию о студенте
-        student_data = {
-            'id': student.id,
-            'username': student.username,
-            'full_name': student.get_full_name(),
-            'email': student.email,
-            'birth_date': student.birth_date,
-            'phone': student.phone,
-            'avatar': student.avatar.url if student.avatar else None,
-        }
-        
-        # Прогресс по курсам
-        progress_data = []
-        for progress in StudentProgress.objects.filter(student=student):
-            progress_data.append({
-                'course': {
-                    'id': progress.course.id,
-                    'title': progress.course.title,
-                },
-                'completed_topics': progress.completed_topics,
-                'current_level': progress.current_level,
-                'overall_progress': progress.overall_progress,
-                'last_activity': progress.last_activity,
-            })
-        
-        # Бейджи
-        badges_data = []
-        for badge in StudentBadge.objects.filter(student=student):
-            badges_data.append({
-                'id': badge.id,
-                'badge': {
-                    'id': badge.badge.id,
-                    'name': badge.badge.name,
-                    'description': badge.badge.description,
-                    'badge_type': badge.badge.badge_type,
-                    'icon': badge.badge.icon.url if badge.badge.icon else None,
-                },
-                'awarded_at': badge.awarded_at,
-                'awarded_by': badge.awarded_by.get_full_name(),
-                'comment': badge.comment,
-            })
-        
-        # Результаты тестов
-        test_results_data = []
-        for test_result in TestResult.objects.filter(student=student):
-            test_results_data.append({
-                'test_name': test_result.test_name,
-                'score': test_result.score,
-                'max_score': test_result.max_score,
-                'date_taken': test_result.date_taken,
-                'course': {
-                    'id': test_result.course.id,
-                    'title': test_result.course.title,
-                },
-            })
-        
-        return Response({
-            'student': student_data,
-            'progress': progress_data,
-            'badges': badges_data,
-            'test_results': test_results_data,
-        })
+        # ?fresh=1 - собрать карточку из БД в обход кеша
+        use_cache = request.query_params.get('fresh') not in ('1', 'true')
+        return Response(StudentCardService.get(student, use_cache=use_cache))
         
     except User.DoesNotExist:
         return Response(
@@ -490,24 +637,20 @@ def award_badge_to_student(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsTeacherOrAdmin])
 def update_student_progress(request, student_id, course_id):
-    """Обновление прогресса студента"""
+    """Обновление прогресса студента
+    
+    Прогресс, темы и результаты тестов пересчитываются по посещаемости,
+    заданиям и тестам; вручную задается только текущий уровень.
+    """
     try:
-        progress, created = StudentProgress.objects.get_or_create(
-            student_id=student_id,
-            course_id=course_id
-        )
+        StudentProgressEngine.recompute(course_id, [student_id])
+        progress = StudentProgress.objects.get(student_id=student_id, course_id=course_id)
         
-        # Обновляем прогресс
-        completed_topics = request.data.get('completed_topics', progress.completed_topics)
-        test_results = request.data.get('test_results', progress.test_results)
-        current_level = request.data.get('current_level', progress.current_level)
-        overall_progress = request.data.get('overall_progress', progress.overall_progress)
-        
-        progress.completed_topics = completed_topics
-        progress.test_results = test_results
-        progress.current_level = current_level
-        progress.overall_progress = overall_progress
-        progress.save()
+        current_level = request.data.get('current_level')
+        if current_level and current_level != progress.current_level:
+            progress.current_level = current_level
+            progress.full_clean(exclude=['student', 'course'])
+            progress.save(update_fields=['current_level', 'last_activity'])
         
         serializer = StudentProgressSerializer(progress)
         return Response({
@@ -515,6 +658,11 @@ def update_student_progress(request, student_id, course_id):
             'progress': serializer.data
         })
         
+    except StudentProgress.DoesNotExist:
+        return Response(
+            {'error': 'Студент или курс не найден'},
+            status=status.HTTP_404_NOT_FOUND
+        )
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -616,11 +764,14 @@ class VideoLessonCreateView(generics.CreateAPIView):
             }
         }
         
-        response = requests.post(
-            f'https://api.zoom.us/v2/users/{self.get_zoom_user_id()}/meetings',
-            headers=headers,
-            json=meeting_data
-        )
+        try:
+            response = get_client('zoom').post(
+                f'https://api.zoom.us/v2/users/{self.get_zoom_user_id()}/meetings',
+                headers=headers,
+                json=meeting_data
+            )
+        except requests.RequestException:
+            return {}
         
         return response.json() if response.status_code == 201 else {}
     
@@ -1097,6 +1248,8 @@ class LessonMaterialListView(generics.ListCreateAPIView):
     """Список материалов урока и загрузка новых"""
     serializer_class = LessonMaterialSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['title', 'description']
     
     def get_queryset(self):
         lesson_id = self.request.query_params.get('lesson_id')
@@ -1117,10 +1270,67 @@ class LessonMaterialDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = LessonMaterialSerializer
     permission_classes = [IsAuthenticated]
 
+# === ЗАГРУЗКА ФАЙЛОВ ЧАСТЯМИ ===
+
+def get_chunked_upload(request, upload_id):
+    """Загрузка текущего пользователя"""
+    return get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_chunked_upload(request):
+    """Начать загрузку файла частями для задания, материала или записи"""
+    serializer = ChunkedUploadCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        upload = ChunkedUploadService.create(request.user, **serializer.validated_data)
+    except ValidationError as e:
+        return Response({'error': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ChunkedUploadService.describe(upload), status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def chunked_upload_detail(request, upload_id):
+    """Состояние загрузки (для докачки) или ее отмена"""
+    upload = get_chunked_upload(request, upload_id)
+    if request.method == 'DELETE':
+        ChunkedUploadService.abort(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(ChunkedUploadService.describe(upload))
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id, index):
+    """Часть файла: тело запроса - байты части, заголовок Upload-Checksum: <алгоритм> <base64>"""
+    upload = get_chunked_upload(request, upload_id)
+    try:
+        ChunkedUploadService.receive_part(
+            upload,
+            index,
+            request.stream or io.BytesIO(),
+            request.headers.get('Upload-Checksum', '')
+        )
+    except ValidationError as e:
+        return Response({'error': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ChunkedUploadService.describe(upload))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_chunked_upload(request, upload_id):
+    """Все части загружены - собрать файл и привязать к объекту (в фоне)"""
+    upload = get_chunked_upload(request, upload_id)
+    try:
+        ChunkedUploadService.complete(upload)
+    except ValidationError as e:
+        return Response({'error': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+    upload.refresh_from_db()
+    return Response(ChunkedUploadService.describe(upload), status=status.HTTP_202_ACCEPTED)
+
 # === ДОСТИЖЕНИЯ ===
 
-class AchievementListView(generics.ListAPIView):
+class AchievementListView(CachedResponseMixin, generics.ListAPIView):
     """Список всех достижений"""
+    cache_models = [Achievement]
     queryset = Achievement.objects.all()
     serializer_class = AchievementSerializer
     permission_classes = [IsAuthenticated]
@@ -1342,6 +1552,65 @@ def get_student_homework_stats(request, student_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+def get_gradebook_group(request, group_id):
+    """Группа для журнала или None, если это не преподаватель группы и не администратор"""
+    group = get_object_or_404(Group, id=group_id)
+    if not (request.user.is_admin or group.teacher_id == request.user.id):
+        return None
+    return group
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsTeacherOrAdmin])
+def get_group_gradebook(request, group_id):
+    """Журнал группы: колонки (задания и тесты) и страница строк студентов"""
+    group = get_gradebook_group(request, group_id)
+    if group is None:
+        return Response(
+            {'error': 'Нет прав для просмотра журнала группы'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    gradebook = Gradebook(group)
+    paginator = PageNumberPagination()
+    paginator.page_size_query_param = 'page_size'
+    paginator.max_page_size = 200
+    page = paginator.paginate_queryset(gradebook.queryset(), request)
+    return Response({
+        'group': group.title,
+        'columns': gradebook.columns(),
+        'count': paginator.page.paginator.count,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': [gradebook.build_row(record) for record in page],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsTeacherOrAdmin])
+def export_group_gradebook(request, group_id, file_format):
+    """Выгрузка журнала группы в CSV или XLSX потоком (строки читаются из БД частями)"""
+    if file_format not in ('csv', 'xlsx'):
+        return Response(
+            {'error': 'Поддерживаются форматы csv и xlsx'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    group = get_gradebook_group(request, group_id)
+    if group is None:
+        return Response(
+            {'error': 'Нет прав для просмотра журнала группы'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    gradebook = Gradebook(group)
+    if file_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(gradebook.table()), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            stream_xlsx(gradebook.table()),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    response['Content-Disposition'] = content_disposition_header(True, f'gradebook_{group.id}.{file_format}')
+    return response
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsTeacherOrAdmin])
 def get_lesson_materials_stats(request, lesson_id):
@@ -1393,39 +1662,30 @@ def get_student_progress_dashboard(request):
     
     if user.is_student:
         # Прогресс для студента
+        counters = DashboardCounterService.get(user)
         progress_data = {
             'student_id': user.id,
             'student_name': user.get_full_name(),
-            'total_courses': user.learning_groups.values('course').distinct().count(),
-            'total_lessons': Lesson.objects.filter(
-                models.Q(group__students=user) | models.Q(student=user)
-            ).count(),
-            'completed_lessons': Attendance.objects.filter(
-                student=user,
-                status='present'
-            ).count(),
-            'total_homework': HomeworkSubmission.objects.filter(student=user).count(),
-            'submitted_homework': HomeworkSubmission.objects.filter(
-                student=user,
-                grade__isnull=False
-            ).count(),
-            'total_badges': StudentBadge.objects.filter(student=user).count(),
-            'total_achievements': StudentAchievement.objects.filter(student=user).count(),
+            'total_courses': counters.total_courses,
+            'total_lessons': counters.total_lessons,
+            'completed_lessons': counters.completed_lessons,
+            'total_homework': counters.total_homework,
+            'submitted_homework': counters.submitted_homework,
+            'total_badges': counters.total_badges,
+            'total_achievements': counters.total_achievements,
         }
         
         return Response(progress_data)
     elif user.is_teacher:
         # Статистика для преподавателя
+        counters = DashboardCounterService.get(user)
         teacher_stats = {
             'teacher_id': user.id,
             'teacher_name': user.get_full_name(),
-            'total_groups': Group.objects.filter(teacher=user).count(),
-            'total_students': Group.objects.filter(teacher=user).values('students').count(),
-            'total_lessons': Lesson.objects.filter(teacher=user).count(),
-            'graded_homework': HomeworkSubmission.objects.filter(
-                homework__lesson__teacher=user,
-                grade__isnull=False
-            ).count(),
+            'total_groups': counters.total_groups,
+            'total_students': counters.total_students,
+            'total_lessons': counters.taught_lessons,
+            'graded_homework': counters.graded_homework,
         }
         
         return Response(teacher_stats)
@@ -1454,22 +1714,15 @@ def mark_attendance(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        created_attendances = []
-        for data in attendance_data:
-            student_id = data.get('student_id')
-            status_value = data.get('status', 'present')
-            notes = data.get('notes', '')
-            
-            # Создаем или обновляем запись посещения
-            attendance, created = Attendance.objects.update_or_create(
-                lesson=lesson,
-                student_id=student_id,
-                defaults={
-                    'status': status_value,
-                    'comment': notes  # Обновлено: теперь используется поле comment
-                }
-            )
-            created_attendances.append(attendance)
+        # Заметки старого формата записываются в поле comment
+        created_attendances = AttendanceService.mark(lesson, [
+            {
+                'student_id': data.get('student_id'),
+                'status': data.get('status', 'present'),
+                'comment': data.get('notes', '')
+            }
+            for data in attendance_data
+        ])
         
         serializer = AttendanceSerializer(created_attendances, many=True)
         return Response({
@@ -1482,6 +1735,11 @@ def mark_attendance(request):
             {'error': 'Занятие не найдено'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except ValidationError as e:
+        return Response(
+            {'error': ' '.join(e.messages)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         return Response(
             {'error': str(e)},
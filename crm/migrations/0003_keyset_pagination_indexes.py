@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_remove_teacherprofile_available_hours_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studentactivity',
+            name='crm_student_student_e5c64c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='studentactivity',
+            index=models.Index(fields=['student', 'created_at', 'id'], name='crm_student_student_5bc2ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentactivity',
+            index=models.Index(fields=['created_at', 'id'], name='crm_student_created_b98643_idx'),
+        ),
+    ]
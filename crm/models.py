@@ -323,7 +323,8 @@ class StudentActivity(models.Model):
         verbose_name_plural = _('Активности студентов')
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['student', 'created_at']),
+            models.Index(fields=['student', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
             models.Index(fields=['activity_type', 'created_at']),
         ]
     
@@ -41,6 +41,11 @@ class CRMService:
         )
         return activity
     
+    @staticmethod
+    def track_student_activities(activities):
+        """Сохранение пачки активностей студентов одним запросом"""
+        return StudentActivity.objects.bulk_create(activities)
+    
     @staticmethod
     def convert_lead_to_student(lead):
         """Конвертация лида в студента"""
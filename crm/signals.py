@@ -1,13 +1,13 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from .models import StudentProfile, TeacherProfile, Lead, StudentActivity
 from accounts.models import User
 from courses.models import Lesson, Attendance
+from courses.signals import attendance_marked, lesson_series_created
 from payments.models import Payment
 from feedback.models import Feedback
+from notifications.tasks import queue_email
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -41,13 +41,7 @@ def notify_lead_assignment(sender, instance, created, **kwargs):
             CRM система
             '''
             
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [instance.assigned_to.email],
-                fail_silently=True,
-            )
+            queue_email(subject, message, [instance.assigned_to.email])
         except Exception as e:
             print(f"Ошибка отправки email: {e}")
 
@@ -64,6 +58,20 @@ def track_lesson_scheduled(sender, instance, created, **kwargs):
             related_object_id=instance.id
         )
 
+@receiver(lesson_series_created)
+def track_lesson_series_scheduled(sender, series, lessons, **kwargs):
+    """Отслеживание занятий серии одной пачкой"""
+    from .services import CRMService
+    CRMService.track_student_activities([
+        StudentActivity(
+            student_id=lesson.teacher_id,
+            activity_type='lesson_scheduled',
+            description=f'Запланировано занятие "{lesson.title}"',
+            related_object_id=lesson.id
+        )
+        for lesson in lessons
+    ])
+
 @receiver(post_save, sender=Attendance)
 def track_attendance(sender, instance, created, **kwargs):
     """Отслеживание посещаемости"""
@@ -83,6 +91,28 @@ def track_attendance(sender, instance, created, **kwargs):
             related_object_id=instance.lesson.id
         )
 
+@receiver(attendance_marked)
+def track_attendance_bulk(sender, lesson, attendances, created_student_ids, **kwargs):
+    """Отслеживание посещаемости для пачки новых отметок"""
+    from .services import CRMService
+    activities = []
+    for attendance in attendances:
+        if attendance.student_id not in created_student_ids:
+            continue
+        if attendance.status == 'present':
+            activity_type = 'lesson_attended'
+            description = f'Студент посетил занятие "{lesson.title}"'
+        else:
+            activity_type = 'lesson_missed'
+            description = f'Студент пропустил занятие "{lesson.title}"'
+        activities.append(StudentActivity(
+            student_id=attendance.student_id,
+            activity_type=activity_type,
+            description=description,
+            related_object_id=lesson.id
+        ))
+    CRMService.track_student_activities(activities)
+
 @receiver(post_save, sender=Payment)
 def track_payment(sender, instance, created, **kwargs):
     """Отслеживание платежей"""
@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from config.pagination import KeysetPagination
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Avg, Sum, Q
@@ -80,6 +81,7 @@ class StudentActivityListView(generics.ListAPIView):
     queryset = StudentActivity.objects.all()
     serializer_class = StudentActivitySerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['student', 'activity_type']
     ordering_fields = ['created_at']
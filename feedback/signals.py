@@ -1,9 +1,8 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from .models import Feedback, FeedbackResponse, Survey, SurveyResponse
+from notifications.tasks import queue_email, queue_mass_email
 
 @receiver(post_save, sender=Feedback)
 def notify_feedback_created(sender, instance, created, **kwargs):
@@ -27,13 +26,7 @@ def notify_feedback_created(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [instance.teacher.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [instance.teacher.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -58,13 +51,7 @@ def notify_feedback_response(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [student.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -83,6 +70,7 @@ def notify_survey_response(sender, instance, created, **kwargs):
         from accounts.models import User
         admins = User.objects.filter(role='admin')
         
+        emails = []
         for admin in admins:
             if admin.email:
                 try:
@@ -98,12 +86,7 @@ def notify_survey_response(sender, instance, created, **kwargs):
                     Система уведомлений
                     '''
                     
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [admin.email],
-                        fail_silently=True,
-                    )
+                    emails.append((subject, message, [admin.email]))
                 except Exception as e:
-                    print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+                    print(f"Ошибка отправки email: {e}")
+        queue_mass_email(emails)
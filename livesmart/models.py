@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from datetime import datetime, timedelta
+from courses.models import RecordingMedia
 
 User = settings.AUTH_USER_MODEL
 
@@ -169,7 +170,7 @@ class LiveSmartParticipant(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} ({self.get_role_display()})"
 
-class LiveSmartRecording(models.Model):
+class LiveSmartRecording(RecordingMedia):
     """Запись LiveSmart комнаты"""
     recording_id = models.CharField(
         max_length=100,
@@ -205,6 +206,8 @@ class LiveSmartRecording(models.Model):
         verbose_name=_('Размер файла (байты)')
     )
     duration = models.DurationField(
+        null=True,
+        blank=True,
         verbose_name=_('Длительность записи')
     )
     is_public = models.BooleanField(
@@ -247,6 +250,11 @@ class LiveSmartRecording(models.Model):
     
     def __str__(self):
         return f"Запись: {self.title}"
+    
+    def save(self, *args, **kwargs):
+        if self.file and not self.file_size:
+            self.file_size = self.file.size
+        super().save(*args, **kwargs)
 
 class LiveSmartSettings(models.Model):
     """Настройки LiveSmart"""
@@ -3,6 +3,7 @@ from rest_framework import serializers
 from .models import LiveSmartRoom, LiveSmartParticipant, LiveSmartRecording, LiveSmartSettings
 from accounts.models import User
 from courses.models import Lesson
+from config.protected_media import ProtectedFileField, hls_url
 
 class LiveSmartRoomSerializer(serializers.ModelSerializer):
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
@@ -30,11 +31,17 @@ class LiveSmartRecordingSerializer(serializers.ModelSerializer):
     room_name = serializers.CharField(source='room.room_name', read_only=True)
     lesson_title = serializers.CharField(source='room.lesson.title', read_only=True)
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
+    file = ProtectedFileField('livesmart_recording', required=False, allow_null=True)
+    poster = ProtectedFileField('livesmart_recording', variant='poster', read_only=True)
+    hls_url = serializers.SerializerMethodField()
     
     class Meta:
         model = LiveSmartRecording
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at', 'published_at', 'file_size']
+        exclude = ['hls_playlist', 'media_source']
+        read_only_fields = ['created_at', 'updated_at', 'published_at', 'file_size', 'duration']
+    
+    def get_hls_url(self, obj):
+        return hls_url(self.context.get('request'), 'livesmart_recording', obj)
 
 class LiveSmartSettingsSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
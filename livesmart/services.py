@@ -1,10 +1,10 @@
 # livesmart/services.py
-from datetime import timedelta
 import requests
 import json
 import uuid
 from django.conf import settings
 from django.utils import timezone
+from config.http_client import get_client
 from .models import LiveSmartRoom, LiveSmartParticipant, LiveSmartRecording, LiveSmartSettings
 from accounts.models import User
 from courses.models import Lesson
@@ -20,6 +20,7 @@ class LiveSmartService:
         self.api_secret = getattr(settings, 'LIVESMART_API_SECRET', '')
         self.base_url = getattr(settings, 'LIVESMART_API_URL', 'https://api.livesmart.com/v1')
         self.return_url = getattr(settings, 'LIVESMART_RETURN_URL', 'https://fluencyclub.fun/meeting-complete/')
+        self.http = get_client('livesmart')
     
     def get_auth_headers(self):
         """Получение заголовков аутентификации"""
@@ -29,66 +30,77 @@ class LiveSmartService:
             'Accept': 'application/json',
         }
     
-    def create_room(self, lesson, host_user=None):
-        """Создание комнаты LiveSmart для занятия"""
-        try:
-            # Генерируем уникальный ID комнаты
-            room_id = str(uuid.uuid4())
-            
-            # Получаем настройки пользователя
-            if host_user:
-                settings_obj, created = LiveSmartSettings.objects.get_or_create(user=host_user)
-                max_participants = settings_obj.max_participants
-                is_recording_enabled = settings_obj.is_recording_enabled
-            else:
-                max_participants = 50
-                is_recording_enabled = False
-            
-            # Создаем данные комнаты
-            room_data = {
-                'name': f'Занятие: {lesson.title}',
-                'description': lesson.description or f'Видеоурок по курсу {lesson.group.course.title if lesson.group else "индивидуальный"}',
-                'start_time': lesson.start_time.isoformat() if lesson.start_time else None,
-                'duration': lesson.duration_minutes,
-                'max_participants': max_participants,
-                'enable_recording': is_recording_enabled,
-                'enable_chat': True,
-                'enable_screen_sharing': True,
-                'enable_whiteboard': True,
-                'enable_polls': True,
-                'password': self.generate_room_password(),
-                'metadata': {
-                    'lesson_id': lesson.id,
-                    'course_title': lesson.group.course.title if lesson.group and lesson.group.course else '',
-                    'teacher': lesson.teacher.get_full_name() if lesson.teacher else '',
-                    'lesson_type': lesson.lesson_type,
-                }
+    def get_room_options(self, host_user=None):
+        """Лимит участников и запись по настройкам хоста"""
+        if host_user:
+            settings_obj, created = LiveSmartSettings.objects.get_or_create(user=host_user)
+            return settings_obj.max_participants, settings_obj.is_recording_enabled
+        return 50, False
+    
+    def build_room_data(self, lesson, max_participants, is_recording_enabled):
+        """Данные комнаты для LiveSmart API"""
+        return {
+            'name': f'Занятие: {lesson.title}',
+            'description': lesson.description or f'Видеоурок по курсу {lesson.group.course.title if lesson.group else "индивидуальный"}',
+            'start_time': lesson.start_time.isoformat() if lesson.start_time else None,
+            'duration': lesson.duration_minutes,
+            'max_participants': max_participants,
+            'enable_recording': is_recording_enabled,
+            'enable_chat': True,
+            'enable_screen_sharing': True,
+            'enable_whiteboard': True,
+            'enable_polls': True,
+            'password': self.generate_room_password(),
+            'metadata': {
+                'lesson_id': lesson.id,
+                'course_title': lesson.group.course.title if lesson.group and lesson.group.course else '',
+                'teacher': lesson.teacher.get_full_name() if lesson.teacher else '',
+                'lesson_type': lesson.lesson_type,
             }
-            
-            # Если LiveSmart API настроен, создаем комнату через API
-            if self.api_key and self.api_secret:
-                response = requests.post(
+        }
+    
+    def request_room(self, room_data):
+        """Создание комнаты в LiveSmart API: (room_id, join_url, host_url, room_password)"""
+        # Генерируем уникальный ID комнаты
+        room_id = str(uuid.uuid4())
+        
+        # Если LiveSmart API настроен, создаем комнату через API
+        if self.api_key and self.api_secret:
+            try:
+                response = self.http.post(
                     f'{self.base_url}/rooms',
                     headers=self.get_auth_headers(),
                     json=room_data
                 )
-                
-                if response.status_code == 201:
-                    api_response = response.json()
-                    room_id = api_response.get('id', room_id)
-                    join_url = api_response.get('join_url', '')
-                    host_url = api_response.get('host_url', '')
-                    room_password = api_response.get('password', room_data['password'])
-                else:
-                    logger.error(f"Ошибка создания комнаты в LiveSmart: {response.text}")
-                    join_url = ''
-                    host_url = ''
-                    room_password = room_data['password']
-            else:
-                # Если API не настроен, создаем тестовые данные
-                join_url = f'https://livesmart.com/join/{room_id}'
-                host_url = f'https://livesmart.com/host/{room_id}'
-                room_password = room_data['password']
+            except requests.RequestException as e:
+                logger.error(f"LiveSmart недоступен, комната не создана: {str(e)}")
+                return room_id, '', '', room_data['password']
+            
+            if response.status_code == 201:
+                api_response = response.json()
+                return (
+                    api_response.get('id', room_id),
+                    api_response.get('join_url', ''),
+                    api_response.get('host_url', ''),
+                    api_response.get('password', room_data['password'])
+                )
+            logger.error(f"Ошибка создания комнаты в LiveSmart: {response.text}")
+            return room_id, '', '', room_data['password']
+        
+        # Если API не настроен, создаем тестовые данные
+        return (
+            room_id,
+            f'https://livesmart.com/join/{room_id}',
+            f'https://livesmart.com/host/{room_id}',
+            room_data['password']
+        )
+    
+    def create_room(self, lesson, host_user=None):
+        """Создание комнаты LiveSmart для занятия"""
+        try:
+            max_participants, is_recording_enabled = self.get_room_options(host_user)
+            room_data = self.build_room_data(lesson, max_participants, is_recording_enabled)
+            room_id, join_url, host_url, room_password = self.request_room(room_data)
             
             # Создаем комнату в нашей системе
             livesmart_room = LiveSmartRoom.objects.create(
@@ -124,6 +136,83 @@ class LiveSmartService:
                 'error': str(e)
             }
     
+    def create_rooms(self, lessons, host_user=None):
+        """Комнаты для пачки занятий (серия)
+        
+        Запросы к API идут через общий пул соединений, комнаты и участники
+        сохраняются двумя bulk_create. Занятия, у которых комната уже есть,
+        пропускаются. Возвращает созданные комнаты.
+        """
+        lessons = self.lessons_without_rooms(list(lessons))
+        if not lessons:
+            return []
+        
+        max_participants, is_recording_enabled = self.get_room_options(host_user)
+        rooms = []
+        for lesson in lessons:
+            try:
+                room_data = self.build_room_data(lesson, max_participants, is_recording_enabled)
+                room_id, join_url, host_url, room_password = self.request_room(room_data)
+            except Exception as e:
+                logger.error(f"Ошибка создания комнаты LiveSmart для занятия {lesson.id}: {str(e)}")
+                continue
+            rooms.append(LiveSmartRoom(
+                lesson=lesson,
+                room_id=room_id,
+                room_name=room_data['name'],
+                join_url=join_url,
+                host_url=host_url,
+                room_password=room_password,
+                max_participants=max_participants,
+                is_recording_enabled=is_recording_enabled,
+                status='scheduled'
+            ))
+        rooms = LiveSmartRoom.objects.bulk_create(rooms)
+        
+        # Состав участников одинаков для занятий одной группы - читаем его один раз на группу
+        group_students = {}
+        participants = []
+        for room in rooms:
+            lesson = room.lesson
+            if lesson.lesson_type == 'group' and lesson.group_id:
+                if lesson.group_id not in group_students:
+                    group_students[lesson.group_id] = list(
+                        lesson.group.students.values_list('id', flat=True)
+                    )
+                student_ids = group_students[lesson.group_id]
+            elif lesson.lesson_type == 'individual' and lesson.student_id:
+                student_ids = [lesson.student_id]
+            else:
+                student_ids = []
+            
+            participants.append(LiveSmartParticipant(
+                room=room,
+                user_id=lesson.teacher_id,
+                role='host',
+                participant_id=f"host_{lesson.teacher_id}"
+            ))
+            participants.extend(
+                LiveSmartParticipant(
+                    room=room,
+                    user_id=student_id,
+                    role='participant',
+                    participant_id=f"participant_{student_id}"
+                )
+                for student_id in student_ids
+                if student_id != lesson.teacher_id
+            )
+        LiveSmartParticipant.objects.bulk_create(participants, ignore_conflicts=True)
+        
+        logger.info(f"Создано комнат LiveSmart: {len(rooms)}, участников: {len(participants)}")
+        return rooms
+    
+    def lessons_without_rooms(self, lessons):
+        """Занятия без комнаты LiveSmart (один запрос)"""
+        with_rooms = set(
+            LiveSmartRoom.objects.filter(lesson__in=lessons).values_list('lesson_id', flat=True)
+        )
+        return [lesson for lesson in lessons if lesson.id not in with_rooms]
+    
     def add_participants_to_room(self, room, lesson):
         """Добавление участников в комнату LiveSmart"""
         try:
@@ -182,15 +271,18 @@ class LiveSmartService:
             
             # Если LiveSmart API настроен, запускаем встречу через API
             if self.api_key and self.api_secret:
-                response = requests.post(
-                    f'{self.base_url}/rooms/{room.room_id}/start',
-                    headers=self.get_auth_headers()
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Комната {room.room_name} запущена через LiveSmart API")
+                try:
+                    response = self.http.post(
+                        f'{self.base_url}/rooms/{room.room_id}/start',
+                        headers=self.get_auth_headers()
+                    )
+                except requests.RequestException as e:
+                    logger.warning(f"Ошибка запуска комнаты через LiveSmart API: {str(e)}")
                 else:
-                    logger.warning(f"Ошибка запуска комнаты через LiveSmart API: {response.text}")
+                    if response.status_code == 200:
+                        logger.info(f"Комната {room.room_name} запущена через LiveSmart API")
+                    else:
+                        logger.warning(f"Ошибка запуска комнаты через LiveSmart API: {response.text}")
             
             logger.info(f"Комната {room.room_name} активирована")
             
@@ -230,15 +322,18 @@ class LiveSmartService:
             
             # Если LiveSmart API настроен, завершаем встречу через API
             if self.api_key and self.api_secret:
-                response = requests.post(
-                    f'{self.base_url}/rooms/{room.room_id}/end',
-                    headers=self.get_auth_headers()
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Комната {room.room_name} завершена через LiveSmart API")
+                try:
+                    response = self.http.post(
+                        f'{self.base_url}/rooms/{room.room_id}/end',
+                        headers=self.get_auth_headers()
+                    )
+                except requests.RequestException as e:
+                    logger.warning(f"Ошибка завершения комнаты через LiveSmart API: {str(e)}")
                 else:
-                    logger.warning(f"Ошибка завершения комнаты через LiveSmart API: {response.text}")
+                    if response.status_code == 200:
+                        logger.info(f"Комната {room.room_name} завершена через LiveSmart API")
+                    else:
+                        logger.warning(f"Ошибка завершения комнаты через LiveSmart API: {response.text}")
             
             logger.info(f"Комната {room.room_name} завершена")
             
@@ -285,22 +380,24 @@ class LiveSmartService:
             
             # Если LiveSmart API настроен, получаем ссылку через API
             if self.api_key and self.api_secret:
-                response = requests.post(
-                    f'{self.base_url}/rooms/{room.room_id}/join',
-                    headers=self.get_auth_headers(),
-                    json={
-                        'user_id': user.id,
-                        'username': user.get_full_name() or user.username,
-                        'role': participant.role
-                    }
-                )
-                
-                if response.status_code == 200:
-                    api_response = response.json()
-                    join_url = api_response.get('join_url', room.join_url)
+                join_url = room.join_url
+                try:
+                    response = self.http.post(
+                        f'{self.base_url}/rooms/{room.room_id}/join',
+                        headers=self.get_auth_headers(),
+                        json={
+                            'user_id': user.id,
+                            'username': user.get_full_name() or user.username,
+                            'role': participant.role
+                        }
+                    )
+                except requests.RequestException as e:
+                    logger.warning(f"Ошибка получения ссылки через LiveSmart API: {str(e)}")
                 else:
-                    join_url = room.join_url
-                    logger.warning(f"Ошибка получения ссылки через LiveSmart API: {response.text}")
+                    if response.status_code == 200:
+                        join_url = response.json().get('join_url', room.join_url)
+                    else:
+                        logger.warning(f"Ошибка получения ссылки через LiveSmart API: {response.text}")
             else:
                 join_url = room.join_url
             
@@ -364,14 +461,16 @@ class LiveSmartService:
         try:
             # Если LiveSmart API настроен, получаем информацию через API
             if self.api_key and self.api_secret:
-                response = requests.get(
-                    f'{self.base_url}/rooms/{room.room_id}',
-                    headers=self.get_auth_headers()
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
+                try:
+                    response = self.http.get(
+                        f'{self.base_url}/rooms/{room.room_id}',
+                        headers=self.get_auth_headers()
+                    )
+                except requests.RequestException as e:
+                    logger.warning(f"Ошибка получения информации о комнате через LiveSmart API: {str(e)}")
                 else:
+                    if response.status_code == 200:
+                        return response.json()
                     logger.warning(f"Ошибка получения информации о комнате через LiveSmart API: {response.text}")
             
             # Возвращаем информацию из нашей системы
@@ -411,7 +510,7 @@ class LiveSmartService:
                 description=recording_data.get('description', ''),
                 file_url=recording_data.get('file_url', ''),
                 file_size=recording_data.get('file_size', 0),
-                duration=recording_data.get('duration', timedelta(minutes=60)),
+                duration=recording_data.get('duration'),
                 is_public=recording_data.get('is_public', False),
                 uploaded_by=room.lesson.teacher,
                 published_at=timezone.now() if recording_data.get('is_public', False) else None
@@ -1,14 +1,13 @@
 # livesmart/signals.py
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from .models import LiveSmartRoom, LiveSmartParticipant, LiveSmartRecording, LiveSmartSettings
 from accounts.models import User
 from courses.models import Lesson, Group
 from payments.models import Payment
 import logging
+from notifications.tasks import queue_email, queue_mass_email
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +48,7 @@ def notify_room_created(sender, instance, created, **kwargs):
                 recipients.append(lesson.teacher)
             
             # Отправляем уведомления
+            emails = []
             for recipient in recipients:
                 if recipient.email:
                     try:
@@ -67,15 +67,10 @@ def notify_room_created(sender, instance, created, **kwargs):
                         С уважением,
                         Онлайн-школа
                         '''
-                        send_mail(
-                            subject,
-                            message,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [recipient.email],
-                            fail_silently=True,
-                        )
+                        emails.append((subject, message, [recipient.email]))
                     except Exception as e:
                         logger.error(f"Ошибка отправки email: {e}")
+            queue_mass_email(emails)
             
             logger.info(f"Отправлены уведомления о создании комнаты: {instance.room_name}")
             
@@ -103,13 +98,7 @@ def notify_participant_joined(sender, instance, created, **kwargs):
                     С уважением,
                     Онлайн-школа
                     '''
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [lesson.teacher.email],
-                        fail_silently=True,
-                    )
+                    queue_email(subject, message, [lesson.teacher.email])
                 except Exception as e:
                     logger.error(f"Ошибка отправки email преподавателю: {e}")
             
@@ -138,6 +127,7 @@ def notify_recording_created(sender, instance, created, **kwargs):
                 recipients.append(lesson.teacher)
             
             # Отправляем уведомления
+            emails = []
             for recipient in recipients:
                 if recipient.email:
                     try:
@@ -154,15 +144,10 @@ def notify_recording_created(sender, instance, created, **kwargs):
                         С уважением,
                         Онлайн-школа
                         '''
-                        send_mail(
-                            subject,
-                            message,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [recipient.email],
-                            fail_silently=True,
-                        )
+                        emails.append((subject, message, [recipient.email]))
                     except Exception as e:
                         logger.error(f"Ошибка отправки email: {e}")
+            queue_mass_email(emails)
             
             logger.info(f"Отправлены уведомления о записи: {instance.title}")
             
@@ -9,6 +9,10 @@ from django.utils import timezone
 from django.db.models.signals import post_save, m2m_changed
 from unittest.mock import patch
 from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
 from .models import LiveSmartRoom, LiveSmartParticipant, LiveSmartRecording, LiveSmartSettings
 
 User = get_user_model()
@@ -661,4 +665,152 @@ class LiveSmartUserTestCase(SignalFreeTestCase, TestCase):
         
         # Проверяем, что хост только один
         hosts = room.participants.filter(role='host')
-        self.assertEqual(hosts.count(), 1)
\ No newline at end of file
+        self.assertEqual(hosts.count(), 1)
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """Заглушка внешнего API: отвечает по очереди из server.responses (status, body, задержка)"""
+    
+    def handle_request(self):
+        self.server.hits.append((self.command, self.path))
+        status_code, body, delay = self.server.responses.pop(0) if self.server.responses else (200, {}, 0)
+        if delay:
+            time.sleep(delay)
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except BrokenPipeError:
+            # Клиент уже ушел по таймауту
+            pass
+    
+    do_GET = do_POST = handle_request
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class IntegrationClientTestCase(SignalFreeTestCase, APITestCase):
+    """Общий HTTP-клиент внешних API против локального сервера-заглушки"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from config import http_client
+        
+        cache.clear()
+        http_client._clients.clear()
+        self.addCleanup(http_client._clients.clear)
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubAPIHandler)
+        self.server.responses = []
+        self.server.hits = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+    
+    def make_client(self, **options):
+        from config.http_client import IntegrationClient
+        client = IntegrationClient('stub', **{'backoff': 0, **options})
+        self.addCleanup(client.session.close)
+        return client
+    
+    def test_retries_idempotent_requests_only(self):
+        client = self.make_client(retries=2)
+        self.server.responses = [(503, {}, 0), (200, {'ok': True}, 0)]
+        response = client.get(f'{self.base_url}/rooms/1')
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(len(self.server.hits), 2)
+        
+        self.server.responses = [(503, {}, 0), (201, {}, 0)]
+        self.assertEqual(client.post(f'{self.base_url}/rooms').status_code, 503)
+        self.assertEqual(len(self.server.hits), 3)
+        
+        metrics = client.metrics()
+        self.assertEqual(metrics['calls'], 3)
+        self.assertEqual(metrics['errors'], 2)
+        self.assertEqual(sum(metrics['latency_buckets'].values()), 3)
+    
+    def test_read_timeout_bounds_slow_vendor(self):
+        import requests
+        
+        client = self.make_client(read_timeout=0.2, retries=1)
+        self.server.responses = [(200, {}, 1), (200, {}, 1)]
+        started = time.monotonic()
+        with self.assertRaises(requests.ReadTimeout):
+            client.get(f'{self.base_url}/slow')
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(len(self.server.hits), 2)
+    
+    def test_circuit_breaker_fails_fast_and_recovers(self):
+        from django.core.cache import cache
+        from config.http_client import CircuitOpenError
+        
+        client = self.make_client(retries=0, failure_threshold=2)
+        self.server.responses = [(500, {}, 0), (500, {}, 0)]
+        client.post(f'{self.base_url}/rooms')
+        client.post(f'{self.base_url}/rooms')
+        with self.assertRaises(CircuitOpenError):
+            client.post(f'{self.base_url}/rooms')
+        self.assertEqual(len(self.server.hits), 2)
+        self.assertTrue(client.metrics()['circuit_open'])
+        
+        # Пробный запрос после recovery_timeout: одна ошибка снова размыкает, успех замыкает
+        cache.delete(client.key('open'))
+        self.server.responses = [(500, {}, 0)]
+        client.get(f'{self.base_url}/rooms/1')
+        self.assertTrue(client.is_open())
+        
+        # Пока пробный запрос другого воркера не завершился, остальные не отправляются
+        cache.delete(client.key('open'))
+        cache.add(client.key('trial'), 1)
+        with self.assertRaises(CircuitOpenError):
+            client.get(f'{self.base_url}/rooms/1')
+        self.assertEqual(len(self.server.hits), 3)
+        
+        cache.delete(client.key('trial'))
+        self.assertEqual(client.get(f'{self.base_url}/rooms/1').status_code, 200)
+        self.server.responses = [(500, {}, 0)]
+        client.get(f'{self.base_url}/rooms/1')
+        self.assertFalse(client.is_open())
+    
+    def test_livesmart_falls_back_when_vendor_is_down(self):
+        from django.test import override_settings
+        from courses.models import Lesson
+        from .services import LiveSmartService
+        
+        teacher = User.objects.create_user(username='teacher', password='testpass123', role='teacher')
+        lesson = Lesson.objects.create(
+            title='Занятие',
+            lesson_type='individual',
+            teacher=teacher,
+            start_time=timezone.now(),
+            end_time=timezone.now() + timedelta(hours=1)
+        )
+        room = LiveSmartRoom.objects.create(lesson=lesson, room_id='room_1', room_name='Комната')
+        
+        with override_settings(
+            LIVESMART_API_KEY='key',
+            LIVESMART_API_SECRET='secret',
+            LIVESMART_API_URL=self.base_url,
+            INTEGRATION_HTTP={'livesmart': {'retries': 0, 'failure_threshold': 1, 'backoff': 0}}
+        ):
+            service = LiveSmartService()
+            self.server.responses = [(200, {'id': 'room_1', 'status': 'active'}, 0)]
+            self.assertEqual(service.get_room_info(room), {'id': 'room_1', 'status': 'active'})
+            
+            self.server.responses = [(502, {}, 0)]
+            self.assertEqual(service.get_room_info(room)['status'], room.status)
+            # Предохранитель разомкнут: ответ из нашей БД без обращения к API
+            self.assertEqual(service.get_room_info(room)['name'], 'Комната')
+            self.assertEqual(len(self.server.hits), 2)
+            self.assertEqual(service.request_room({'password': 'secret'})[1:], ('', '', 'secret'))
+            
+            admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+            self.client.force_authenticate(user=admin)
+            metrics = self.client.get(reverse('integration-metrics')).json()['livesmart']
+            self.assertEqual((metrics['calls'], metrics['errors'], metrics['circuit_open']), (2, 1, True))
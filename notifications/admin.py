@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog
+from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog, NotificationOutbox
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -35,3 +35,10 @@ class NotificationLogAdmin(admin.ModelAdmin):
     list_filter = ['channels', 'is_read', 'sent_at', 'created_at']
     search_fields = ['notification__title', 'user__username', 'error_message']
     readonly_fields = ['created_at', 'sent_at']
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['idempotency_key', 'channel', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['channel', 'status', 'created_at']
+    search_fields = ['idempotency_key', 'notification__title', 'last_error']
+    readonly_fields = ['created_at', 'locked_at', 'sent_at']
@@ -0,0 +1,274 @@
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+# Счетчики непрочитанного живут сутки, после чего пересобираются из БД при чтении
+UNREAD_COUNTERS_TIMEOUT = 60 * 60 * 24
+# Сколько пользователей пересчитывается одним запросом при сверке
+UNREAD_RECONCILE_CHUNK_SIZE = 500
+
+NOTIFICATIONS_FIELD = 'notifications'
+# Маркер "счетчики пользователя собраны из БД"; без него хеш считается холодным
+READY_FIELD = '_ready'
+
+
+def _redis_cache_enabled():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return backend.startswith('django_redis')
+
+
+class RedisCounterStore:
+    """Хеш Redis на пользователя: поле на чат + поле уведомлений, HINCRBY атомарен"""
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+
+    @staticmethod
+    def key(user_id):
+        return f'unread:{user_id}'
+
+    def incr_many(self, deltas):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, fields in deltas.items():
+            key = self.key(user_id)
+            for field, delta in fields.items():
+                pipe.hincrby(key, field, delta)
+            pipe.expire(key, UNREAD_COUNTERS_TIMEOUT)
+        pipe.execute()
+
+    def get_all(self, user_id):
+        values = self.client.hgetall(self.key(user_id))
+        values = {field.decode(): int(value) for field, value in values.items()}
+        if READY_FIELD not in values:
+            return None
+        return values
+
+    def replace_many(self, values_by_user):
+        pipe = self.client.pipeline(transaction=True)
+        for user_id, values in values_by_user.items():
+            key = self.key(user_id)
+            pipe.delete(key)
+            pipe.hset(key, mapping={**values, READY_FIELD: 1})
+            pipe.expire(key, UNREAD_COUNTERS_TIMEOUT)
+        pipe.execute()
+
+    def set_field(self, user_id, field, value):
+        key = self.key(user_id)
+        # Поле выставляем только в уже собранном хеше, иначе оно перетрется пересборкой
+        if self.client.hexists(key, READY_FIELD):
+            self.client.hset(key, field, value)
+
+
+class CacheCounterStore:
+    """Запасное хранилище на Django cache (dev/тесты без Redis), атомарно только в пределах процесса"""
+
+    @staticmethod
+    def key(user_id):
+        return f'unread:{user_id}'
+
+    def incr_many(self, deltas):
+        for user_id, fields in deltas.items():
+            values = cache.get(self.key(user_id))
+            if values is None:
+                continue
+            for field, delta in fields.items():
+                values[field] = values.get(field, 0) + delta
+            cache.set(self.key(user_id), values, UNREAD_COUNTERS_TIMEOUT)
+
+    def get_all(self, user_id):
+        return cache.get(self.key(user_id))
+
+    def replace_many(self, values_by_user):
+        cache.set_many({
+            self.key(user_id): {**values, READY_FIELD: 1}
+            for user_id, values in values_by_user.items()
+        }, UNREAD_COUNTERS_TIMEOUT)
+
+    def set_field(self, user_id, field, value):
+        values = cache.get(self.key(user_id))
+        if values is not None:
+            values[field] = value
+            cache.set(self.key(user_id), values, UNREAD_COUNTERS_TIMEOUT)
+
+
+class UnreadCounterService:
+    """Счетчики непрочитанных сообщений по чатам и непрочитанных уведомлений
+
+    Изменения применяются после фиксации транзакции. Холодный счетчик
+    собирается из БД при первом чтении, расхождения исправляет периодическая
+    сверка reconcile_unread_counters.
+    """
+
+    @staticmethod
+    def store():
+        if _redis_cache_enabled():
+            return RedisCounterStore()
+        return CacheCounterStore()
+
+    @staticmethod
+    def room_field(room_id):
+        return f'room:{room_id}'
+
+    @staticmethod
+    def apply(deltas):
+        """Применить изменения {user_id: {поле: дельта}} после фиксации транзакции"""
+        deltas = {
+            user_id: {field: delta for field, delta in fields.items() if delta}
+            for user_id, fields in deltas.items()
+        }
+        deltas = {user_id: fields for user_id, fields in deltas.items() if fields}
+        if not deltas:
+            return
+
+        def update():
+            try:
+                UnreadCounterService.store().incr_many(deltas)
+            except Exception as e:
+                # Счетчик - производные данные, запрос из-за него не роняем
+                logger.error(f"Ошибка обновления счетчиков непрочитанного: {str(e)}")
+
+        transaction.on_commit(update, robust=True)
+
+    @staticmethod
+    def message_created(message, recipient_ids=None):
+        """Новое сообщение: +1 в чате для всех участников, кроме отправителя"""
+        if recipient_ids is None:
+            recipient_ids = message.room.participants.exclude(
+                id=message.sender_id
+            ).values_list('id', flat=True)
+        field = UnreadCounterService.room_field(message.room_id)
+        UnreadCounterService.apply({user_id: {field: 1} for user_id in recipient_ids})
+
+    @staticmethod
+    def messages_read(user_id, room_id, count):
+        """Пользователь прочитал count сообщений в чате"""
+        UnreadCounterService.apply({user_id: {UnreadCounterService.room_field(room_id): -count}})
+
+    @staticmethod
+    def room_read(user_id, room_id):
+        """Пользователь прочитал все сообщения в чате - счетчик известен точно"""
+        field = UnreadCounterService.room_field(room_id)
+
+        def update():
+            try:
+                UnreadCounterService.store().set_field(user_id, field, 0)
+            except Exception as e:
+                logger.error(f"Ошибка обновления счетчиков непрочитанного: {str(e)}")
+
+        transaction.on_commit(update, robust=True)
+
+    @staticmethod
+    def notifications_created(user_ids):
+        """Новые непрочитанные уведомления (список id получателей, с повторами)"""
+        UnreadCounterService.apply({
+            user_id: {NOTIFICATIONS_FIELD: count}
+            for user_id, count in Counter(user_ids).items()
+        })
+
+    @staticmethod
+    def notifications_read(user_id, count):
+        UnreadCounterService.apply({user_id: {NOTIFICATIONS_FIELD: -count}})
+
+    @staticmethod
+    def get_counts(user_id):
+        """Все счетчики пользователя, при холодном хеше - пересборка из БД"""
+        values = None
+        try:
+            values = UnreadCounterService.store().get_all(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка чтения счетчиков непрочитанного: {str(e)}")
+        if values is None:
+            values = UnreadCounterService.rebuild([user_id])[user_id]
+        return values
+
+    @staticmethod
+    def get_room_counts(user_id):
+        """Непрочитанные сообщения по чатам: {room_id: count}"""
+        prefix = UnreadCounterService.room_field('')
+        return {
+            int(field[len(prefix):]): max(value, 0)
+            for field, value in UnreadCounterService.get_counts(user_id).items()
+            if field.startswith(prefix)
+        }
+
+    @staticmethod
+    def get_notification_count(user_id):
+        return max(UnreadCounterService.get_counts(user_id).get(NOTIFICATIONS_FIELD, 0), 0)
+
+    @staticmethod
+    def count_from_db(user_ids):
+        """Точные значения счетчиков из БД: два запроса на пачку пользователей"""
+        from chat.models import ChatRoom, Message, MessageReadStatus
+        from .models import Notification
+
+        user_ids = list(user_ids)
+        values = defaultdict(dict, {user_id: {NOTIFICATIONS_FIELD: 0} for user_id in user_ids})
+
+        # Сообщения чата, которые участник не отправлял и не отмечал прочитанными
+        unread_messages = Message.objects.filter(
+            room_id=OuterRef('chatroom_id')
+        ).exclude(
+            sender_id=OuterRef('user_id')
+        ).filter(
+            ~Exists(MessageReadStatus.objects.filter(
+                message_id=OuterRef('pk'),
+                user_id=OuterRef(OuterRef('user_id'))
+            ))
+        ).order_by().values('room_id').annotate(count=Count('pk')).values('count')
+
+        memberships = ChatRoom.participants.through.objects.filter(
+            user_id__in=user_ids,
+            chatroom__is_active=True
+        ).annotate(
+            unread=Coalesce(Subquery(unread_messages, output_field=IntegerField()), 0)
+        ).values_list('user_id', 'chatroom_id', 'unread')
+        for user_id, room_id, unread in memberships:
+            values[user_id][UnreadCounterService.room_field(room_id)] = unread
+
+        notifications = Notification.objects.filter(
+            user_id__in=user_ids,
+            is_read=False
+        ).order_by().values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        for user_id, count in notifications:
+            values[user_id][NOTIFICATIONS_FIELD] = count
+
+        return dict(values)
+
+    @staticmethod
+    def rebuild(user_ids):
+        """Пересобрать счетчики пользователей из БД и сохранить их"""
+        values = UnreadCounterService.count_from_db(user_ids)
+        try:
+            UnreadCounterService.store().replace_many(values)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения счетчиков непрочитанного: {str(e)}")
+        return values
+
+    @staticmethod
+    def reconcile(chunk_size=UNREAD_RECONCILE_CHUNK_SIZE):
+        """Сверка: пересобрать счетчики всех активных пользователей пачками"""
+        from accounts.models import User
+
+        user_ids = User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+        chunk = []
+        total = 0
+        for user_id in user_ids.iterator(chunk_size=chunk_size):
+            chunk.append(user_id)
+            if len(chunk) >= chunk_size:
+                UnreadCounterService.rebuild(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            UnreadCounterService.rebuild(chunk)
+            total += len(chunk)
+
+        logger.info(f"Счетчики непрочитанного пересобраны для {total} пользователей")
+        return total
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.utils import timezone
 from datetime import datetime, timedelta
 
 User = settings.AUTH_USER_MODEL
@@ -174,6 +175,7 @@ class Notification(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'is_read']),
+            models.Index(fields=['user', 'created_at', 'id']),
             models.Index(fields=['created_at']),
             models.Index(fields=['notification_type']),
             models.Index(fields=['is_sent']),
@@ -397,4 +399,73 @@ class NotificationLog(models.Model):
         ]
     
     def __str__(self):
-        return f"Лог {self.notification.title} - {self.user.get_full_name() or self.user.username}"
\ No newline at end of file
+        return f"Лог {self.notification.title} - {self.user.get_full_name() or self.user.username}"
+
+class NotificationOutbox(models.Model):
+    """Исходящая очередь доставки уведомления по одному каналу"""
+    STATUS_CHOICES = [
+        ('pending', _('Ожидает отправки')),
+        ('processing', _('Отправляется')),
+        ('sent', _('Отправлено')),
+        ('failed', _('Ошибка')),
+    ]
+    
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name='outbox',
+        verbose_name=_('Уведомление')
+    )
+    channel = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_CHANNEL_CHOICES,
+        verbose_name=_('Канал')
+    )
+    idempotency_key = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name=_('Ключ идемпотентности')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_('Статус')
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Попыток отправки')
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Доступно для отправки с')
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Взято в работу')
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата отправки')
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_('Последняя ошибка')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    
+    class Meta:
+        verbose_name = _('Исходящее уведомление')
+        verbose_name_plural = _('Исходящие уведомления')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.idempotency_key} - {self.get_status_display()}"
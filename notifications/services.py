@@ -1,78 +1,117 @@
 import logging
-from django.core.mail import send_mail
+import time
+from datetime import timedelta
+from django.core.mail import get_connection, send_mail
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
-from .models import Notification, NotificationLog, UserNotificationSettings
+from .counters import UnreadCounterService
+from .models import Notification, NotificationLog, NotificationOutbox, UserNotificationSettings
 from accounts.models import User
 
 logger = logging.getLogger(__name__)
 
+# Размер пачки для массовой отправки (пользователи / строки bulk_create)
+BULK_CHUNK_SIZE = 500
+
+SETTINGS_CACHE_TIMEOUT = 60 * 60
+
+# Outbox: размер пачки, число попыток и пауза перед повтором (растет экспоненциально)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+# Через сколько строка, зависшая в обработке (упавший воркер), снова доступна
+OUTBOX_LEASE_TIMEOUT = timedelta(minutes=10)
+
+
+class NotificationSettingsCache:
+    """Настройки уведомлений: память текущего вызова + общий кеш по id пользователя"""
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'notifications:settings:{user_id}'
+    
+    @staticmethod
+    def get(user, memo=None):
+        """Получить настройки пользователя, создав их при отсутствии"""
+        if memo is not None and user.id in memo:
+            return memo[user.id]
+        
+        key = NotificationSettingsCache.cache_key(user.id)
+        values = cache.get(key)
+        if values is None:
+            settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+            values = {
+                field.attname: getattr(settings_obj, field.attname)
+                for field in UserNotificationSettings._meta.concrete_fields
+            }
+            cache.set(key, values, SETTINGS_CACHE_TIMEOUT)
+        else:
+            settings_obj = UserNotificationSettings.from_db('default', list(values), list(values.values()))
+        
+        if memo is not None:
+            memo[user.id] = settings_obj
+        return settings_obj
+    
+    @staticmethod
+    def invalidate(user_id):
+        """Сбросить кеш настроек пользователя"""
+        cache.delete(NotificationSettingsCache.cache_key(user_id))
+
+
 class NotificationService:
     """Сервис для отправки уведомлений"""
     
     @staticmethod
     def send_notification(user, title, message, notification_type='info', channels=None):
-        """Отправка уведомления пользователю"""
+        """Отправка уведомления пользователю
+        
+        Уведомление сохраняется в БД, доставку по каналам выполняет
+        NotificationOutboxService после фиксации транзакции.
+        """
         if channels is None:
             channels = ['in_app']
         
-        # Создаем уведомление в БД
-        notification = Notification.objects.create(
+        return Notification.objects.create(
             user=user,
             title=title,
             message=message,
             notification_type=notification_type,
-            channels=channels[0] if channels else 'in_app'
+            channels=channels
         )
-        
-        # Отправляем через указанные каналы
-        for channel in channels:
-            try:
-                if channel == 'email':
-                    NotificationService._send_email(user, title, message, notification)
-                elif channel == 'telegram':
-                    NotificationService._send_telegram(user, title, message, notification)
-                elif channel == 'whatsapp':
-                    NotificationService._send_whatsapp(user, title, message, notification)
-                elif channel == 'sms':
-                    NotificationService._send_sms(user, title, message, notification)
-                elif channel == 'in_app':
-                    # In-app уведомление уже создано
-                    pass
-                elif channel == 'push':
-                    NotificationService._send_push(user, title, message, notification)
-                
-                # Логируем успешную отправку
-                NotificationLog.objects.create(
-                    notification=notification,
-                    user=user,
-                    title=title,
-                    message=message,
-                    notification_type=notification_type,
-                    channels=[channel],
-                    sent_at=timezone.now()
-                )
-                
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления через {channel}: {str(e)}")
-                # Логируем ошибку
-                NotificationLog.objects.create(
-                    notification=notification,
-                    user=user,
-                    title=title,
-                    message=message,
-                    notification_type=notification_type,
-                    channels=[channel],
-                    error_message=str(e)
-                )
-        
-        return notification
     
     @staticmethod
-    def _send_email(user, title, message, notification):
+    def create_notifications(notifications):
+        """Сохранить пачку уведомлений одним запросом и поставить их в outbox"""
+        if not notifications:
+            return []
+        notifications = Notification.objects.bulk_create(notifications)
+        NotificationOutboxService.enqueue(notifications)
+        UnreadCounterService.notifications_created([notification.user_id for notification in notifications])
+        return notifications
+    
+    @staticmethod
+    def deliver(notification, channel, settings_obj=None, connection=None):
+        """Доставка уведомления через один канал"""
+        args = (notification.user, notification.title, notification.message, notification, settings_obj)
+        if channel == 'email':
+            NotificationService._send_email(*args, connection=connection)
+        elif channel == 'telegram':
+            NotificationService._send_telegram(*args)
+        elif channel == 'whatsapp':
+            NotificationService._send_whatsapp(*args)
+        elif channel == 'sms':
+            NotificationService._send_sms(*args)
+        elif channel == 'push':
+            NotificationService._send_push(*args)
+    
+    @staticmethod
+    def _send_email(user, title, message, notification, settings_obj=None, connection=None):
         """Отправка email уведомления"""
         # Проверяем настройки пользователя
-        settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+        settings_obj = settings_obj or NotificationSettingsCache.get(user)
         if not settings_obj.email_notifications:
             return
         
@@ -83,16 +122,17 @@ class NotificationService:
                     message=message,
                     from_email=settings.DEFAULT_FROM_EMAIL,
                     recipient_list=[user.email],
-                    fail_silently=True,
+                    fail_silently=False,
+                    connection=connection,
                 )
             except Exception as e:
                 raise Exception(f"Ошибка отправки email: {str(e)}")
     
     @staticmethod
-    def _send_telegram(user, title, message, notification):
+    def _send_telegram(user, title, message, notification, settings_obj=None):
         """Отправка Telegram уведомления"""
         # Проверяем настройки пользователя
-        settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+        settings_obj = settings_obj or NotificationSettingsCache.get(user)
         if not settings_obj.telegram_notifications or not settings_obj.telegram_chat_id:
             return
         
@@ -101,10 +141,10 @@ class NotificationService:
         logger.info(f"Telegram уведомление для {user.username}: {title}")
     
     @staticmethod
-    def _send_whatsapp(user, title, message, notification):
+    def _send_whatsapp(user, title, message, notification, settings_obj=None):
         """Отправка WhatsApp уведомления"""
         # Проверяем настройки пользователя
-        settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+        settings_obj = settings_obj or NotificationSettingsCache.get(user)
         if not settings_obj.whatsapp_notifications or not settings_obj.whatsapp_phone:
             return
         
@@ -113,10 +153,10 @@ class NotificationService:
         logger.info(f"WhatsApp уведомление для {user.username}: {title}")
     
     @staticmethod
-    def _send_sms(user, title, message, notification):
+    def _send_sms(user, title, message, notification, settings_obj=None):
         """Отправка SMS уведомления"""
         # Проверяем настройки пользователя
-        settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+        settings_obj = settings_obj or NotificationSettingsCache.get(user)
         if not settings_obj.sms_notifications or not settings_obj.sms_phone:
             return
         
@@ -125,10 +165,10 @@ class NotificationService:
         logger.info(f"SMS уведомление для {user.username}: {title}")
     
     @staticmethod
-    def _send_push(user, title, message, notification):
+    def _send_push(user, title, message, notification, settings_obj=None):
         """Отправка push-уведомления"""
         # Проверяем настройки пользователя
-        settings_obj, created = UserNotificationSettings.objects.get_or_create(user=user)
+        settings_obj = settings_obj or NotificationSettingsCache.get(user)
         if not settings_obj.push_notifications:
             return
         
@@ -136,29 +176,271 @@ class NotificationService:
         # Пока заглушка
         logger.info(f"Push уведомление для {user.username}: {title}")
     
+    @staticmethod
+    def is_channel_enabled(user, settings_obj, channel):
+        """Проверка, включен ли канал в настройках пользователя"""
+        if channel == 'in_app':
+            return True
+        if channel == 'email':
+            return settings_obj.email_notifications and bool(user.email)
+        if channel == 'telegram':
+            return settings_obj.telegram_notifications and bool(settings_obj.telegram_chat_id)
+        if channel == 'whatsapp':
+            return settings_obj.whatsapp_notifications and bool(settings_obj.whatsapp_phone)
+        if channel == 'sms':
+            return settings_obj.sms_notifications and bool(settings_obj.sms_phone)
+        if channel == 'push':
+            return settings_obj.push_notifications
+        return False
+    
     @staticmethod
     def send_bulk_notification(user_ids=None, roles=None, title=None, message=None, 
                              notification_type='info', channels=None):
         """Массовая отправка уведомлений"""
-        if channels is None:
-            channels = ['in_app']
-        
-        # Получаем пользователей
-        users = User.objects.all()
+        # Получаем пользователей вместе с настройками уведомлений
+        users = User.objects.select_related('notification_settings').order_by('id')
         if user_ids:
             users = users.filter(id__in=user_ids)
         if roles:
             users = users.filter(role__in=roles)
         
-        notifications = []
-        for user in users:
-            notification = NotificationService.send_notification(
-                user=user,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                channels=channels
+        recipients = (
+            (user, title, message)
+            for user in users.iterator(chunk_size=BULK_CHUNK_SIZE)
+        )
+        return NotificationService.send_bulk(recipients, notification_type, channels)
+    
+    @staticmethod
+    def send_bulk(recipients, notification_type='info', channels=None):
+        """Массовая отправка: recipients - последовательность (user, title, message).
+        
+        Пользователи должны быть загружены с select_related('notification_settings').
+        Возвращает счетчики отправки.
+        """
+        if channels is None:
+            channels = ['in_app']
+        
+        stats = {
+            'recipients': 0,
+            'notifications': 0,
+            'logs': 0,
+            'queued': 0,
+            'skipped': 0,
+        }
+        started = time.monotonic()
+        
+        chunk = []
+        for recipient in recipients:
+            chunk.append(recipient)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                NotificationService._send_bulk_chunk(chunk, notification_type, channels, stats)
+                chunk = []
+        if chunk:
+            NotificationService._send_bulk_chunk(chunk, notification_type, channels, stats)
+        
+        stats['duration'] = round(time.monotonic() - started, 3)
+        stats['per_second'] = round(stats['notifications'] / stats['duration'], 1) if stats['duration'] else stats['notifications']
+        logger.info(
+            f"Массовая рассылка: {stats['notifications']} уведомлений, {stats['queued']} в очереди доставки "
+            f"за {stats['duration']} с ({stats['per_second']} уведомлений/с)"
+        )
+        return stats
+    
+    @staticmethod
+    def _send_bulk_chunk(chunk, notification_type, channels, stats):
+        """Сохранение одной пачки уведомлений и постановка ее в outbox"""
+        now = timezone.now()
+        
+        # Настройки по умолчанию для пользователей, у которых их еще нет
+        settings_by_user = {}
+        missing_settings = []
+        for user, title, message in chunk:
+            try:
+                settings_by_user[user.id] = user.notification_settings
+            except UserNotificationSettings.DoesNotExist:
+                settings_obj = UserNotificationSettings(user=user)
+                settings_by_user[user.id] = settings_obj
+                missing_settings.append(settings_obj)
+        if missing_settings:
+            UserNotificationSettings.objects.bulk_create(missing_settings, ignore_conflicts=True)
+        
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    user=user,
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    channels=channels
+                )
+                for user, title, message in chunk
+            ])
+            
+            # In-app доставлено созданием уведомления, внешние каналы доставляет
+            # и пишет в лог outbox - с повторами, как и одиночные уведомления
+            logs = []
+            for notification in notifications:
+                user = notification.user
+                for channel in channels:
+                    if not NotificationService.is_channel_enabled(user, settings_by_user[user.id], channel):
+                        stats['skipped'] += 1
+                    elif channel == 'in_app':
+                        logs.append(NotificationLog(
+                            notification=notification,
+                            user=user,
+                            title=notification.title,
+                            message=notification.message,
+                            notification_type=notification_type,
+                            channels=[channel],
+                            sent_at=now
+                        ))
+            NotificationLog.objects.bulk_create(logs, batch_size=BULK_CHUNK_SIZE)
+            stats['queued'] += NotificationOutboxService.enqueue(notifications)
+            UnreadCounterService.notifications_created([notification.user_id for notification in notifications])
+        
+        stats['recipients'] += len(chunk)
+        stats['notifications'] += len(notifications)
+        stats['logs'] += len(logs)
+
+
+class NotificationOutboxService:
+    """Transactional outbox: каждое уведомление доставляется по каждому каналу один раз"""
+    
+    @staticmethod
+    def idempotency_key(notification, channel):
+        return f'notification:{notification.id}:{channel}'
+    
+    @staticmethod
+    def enqueue(notifications):
+        """Создать строки outbox в текущей транзакции и запланировать доставку после commit"""
+        rows = []
+        in_app_only = []
+        for notification in notifications:
+            channels = notification.channels or ['in_app']
+            if isinstance(channels, str):
+                channels = [channels]
+            external_channels = [channel for channel in dict.fromkeys(channels) if channel != 'in_app']
+            if not external_channels:
+                in_app_only.append(notification.id)
+                continue
+            rows.extend(
+                NotificationOutbox(
+                    notification=notification,
+                    channel=channel,
+                    idempotency_key=NotificationOutboxService.idempotency_key(notification, channel)
+                )
+                for channel in external_channels
             )
-            notifications.append(notification)
         
-        return notifications
\ No newline at end of file
+        if in_app_only:
+            # In-app уведомление доставлено самим фактом создания
+            Notification.objects.filter(id__in=in_app_only, is_sent=False).update(is_sent=True, sent_at=timezone.now())
+        
+        if rows:
+            NotificationOutbox.objects.bulk_create(rows, ignore_conflicts=True)
+            from .tasks import dispatch_notification_outbox
+            transaction.on_commit(dispatch_notification_outbox.delay, robust=True)
+        return len(rows)
+    
+    @staticmethod
+    def claim(limit=OUTBOX_BATCH_SIZE):
+        """Забрать пачку строк в работу (SELECT ... FOR UPDATE SKIP LOCKED)"""
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                NotificationOutbox.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('notification__user')
+                .filter(
+                    Q(status='pending', available_at__lte=now) |
+                    Q(status='processing', locked_at__lt=now - OUTBOX_LEASE_TIMEOUT)
+                )
+                .order_by('id')[:limit]
+            )
+            if rows:
+                NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                    status='processing',
+                    locked_at=now,
+                    attempts=F('attempts') + 1
+                )
+        for row in rows:
+            row.status = 'processing'
+            row.locked_at = now
+            row.attempts += 1
+        return rows
+    
+    @staticmethod
+    def dispatch(limit=OUTBOX_BATCH_SIZE):
+        """Доставить одну пачку. Возвращает количество обработанных строк"""
+        rows = NotificationOutboxService.claim(limit)
+        if not rows:
+            return 0
+        
+        now = timezone.now()
+        settings_memo = {}
+        logs = []
+        
+        # Все письма пачки уходят через одно SMTP соединение; если оно не открылось,
+        # строки пачки сразу возвращаются на повтор, а не ждут истечения аренды
+        connection = get_connection()
+        connection_error = None
+        if any(row.channel == 'email' for row in rows):
+            try:
+                connection.open()
+            except Exception as e:
+                logger.error(f"Ошибка подключения к SMTP: {str(e)}")
+                connection_error = e
+        try:
+            for row in rows:
+                notification = row.notification
+                try:
+                    if connection_error is not None and row.channel == 'email':
+                        raise Exception(f"Ошибка подключения к SMTP: {str(connection_error)}")
+                    settings_obj = NotificationSettingsCache.get(notification.user, settings_memo)
+                    NotificationService.deliver(notification, row.channel, settings_obj, connection=connection)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки уведомления {row.idempotency_key}: {str(e)}")
+                    NotificationOutboxService._schedule_retry(row, now, str(e), logs)
+                else:
+                    row.status = 'sent'
+                    row.sent_at = now
+                    row.last_error = ''
+                    logs.append(NotificationOutboxService._log(row, sent_at=now))
+        finally:
+            connection.close()
+        
+        NotificationOutbox.objects.bulk_update(rows, ['status', 'sent_at', 'last_error', 'available_at'])
+        NotificationLog.objects.bulk_create(logs)
+        
+        # Уведомление отправлено, когда доставлены все его каналы
+        sent_ids = {row.notification_id for row in rows if row.status == 'sent'}
+        if sent_ids:
+            Notification.objects.filter(id__in=sent_ids, is_sent=False).exclude(
+                outbox__status__in=['pending', 'processing', 'failed']
+            ).update(is_sent=True, sent_at=now)
+        return len(rows)
+    
+    @staticmethod
+    def _schedule_retry(row, now, error, logs):
+        """Вернуть строку на повтор с экспоненциальной паузой или пометить ее failed"""
+        row.last_error = error
+        if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+            row.status = 'failed'
+            logs.append(NotificationOutboxService._log(row, error_message=error))
+        else:
+            row.status = 'pending'
+            row.available_at = now + timedelta(seconds=OUTBOX_RETRY_DELAY * 2 ** (row.attempts - 1))
+    
+    @staticmethod
+    def _log(row, sent_at=None, error_message=''):
+        notification = row.notification
+        return NotificationLog(
+            notification=notification,
+            user=notification.user,
+            title=notification.title,
+            message=notification.message,
+            notification_type=notification.notification_type,
+            channels=[row.channel],
+            sent_at=sent_at,
+            error_message=error_message
+        )
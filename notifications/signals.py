@@ -1,33 +1,24 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from django.utils import timezone
 from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog
+from .counters import UnreadCounterService
 from accounts.models import User
 from courses.models import Lesson, Course, Group
+from courses.signals import attendance_marked, lesson_recipients, lesson_series_created
 from payments.models import Payment
 
 @receiver(post_save, sender=Notification)
 def send_notification_via_channels(sender, instance, created, **kwargs):
-    """Отправка уведомления через различные каналы"""
+    """Постановка уведомления в outbox для доставки по каналам"""
     if created and not instance.is_sent:
-        from .services import NotificationService
-        
-        # Отправляем уведомление через сервис
-        try:
-            NotificationService.send_notification(
-                user=instance.user,
-                title=instance.title,
-                message=instance.message,
-                notification_type=instance.notification_type,
-                channels=instance.channels
-            )
-            instance.is_sent = True
-            instance.sent_at = timezone.now()
-            instance.save()
-        except Exception as e:
-            print(f"Ошибка отправки уведомления: {e}")
+        from .services import NotificationOutboxService
+        NotificationOutboxService.enqueue([instance])
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    """Учет нового непрочитанного уведомления в счетчике"""
+    if created and not instance.is_read:
+        UnreadCounterService.notifications_created([instance.user_id])
 
 @receiver(post_save, sender=Lesson)
 def notify_lesson_scheduled(sender, instance, created, **kwargs):
@@ -45,15 +36,59 @@ def notify_lesson_scheduled(sender, instance, created, **kwargs):
         if instance.teacher not in recipients:
             recipients.append(instance.teacher)
         
-        for recipient in recipients:
-            # Создаем уведомление
-            Notification.objects.create(
+        # Создаем уведомления одной пачкой и ставим их в outbox
+        from .services import NotificationService
+        NotificationService.create_notifications([
+            Notification(
                 user=recipient,
                 title='Новое занятие',
                 message=f'Запланировано новое занятие "{instance.title}" на {instance.start_time.strftime("%d.%m.%Y %H:%M")}',
                 notification_type='lesson',
                 channels=['email', 'in_app']
             )
+            for recipient in recipients
+        ])
+
+@receiver(lesson_series_created)
+def notify_lesson_series_scheduled(sender, series, lessons, **kwargs):
+    """Одно уведомление на получателя о серии занятий
+    
+    Расписание уходит письмом из courses, поэтому здесь только in_app.
+    """
+    if not lessons:
+        return
+    from .services import NotificationService
+    NotificationService.create_notifications([
+        Notification(
+            user=recipient,
+            title='Новые занятия',
+            message=(
+                f'Запланировано занятий "{series.title}": {len(lessons)}, '
+                f'с {lessons[0].start_time.strftime("%d.%m.%Y")} по {lessons[-1].start_time.strftime("%d.%m.%Y")}'
+            ),
+            notification_type='lesson',
+            channels=['in_app']
+        )
+        for recipient in lesson_recipients(series)
+    ])
+
+@receiver(attendance_marked)
+def notify_attendance_comments(sender, lesson, attendances, notify_comments=False, **kwargs):
+    """Уведомления о комментариях преподавателя к посещаемости одной пачкой"""
+    if not notify_comments:
+        return
+    from .services import NotificationService
+    NotificationService.create_notifications([
+        Notification(
+            user=attendance.student,
+            title=f'Комментарий к занятию: {lesson.title}',
+            message=f'Преподаватель оставил комментарий: {attendance.comment}',
+            notification_type='info',
+            channels=['email', 'in_app']
+        )
+        for attendance in attendances
+        if attendance.comment
+    ])
 
 @receiver(post_save, sender=Payment)
 def notify_payment_status(sender, instance, created, **kwargs):
@@ -85,4 +120,11 @@ def notify_payment_status(sender, instance, created, **kwargs):
 def create_default_notification_settings(sender, instance, created, **kwargs):
     """Создание настроек уведомлений по умолчанию для нового пользователя"""
     if created:
-        UserNotificationSettings.objects.get_or_create(user=instance)
\ No newline at end of file
+        UserNotificationSettings.objects.get_or_create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=UserNotificationSettings)
+def invalidate_notification_settings_cache(sender, instance, **kwargs):
+    """Любое изменение настроек (API, админка, shell) сбрасывает их кеш"""
+    from .services import NotificationSettingsCache
+    NotificationSettingsCache.invalidate(instance.user_id)
\ No newline at end of file
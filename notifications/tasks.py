@@ -0,0 +1,110 @@
+import logging
+from smtplib import SMTPException, SMTPRecipientsRefused
+
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RETRY_BACKOFF = 30
+EMAIL_RETRY_BACKOFF_MAX = 60 * 30
+EMAIL_MAX_RETRIES = 6
+
+
+def queue_email(subject, message, recipient_list):
+    """Поставить письмо в очередь на отправку после фиксации транзакции"""
+    queue_mass_email([(subject, message, recipient_list)])
+
+
+def queue_mass_email(datatuple):
+    """Поставить пачку писем (subject, message, recipient_list) в очередь после фиксации транзакции"""
+    messages = [
+        [subject, message, list(recipient_list)]
+        for subject, message, recipient_list in datatuple
+        if recipient_list
+    ]
+    if not messages:
+        return
+
+    batch_size = max(getattr(settings, 'EMAIL_BATCH_SIZE', 100), 1)
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        transaction.on_commit(lambda batch=batch: send_email_batch.delay(batch), robust=True)
+
+
+@shared_task(bind=True, max_retries=EMAIL_MAX_RETRIES, ignore_result=True)
+def send_email_batch(self, messages):
+    """Отправить пачку писем через одно SMTP соединение"""
+    sent = 0
+    index = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for index, (subject, message, recipient_list) in enumerate(messages):
+            email = EmailMessage(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                recipient_list,
+                connection=connection,
+            )
+            try:
+                sent += email.send()
+            except SMTPRecipientsRefused as e:
+                # Адрес отклонен сервером - повтор не поможет
+                logger.warning(f"Письмо '{subject}' отклонено для {recipient_list}: {e}")
+    except (SMTPException, OSError) as e:
+        # Повторяем только неотправленный остаток пачки
+        countdown = get_exponential_backoff_interval(
+            factor=EMAIL_RETRY_BACKOFF,
+            retries=self.request.retries,
+            maximum=EMAIL_RETRY_BACKOFF_MAX,
+            full_jitter=True,
+        )
+        logger.warning(
+            f"Ошибка отправки email, повтор через {countdown} с "
+            f"({len(messages) - index} писем): {e}"
+        )
+        raise self.retry(args=[messages[index:]], exc=e, countdown=countdown)
+    finally:
+        connection.close()
+
+    logger.info(f"Отправлено писем: {sent} из {len(messages)}")
+    return sent
+
+
+@shared_task
+def send_bulk_notification_task(user_ids=None, roles=None, title=None, message=None,
+                                notification_type='info', channels=None):
+    """Массовая рассылка уведомлений в фоне"""
+    from .services import NotificationService
+
+    return NotificationService.send_bulk_notification(
+        user_ids=user_ids,
+        roles=roles,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        channels=channels,
+    )
+
+
+@shared_task(ignore_result=True)
+def dispatch_notification_outbox(max_batches=10):
+    """Доставка уведомлений из outbox"""
+    from .services import NotificationOutboxService
+
+    for _ in range(max_batches):
+        if not NotificationOutboxService.dispatch():
+            break
+
+
+@shared_task(ignore_result=True)
+def reconcile_unread_counters():
+    """Сверка счетчиков непрочитанного с БД"""
+    from .counters import UnreadCounterService
+
+    return UnreadCounterService.reconcile()
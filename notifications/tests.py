@@ -6,7 +6,7 @@ from rest_framework import status
 from django.urls import reverse
 from django.utils import timezone
 from django.db.models.signals import post_save, m2m_changed
-from .models import Notification, NotificationTemplate, UserNotificationSettings
+from .models import Notification, NotificationLog, NotificationTemplate, UserNotificationSettings
 
 User = get_user_model()
 
@@ -166,4 +166,392 @@ class NotificationsAPITestCase(SignalFreeTestCase, APITestCase):
         self.assertIn(response.status_code, [
             status.HTTP_401_UNAUTHORIZED,
             status.HTTP_403_FORBIDDEN
-        ])
\ No newline at end of file
+        ])
+
+
+class EmailPipelineTestCase(SignalFreeTestCase, TestCase):
+    """Тесты очереди отправки email"""
+    
+    def test_send_email_batch_uses_one_connection(self):
+        """Пачка писем уходит через одно соединение"""
+        from unittest import mock
+        from django.core import mail
+        from .tasks import send_email_batch
+        
+        messages = [
+            ['Тема 1', 'Текст 1', ['one@test.com']],
+            ['Тема 2', 'Текст 2', ['two@test.com']],
+            ['Тема 3', 'Текст 3', ['three@test.com']],
+        ]
+        with mock.patch('notifications.tasks.get_connection', wraps=mail.get_connection) as get_connection:
+            sent = send_email_batch.delay(messages).get()
+        
+        self.assertEqual(sent, 3)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual([email.to for email in mail.outbox], [['one@test.com'], ['two@test.com'], ['three@test.com']])
+    
+    def test_queue_mass_email_waits_for_commit(self):
+        """Письма отправляются только после фиксации транзакции"""
+        from django.core import mail
+        from .tasks import queue_mass_email
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            queue_mass_email([
+                ('Тема', 'Текст', ['one@test.com']),
+                ('Тема', 'Текст', []),
+            ])
+            self.assertEqual(len(mail.outbox), 0)
+        
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_lesson_signal_queues_emails(self):
+        """Сигнал создания занятия не отправляет письма синхронно"""
+        import datetime
+        from django.core import mail
+        from courses.models import Course, Group, Lesson
+        
+        teacher = User.objects.create_user(username='teacher', email='teacher@test.com', password='pass', role='teacher')
+        course = Course.objects.create(title='Курс', description='Описание', price=100, duration_hours=10, level='beginner')
+        group = Group.objects.create(
+            title='Группа',
+            course=course,
+            teacher=teacher,
+            start_date=datetime.date.today(),
+            end_date=datetime.date.today()
+        )
+        students = [
+            User.objects.create_user(username=f'student{i}', email=f'student{i}@test.com', password='pass', role='student')
+            for i in range(3)
+        ]
+        group.students.add(*students)
+        
+        # Включаем только проверяемый сигнал
+        from courses.signals import notify_lesson_created
+        post_save.connect(notify_lesson_created, sender=Lesson)
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(
+                title='Занятие',
+                lesson_type='group',
+                group=group,
+                teacher=teacher,
+                start_time=timezone.now(),
+                end_time=timezone.now() + datetime.timedelta(hours=1)
+            )
+            self.assertEqual(len(mail.outbox), 0)
+        
+        recipients = {email.to[0] for email in mail.outbox if email.subject == 'Новое занятие: Занятие'}
+        self.assertEqual(recipients, {'teacher@test.com', 'student0@test.com', 'student1@test.com', 'student2@test.com'})
+
+class BulkNotificationTestCase(SignalFreeTestCase, TestCase):
+    """Тесты массовой рассылки"""
+    
+    def create_students(self, count, prefix):
+        return [
+            User.objects.create_user(
+                username=f'{prefix}{i}',
+                email=f'{prefix}{i}@test.com',
+                password='testpass123',
+                role='student'
+            )
+            for i in range(count)
+        ]
+    
+    def send(self, users, channels=('in_app', 'email'), deliver=True):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import NotificationService
+        
+        with CaptureQueriesContext(connection) as context, \
+                self.captureOnCommitCallbacks(execute=deliver):
+            stats = NotificationService.send_bulk_notification(
+                user_ids=[user.id for user in users],
+                title='Объявление',
+                message='Текст объявления',
+                channels=list(channels)
+            )
+        return stats, len(context)
+    
+    def test_bulk_notification(self):
+        """Уведомления и логи создаются пачками, письма уходят через outbox"""
+        from django.core import mail
+        
+        users = self.create_students(5, 'student')
+        UserNotificationSettings.objects.create(user=users[0], email_notifications=False)
+        
+        stats, _ = self.send(users)
+        
+        self.assertEqual(stats['notifications'], 5)
+        self.assertEqual(stats['logs'], 5)
+        self.assertEqual(stats['queued'], 5)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(Notification.objects.filter(is_sent=True, channels=['in_app', 'email']).count(), 5)
+        self.assertEqual(UserNotificationSettings.objects.count(), 5)
+    
+    def test_bulk_notification_other_channels(self):
+        """Telegram доставляется массовой рассылкой, ошибка email уходит на повтор"""
+        from unittest import mock
+        from .models import NotificationOutbox
+        
+        users = self.create_students(2, 'student')
+        for user in users:
+            UserNotificationSettings.objects.create(user=user, telegram_notifications=True, telegram_chat_id='42')
+        
+        stats, _ = self.send(users, channels=['telegram'])
+        self.assertEqual(stats['queued'], 2)
+        self.assertEqual(Notification.objects.filter(is_sent=True).count(), 2)
+        self.assertEqual(
+            NotificationLog.objects.filter(channels=['telegram'], sent_at__isnull=False).count(), 2
+        )
+        
+        with mock.patch('notifications.services.NotificationService._send_email', side_effect=Exception('SMTP недоступен')):
+            self.send(users, channels=['email', 'telegram'])
+        self.assertEqual(
+            set(NotificationOutbox.objects.filter(notification__channels=['email', 'telegram']).values_list('channel', 'status')),
+            {('email', 'pending'), ('telegram', 'sent')}
+        )
+        self.assertFalse(Notification.objects.filter(channels=['email', 'telegram'], is_sent=True).exists())
+    
+    def test_bulk_notification_query_count(self):
+        """Число запросов не зависит от количества получателей"""
+        _, small_queries = self.send(self.create_students(2, 'small'), deliver=False)
+        _, large_queries = self.send(self.create_students(20, 'large'), deliver=False)
+        
+        self.assertEqual(small_queries, large_queries)
+
+class NotificationSettingsCacheTestCase(SignalFreeTestCase, APITestCase):
+    """Тесты кеша настроек уведомлений"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123',
+            role='student'
+        )
+        from .signals import invalidate_notification_settings_cache, send_notification_via_channels
+        post_save.connect(send_notification_via_channels, sender=Notification)
+        post_save.connect(invalidate_notification_settings_cache, sender=UserNotificationSettings)
+    
+    def settings_queries(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'notifications_usernotificationsettings' in query['sql']
+        ]
+    
+    def send(self):
+        from .services import NotificationService
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.send_notification(
+                user=self.user,
+                title='Заголовок',
+                message='Сообщение',
+                channels=['email', 'telegram', 'whatsapp', 'sms', 'push']
+            )
+    
+    def test_settings_resolved_once(self):
+        """Настройки читаются из БД один раз, затем из кеша"""
+        first = self.settings_queries(self.send)
+        self.assertEqual(len([sql for sql in first if sql.startswith('SELECT')]), 1)
+        
+        self.assertEqual(self.settings_queries(self.send), [])
+    
+    def test_settings_update_invalidates_cache(self):
+        """Изменение настроек через API сбрасывает кеш"""
+        from django.core import mail
+        
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch('/api/notifications/settings/', {'email_notifications': False})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_settings_save_outside_api_invalidates_cache(self):
+        """Изменение настроек через save() (админка, shell) тоже сбрасывает кеш"""
+        from django.core import mail
+        
+        settings_obj = UserNotificationSettings.objects.create(user=self.user, email_notifications=False)
+        self.send()
+        self.assertEqual(len(mail.outbox), 0)
+        
+        settings_obj.email_notifications = True
+        settings_obj.save()
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+
+class NotificationOutboxTestCase(SignalFreeTestCase, TestCase):
+    """Тесты доставки уведомлений через outbox"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from .signals import send_notification_via_channels
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123',
+            role='student'
+        )
+        post_save.connect(send_notification_via_channels, sender=Notification)
+    
+    def create_notification(self, channels):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                user=self.user,
+                title='Заголовок',
+                message='Сообщение',
+                channels=channels
+            )
+    
+    def test_delivered_once_per_channel(self):
+        """Уведомление доставляется один раз и не порождает новых уведомлений"""
+        from django.core import mail
+        from .models import NotificationOutbox
+        from .services import NotificationOutboxService
+        
+        notification = self.create_notification(['email', 'in_app', 'push'])
+        
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            set(NotificationOutbox.objects.values_list('channel', 'status')),
+            {('email', 'sent'), ('push', 'sent')}
+        )
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_sent)
+        self.assertEqual(notification.logs.count(), 2)
+        
+        # Повторная постановка и повторный запуск ничего не отправляют
+        NotificationOutboxService.enqueue([notification])
+        self.assertEqual(NotificationOutboxService.dispatch(), 0)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_failed_delivery_is_retried(self):
+        """Ошибка доставки откладывает строку, после лимита попыток - failed"""
+        from unittest import mock
+        from datetime import timedelta
+        from .models import NotificationOutbox
+        from .services import NotificationOutboxService, OUTBOX_MAX_ATTEMPTS
+        
+        with mock.patch('notifications.services.NotificationService._send_email', side_effect=Exception('SMTP недоступен')):
+            notification = self.create_notification(['email'])
+            row = NotificationOutbox.objects.get()
+            self.assertEqual(row.status, 'pending')
+            self.assertEqual(row.attempts, 1)
+            self.assertGreater(row.available_at, timezone.now())
+            
+            for _ in range(OUTBOX_MAX_ATTEMPTS - 1):
+                NotificationOutbox.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+                NotificationOutboxService.dispatch()
+        
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'failed')
+        self.assertEqual(row.attempts, OUTBOX_MAX_ATTEMPTS)
+        self.assertEqual(notification.logs.get().error_message, 'SMTP недоступен')
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_sent)
+    
+    def test_smtp_connect_error_releases_batch(self):
+        """Ошибка подключения к SMTP возвращает строки на повтор, остальные каналы доставляются"""
+        from unittest import mock
+        from django.core.mail.backends.locmem import EmailBackend
+        from .models import NotificationOutbox
+        
+        with mock.patch.object(EmailBackend, 'open', side_effect=OSError('Connection refused'), create=True):
+            self.create_notification(['email', 'push'])
+        
+        self.assertEqual(
+            set(NotificationOutbox.objects.values_list('channel', 'status')),
+            {('email', 'pending'), ('push', 'sent')}
+        )
+        self.assertIn('Connection refused', NotificationOutbox.objects.get(channel='email').last_error)
+
+class UnreadCounterTestCase(SignalFreeTestCase, APITestCase):
+    """Тесты счетчика непрочитанных уведомлений"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123',
+            role='student'
+        )
+        from .signals import count_unread_notification
+        post_save.connect(count_unread_notification, sender=Notification)
+        self.client.force_authenticate(user=self.user)
+    
+    def create_notifications(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notification.objects.create(user=self.user, title=f'Уведомление {i}', message='Текст')
+                for i in range(count)
+            ]
+    
+    def unread_count(self):
+        response = self.client.get('/api/notifications/notifications/unread-count/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['unread_count']
+    
+    def test_counter_follows_reads(self):
+        """Счетчик меняется при создании и прочтении уведомлений"""
+        notifications = self.create_notifications(3)
+        self.assertEqual(self.unread_count(), 3)
+        
+        self.create_notifications(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/notifications/{notifications[0].id}/read/')
+            self.client.post(f'/api/notifications/notifications/{notifications[0].id}/read/')
+        self.assertEqual(self.unread_count(), 4)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/notifications/mark-all-read/')
+        self.assertEqual(self.unread_count(), 0)
+    
+    def test_warm_counter_skips_database(self):
+        """Прогретый счетчик не считает уведомления в БД"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.create_notifications(2)
+        self.unread_count()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.unread_count(), 2)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'notifications_notification' in query['sql']
+        ])
+    
+    def test_reconcile_fixes_drift(self):
+        """Сверка пересобирает счетчик из БД"""
+        from .counters import UnreadCounterService
+        from .tasks import reconcile_unread_counters
+        
+        self.create_notifications(2)
+        self.assertEqual(self.unread_count(), 2)
+        
+        # Изменение в обход счетчика
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        self.assertEqual(self.unread_count(), 2)
+        
+        reconcile_unread_counters.delay()
+        self.assertEqual(UnreadCounterService.get_notification_count(self.user.id), 0)
+        self.assertEqual(self.unread_count(), 0)
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from config.pagination import KeysetPagination
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.db import models
@@ -12,11 +13,13 @@ from .models import Notification, NotificationTemplate, UserNotificationSettings
 from accounts.models import User
 from .serializers import (
     NotificationSerializer, 
-    NotificationCreateSerializer,
     NotificationTemplateSerializer,
     UserNotificationSettingsSerializer,
-    NotificationLogSerializer
+    NotificationLogSerializer,
+    BulkNotificationSerializer
 )
+from .counters import UnreadCounterService
+from .tasks import send_bulk_notification_task
 from .permissions import (
     IsNotificationOwner, 
     IsAdminOrOwner, 
@@ -36,6 +39,7 @@ class NotificationListView(generics.ListAPIView):
     """Список уведомлений пользователя"""
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = NotificationFilter
     ordering_fields = ['created_at', 'is_read']
@@ -56,12 +60,15 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
         is_read = request.data.get('is_read')
         
         if is_read is not None:
+            was_read = notification.is_read
             notification.is_read = is_read
             if is_read and not notification.read_at:
                 notification.read_at = timezone.now()
             elif not is_read:
                 notification.read_at = None
             notification.save()
+            if bool(is_read) != was_read:
+                UnreadCounterService.notifications_read(notification.user_id, 1 if is_read else -1)
             
             serializer = self.get_serializer(notification)
             return Response(serializer.data)
@@ -104,9 +111,12 @@ def mark_notification_as_read(request, notification_id):
     """Отметить уведомление как прочитанное"""
     try:
         notification = Notification.objects.get(id=notification_id, user=request.user)
+        was_read = notification.is_read
         notification.is_read = True
         notification.read_at = timezone.now()
         notification.save()
+        if not was_read:
+            UnreadCounterService.notifications_read(request.user.id, 1)
         
         serializer = NotificationSerializer(notification)
         return Response({
@@ -129,6 +139,7 @@ def mark_all_as_read(request):
         is_read=True, 
         read_at=timezone.now()
     )
+    UnreadCounterService.notifications_read(request.user.id, updated_count)
     
     return Response({
         'message': f'{updated_count} уведомлений отмечены как прочитанные'
@@ -138,10 +149,7 @@ def mark_all_as_read(request):
 @permission_classes([IsAuthenticated])
 def get_unread_count(request):
     """Получить количество непрочитанных уведомлений"""
-    unread_count = Notification.objects.filter(
-        user=request.user, 
-        is_read=False
-    ).count()
+    unread_count = UnreadCounterService.get_notification_count(request.user.id)
     
     return Response({
         'unread_count': unread_count
@@ -151,15 +159,14 @@ def get_unread_count(request):
 @permission_classes([IsAuthenticated, IsAdminUser])
 def send_bulk_notification(request):
     """Массовая отправка уведомлений (только для админов)"""
-    serializer = NotificationCreateSerializer(data=request.data)
+    serializer = BulkNotificationSerializer(data=request.data)
     if serializer.is_valid():
         try:
-            notifications = []
-            # Здесь будет логика массовой отправки уведомлений
+            result = send_bulk_notification_task.delay(**serializer.validated_data)
             return Response({
-                'message': f'Отправлено {len(notifications)} уведомлений',
-                'notifications_count': len(notifications)
-            })
+                'message': 'Рассылка поставлена в очередь',
+                'task_id': result.id
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -248,7 +255,9 @@ def clear_notifications(request):
         queryset = queryset.filter(created_at__lt=cutoff_date)
     
     deleted_count = queryset.count()
+    unread_deleted = queryset.filter(is_read=False).count()
     queryset.delete()
+    UnreadCounterService.notifications_read(request.user.id, unread_deleted)
     
     return Response({
         'message': f'Удалено {deleted_count} уведомлений'
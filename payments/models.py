@@ -101,7 +101,8 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['student', 'status']),
             models.Index(fields=['transaction_id']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['student', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
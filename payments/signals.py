@@ -1,13 +1,12 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 
 from .models import Payment, Subscription, Invoice, Refund
 from accounts.models import User
 from courses.models import Group, StudentProgress
+from notifications.tasks import queue_email, queue_mass_email
 
 
 # === 1️⃣ Автозачисление студента после успешной оплаты ===
@@ -61,13 +60,7 @@ def enroll_student_after_payment(sender, instance, created, **kwargs):
             С уважением,
             Онлайн-школа
             '''
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [student.email],
-                fail_silently=True,
-            )
+            queue_email(subject, message, [student.email])
         except Exception as e:
             print(f"Ошибка отправки email: {e}")
 
@@ -117,13 +110,7 @@ def notify_payment_status(sender, instance, created, **kwargs):
                     Онлайн-школа
                     '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [student.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -147,13 +134,7 @@ def notify_subscription_created(sender, instance, created, **kwargs):
                 Онлайн-школа
                 '''
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
+                queue_email(subject, message, [student.email])
             except Exception as e:
                 print(f"Ошибка отправки email: {e}")
 
@@ -179,13 +160,7 @@ def notify_invoice_created(sender, instance, created, **kwargs):
             Онлайн-школа
             '''
             
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [student.email],
-                fail_silently=True,
-            )
+            queue_email(subject, message, [student.email])
         except Exception as e:
             print(f"Ошибка отправки email: {e}")
 
@@ -196,6 +171,7 @@ def notify_refund_request(sender, instance, created, **kwargs):
     """Уведомление о запросе возврата"""
     if created:
         admins = User.objects.filter(role='admin')
+        emails = []
         for admin in admins:
             if admin.email:
                 try:
@@ -214,12 +190,7 @@ def notify_refund_request(sender, instance, created, **kwargs):
                     Система уведомлений
                     '''
                     
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [admin.email],
-                        fail_silently=True,
-                    )
+                    emails.append((subject, message, [admin.email]))
                 except Exception as e:
                     print(f"Ошибка отправки email: {e}")
+        queue_mass_email(emails)